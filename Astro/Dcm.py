@@ -32,7 +32,7 @@ SOFTWARE.
 """
 
 import numpy as np
-from Astro import Quaternion
+from Astro import Fast
 
 class dcm(np.ndarray):
     '''
@@ -57,6 +57,9 @@ class dcm(np.ndarray):
     %                    form is to be interpreted as stack transposed rows, or
     %                    stacked columns, respectively.
     %
+    %           dtype    Optional storage type, e.g., np.float32 to halve the
+    %                    footprint of long series (see Soa for the accuracy)
+    %
     % Outputs:  M     The dcm object.
     %
     % See also quaternion
@@ -67,6 +70,12 @@ class dcm(np.ndarray):
         # Most common issue in here is the dimension of the inputs
         # Crease an exception we can just reference for convenience
         dimError = ValueError('Only Nx3x3, Nx1x4, Nx1x9, dcm, or quaternion allowed.')
+        
+        # Optional storage type, e.g., np.float32. Default keeps the input type
+        dtype = None
+        for key in kwargs:
+            if (key.lower() == 'dtype'):
+                dtype = kwargs[key]
 
         if data is None:
             data = np.zeros([1,3,3])
@@ -79,13 +88,13 @@ class dcm(np.ndarray):
 
         inType = type(data)
         if (issubclass(inType,dcm)):
-            d = data
+            d = data if (dtype is None) else data.astype(dtype, copy=False)
         elif (issubclass(inType,list) or
               issubclass(inType,np.ndarray)):
             
            # TODO: If data has units, strip the units they are not required
                             
-            d = np.array(data).view(cls)
+            d = np.array(data, dtype=dtype).view(cls)
             
             # Parse the dimensions to fiqure out what we have
             # t slices (in "time" or sequence)
@@ -113,25 +122,7 @@ class dcm(np.ndarray):
                 # Object looks like a tx1x4 stream of quaternions
                 # We don't assess normality, we just convert element
                 # by element
-                q = d
-                qsq = q ** 2
-                q01 = q[:,0] * q[:,1]
-                q02 = q[:,0] * q[:,2]
-                q03 = q[:,0] * q[:,3]
-                q12 = q[:,1] * q[:,2]
-                q13 = q[:,1] * q[:,3]
-                q23 = q[:,2] * q[:,3]
-                
-                d = np.ndarray([t, 3, 3]);
-                d[:,0,0] = 1 - 2*(qsq[:,2]+qsq[:,3])
-                d[:,0,1] = 2*(q12 - q03)
-                d[:,0,2] = 2*(q13 + q02)
-                d[:,1,0] = 2*(q12 + q03)
-                d[:,1,1] = 1 - 2*(qsq[:,3]+qsq[:,1])
-                d[:,1,2] = 2*(q23 - q01)
-                d[:,2,0] = 2*(q13 - q02)
-                d[:,2,1] = 2*(q23 + q01)
-                d[:,2,2] = 1 - 2*(qsq[:,1]+qsq[:,2])
+                d = Fast.to_dcm(d.view(np.ndarray)).view(cls)
             elif ((r==1) and (c==9)):
                 # Parse the keyword arguments, extracting what makes sense
                 # and tossing what doesn't
@@ -192,28 +183,28 @@ class dcm(np.ndarray):
     det = aei + bfg + cdh - ceg - bdi - afh
     '''
     def det(self):
-        if (len(self.shape) < 3):
-            return (self[0,0]*self[1,1]*self[2,2] +
-                    self[0,1]*self[1,2]*self[2,0] +
-                    self[0,2]*self[1,0]*self[2,1] -
-                    self[0,2]*self[1,1]*self[2,0] -
-                    self[0,1]*self[1,0]*self[2,2] -
-                    self[0,0]*self[1,2]*self[2,1])
-        else:              
-            return (self[:,0,0]*self[:,1,1]*self[:,2,2].view(np.ndarray) +
-                    self[:,0,1]*self[:,1,2]*self[:,2,0].view(np.ndarray) +
-                    self[:,0,2]*self[:,1,0]*self[:,2,1].view(np.ndarray) -
-                    self[:,0,2]*self[:,1,1]*self[:,2,0].view(np.ndarray) -
-                    self[:,0,1]*self[:,1,0]*self[:,2,2].view(np.ndarray) -
-                    self[:,0,0]*self[:,1,2]*self[:,2,1].view(np.ndarray))
+        # Work on the plain array so the products below are elementwise
+        # rather than dcm operators
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        x = (d[:,0,0]*d[:,1,1]*d[:,2,2] +
+             d[:,0,1]*d[:,1,2]*d[:,2,0] +
+             d[:,0,2]*d[:,1,0]*d[:,2,1] -
+             d[:,0,2]*d[:,1,1]*d[:,2,0] -
+             d[:,0,1]*d[:,1,0]*d[:,2,2] -
+             d[:,0,0]*d[:,1,2]*d[:,2,1])
+        return x if (len(self.shape) == 3) else x[0]
+    
     '''
         diagonal - return the diagonal of each DCM as an array
     '''
     def diagonal(self):
-        if (len(self.shape) < 3):
-            return np.array((self[0,0], self[1,1], self[2,2]))
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            return np.array((d[0,0], d[1,1], d[2,2]))
         else:
-            return np.array((self[:,0,0], self[:,1,1], self[:,2,2]))
+            return np.array((d[:,0,0], d[:,1,1], d[:,2,2]))
     
     '''
         trace - sum of diagonal
@@ -223,16 +214,160 @@ class dcm(np.ndarray):
     
     '''
         orthonormal - returns True for each DCM in a stack that is sufficiently
-        orthogonal and normal as determined by the rss of the associated quaternion
-        being sufficiently close to 1.0
+        orthogonal and normal as determined by the Frobenius norm of M * M' - I
+        being sufficiently close to 0.0
         Default tolerance is 1e-9
     '''
     
     def orthonormal(self,tolerance=1.0e-9):
-        # The simplest thing to do is let the quaternion do the work
-        # Not sure if this is the fastest way, but it is the easiest
-        return Quaternion.quaternion(self).orthonormal()
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        return Fast.orthonormal_error(d) <= tolerance
+    
+    '''
+        orthonormalize - re-orthonormalize drifting DCMs in place
+        
+        Only the DCMs whose error (see orthonormal) exceeds tolerance are
+        touched. method is 'newton' (default, a few Newton-Schulz steps,
+        cheap for the small drift of long integrations) or 'svd' (exact
+        nearest rotation by polar decomposition). Returns the error norm
+        of each DCM before correction.
+    '''
+    def orthonormalize(self, tolerance=1.0e-9, method='newton', iterations=4):
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        return Fast.orthonormalize(d, tolerance=tolerance, method=method.lower(),
+                                   iterations=iterations)
+    
+    '''
+        rotate - apply each DCM in the stack to a set of vectors (self * v)
+        
+        v may be a single 3 vector, an Nx3 stack (one vector per DCM), or
+        an NxMx3 stack (a cloud of M vectors per DCM). A single DCM (1x3x3)
+        is broadcast over all N. If out is supplied (same shape as the
+        result) the vectors are written directly into it.
+    '''
+    def rotate(self, v, out=None):
+        d = self.view(np.ndarray)
+        v = np.asarray(v)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        if (len(v.shape) < 2):
+            v = v[np.newaxis,...]
+        if ((v.shape[-1] != 3) or (len(v.shape) > 3)):
+            raise ValueError('Only 3, Nx3, or NxMx3 vectors can be rotated')
+            
+        if out is not None:
+            shape = np.broadcast_shapes(d.shape[:1], v.shape[:1]) + v.shape[1:]
+            if (out.shape != shape):
+                raise ValueError('out must have shape ' + str(shape))
+            
+        return Fast.rotate(d, v, out=out)
+
+    '''
+        from_euler - dcm stack from Nx3 Euler angles (radians)
+        
+        seq is any of the 12 rotation sequences by axis name or number
+        ('zyx' or '321', 'zxz' or '313', ...) and the angles are given in
+        sequence order, e.g., dcm.from_euler('zyx', [yaw, pitch, roll]) is
+        Rz(yaw) * Ry(pitch) * Rx(roll). If out is supplied (Nx3x3) the
+        DCMs are written directly into it.
+    '''
+    @staticmethod
+    def from_euler(seq, angles, out=None):
+        if out is not None:
+            Fast.from_euler(seq, angles, out=out.view(np.ndarray))
+            return out.view(dcm)
+        return Fast.from_euler(seq, angles).view(dcm)
+        
+    '''
+        to_euler - Nx3 Euler angles (radians, sequence order) of each DCM
+        
+        See from_euler for the sequences. At gimbal lock (first and third
+        axes aligned) the third angle is set to 0 and the first angle
+        carries the whole rotation about the aligned axes.
+    '''
+    def to_euler(self, seq='zyx', out=None, tolerance=1.0e-9):
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        return Fast.to_euler(d, seq, out=out, tolerance=tolerance)
+
+    '''
+        invert - inverse (transpose) of each DCM in the stack
+        
+        Unlike transpose (a view) this forms the inverse in out, which may
+        be self for an in-place inverse that allocates nothing after the
+        first call (see _workspace and release).
+    '''
+    def invert(self, out=None):
+        d = self.view(np.ndarray)
+        if (len(d.shape) < 3):
+            d = d[np.newaxis,...]
+        if isinstance(out, dcm) and (out.shape == d.shape):
+            work, scratch = out._workspace()
+            Fast.inverse(d, out=out.view(np.ndarray), scratch=scratch)
+            return out
+        if out is not None:
+            Fast.inverse(d, out=out.view(np.ndarray))
+            return out
+        return Fast.inverse(d).view(dcm)
+    
+    '''
+        _workspace - Nx3x3 work and N element scratch buffers kept on the dcm
+        
+        Allocated on first use and reused by every later in-place operation
+        on the same stack. The cost is a second copy of the stack that
+        lives as long as the dcm does; call release() to drop it.
+    '''
+    def _workspace(self):
+        shape = self.shape if (len(self.shape) == 3) else (1,) + self.shape
+        w = getattr(self, '_work', None)
+        if ((w is None) or (w[0].shape != shape) or (w[0].dtype != self.dtype)):
+            w = (np.empty(shape, dtype=self.dtype), np.empty(shape[:1], dtype=self.dtype))
+            self._work = w
+        return w
+    
+    '''
+        release - drop the work buffers of in-place operations (see
+        _workspace); the next in-place operation allocates them again
+    '''
+    def release(self):
+        self._work = None
     
+    '''
+        __array_ufunc__ - numpy ufunc hook
+        
+        np.matmul of two dcm stacks into a dcm out that is also an input
+        (np.matmul(d, d2, out=d), the same as d @= d2) is formed in the
+        out work buffer instead of a temporary. Every other ufunc works on
+        the plain array values, writing into out when given, and a new
+        array result comes back as a dcm.
+    '''
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        args = [x.view(np.ndarray) if isinstance(x, dcm) else x for x in inputs]
+        if ((ufunc is np.matmul) and (method == '__call__') and (not kwargs) and
+            (out is not None) and isinstance(out[0], dcm) and (len(out[0].shape) == 3) and
+            any(np.may_share_memory(out[0], x) for x in args)):
+            work, scratch = out[0]._workspace()
+            np.matmul(args[0], args[1], out=work)
+            np.copyto(out[0].view(np.ndarray), work)
+            return out[0]
+            
+        if out is not None:
+            kwargs['out'] = tuple(x.view(np.ndarray) if isinstance(x, dcm) else x
+                                  for x in out)
+        results = getattr(ufunc, method)(*args, **kwargs)
+        
+        if out is not None:
+            return out[0] if (len(out) == 1) else out
+        if isinstance(results, tuple):
+            return tuple(r.view(dcm) if isinstance(r, np.ndarray) else r
+                         for r in results)
+        return results.view(dcm) if isinstance(results, np.ndarray) else results
+
     # -------------------------------------------------------------------
     # Operator Overloads
     # 
@@ -265,10 +400,13 @@ class dcm(np.ndarray):
             return np.matmul(self,b).view(dcm)
         elif (issubclass(inType,list) or
               issubclass(inType,np.ndarray)):
-            # TODO: Need to implement matric vector logic
+            # Only vectors (trailing axis of 3) are rotated; anything else,
+            # e.g. a slice of the components times an array, is elementwise
+            if (np.shape(b)[-1:] == (3,)) and (self.shape[-2:] == (3,3)):
+                return self.rotate(b)
             return NotImplemented
         else:
-            raise TypeError('Target type must be a dcm')
+            raise TypeError('Target type must be a dcm or vector')
 
     '''
         object.__truediv__(self, other)             /
@@ -448,14 +586,21 @@ class dcm(np.ndarray):
         object.__imul__(self, other)                *=
     '''
     def __imul__(self,b):
-        return NotImplemented
+        return self.__imatmul__(b)
     
 
     '''
         object.__imatmul__(self, other)             @=
+        
+        In-place composition (self = self * b) when the product has the
+        shape of self; otherwise Python falls back to self * b
     '''
     def __imatmul__(self,b):
-        return NotImplemented
+        if (not issubclass(type(b),dcm)) or (len(self.shape) < 3):
+            return NotImplemented
+        if (np.broadcast_shapes(self.shape, b.shape) != self.shape):
+            return NotImplemented
+        return np.matmul(self, b, out=(self,))
     
 
     '''
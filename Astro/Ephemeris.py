@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+ephemeris - Memory mapped attitude ephemeris file for Astrodynamic Toolkit
+
+An ephemeris file is a fixed 64 byte header followed by one contiguous
+payload of N quaternions (Nx1x4) or N DCMs (Nx3x3) sampled on a uniform
+time base. Files are opened through np.memmap so a time window of a
+multi-GB history only touches the pages it needs.
+
+Header (little endian)
+
+    offset  size  field
+     0       8    magic b'ASTROEPH'
+     8       2    version (1)
+    10       1    kind b'q' (quaternion) or b'd' (dcm)
+    11       4    dtype string, e.g. b'<f8' (padded with NUL)
+    15       8    layout b'rows' or b'columns' (padded with NUL)
+    23       8    count N (uint64)
+    31       8    t0, time of the first sample (float64)
+    39       8    dt, time between samples (float64)
+    47      17    reserved (zero)
+
+A 'columns' layout only applies to DCM payloads and means each 3x3 is
+stored transposed (stacked columns); the reader hands back a transposed
+view so the caller always sees rows.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import os
+import struct
+
+import numpy as np
+from Astro import Dcm
+from Astro import Quaternion
+
+MAGIC = b'ASTROEPH'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHc4s8sQdd17x')
+_COUNT = struct.Struct('<Q')
+_COUNT_OFFSET = 23
+
+_KINDS = {b'q' : ((1,4), Quaternion.quaternion),
+          b'd' : ((3,3), Dcm.dcm)}
+
+class ephemeris(object):
+    '''
+    % EPHEMERIS Attitude ephemeris file constructor
+    %           Opens (or creates) an ephemeris file of quaternions or DCMs
+    %           on a uniform time base. Reading is done through np.memmap so
+    %           data and window() hand back quaternion/dcm views of the file
+    %           and nothing is loaded until it is touched.
+    %
+    % Usage:    E = ephemeris(filename);                     % Read only
+    %           E = ephemeris(filename, 'r+');               % Read/write in place
+    %           E = ephemeris(filename, 'w', kind='quaternion', t0=0.0, dt=0.01);
+    %           E = ephemeris(filename, 'a');                % Append to existing
+    %           E.append(q);
+    %           q = E.window(100.0, 160.0);
+    %
+    % Inputs:   filename  Path of the ephemeris file
+    %
+    %           mode      'r' (default), 'r+', 'w' (create/truncate), or
+    %                     'a' (append, creating the file if needed)
+    %
+    %           kind      'quaternion' (default) or 'dcm' (new files only)
+    %
+    %           dtype     Payload type, default np.float64 (new files only)
+    %
+    %           layout    'rows' (default) or 'columns' (new dcm files only)
+    %
+    %           t0, dt    Time of the first sample and time between samples
+    %                     (new files only)
+    %
+    % Notes:    A reader sees the samples present when it was opened (or
+    %           last refreshed), records appended afterwards become
+    %           visible after refresh().
+    %
+    % See also quaternion, dcm
+    %
+    %==============================================================================
+    '''
+    def __init__(self, filename, mode='r', kind='quaternion', dtype=np.float64,
+                 layout='rows', t0=0.0, dt=1.0):
+        if (mode not in ('r', 'r+', 'w', 'a')):
+            raise ValueError('mode must be one of "r", "r+", "w", or "a"')
+            
+        self.filename = filename
+        self.mode = mode
+        self._file = None
+        self._data = None
+        
+        if ((mode == 'w') or ((mode == 'a') and not os.path.exists(filename))):
+            if (kind.lower() not in ('quaternion', 'dcm')):
+                raise ValueError('kind must be either "quaternion" or "dcm"')
+            if (layout.lower() not in ('rows', 'columns')):
+                raise ValueError('layout must be either "rows" or "columns"')
+            if ((kind.lower() == 'quaternion') and (layout.lower() != 'rows')):
+                raise ValueError('quaternion payloads only support the "rows" layout')
+                
+            self.kind = kind.lower()[0].encode()
+            self.dtype = np.dtype(dtype).newbyteorder('<')
+            self.layout = layout.lower()
+            self.count = 0
+            self.t0 = float(t0)
+            self.dt = float(dt)
+            
+            self._file = open(filename, 'w+b')
+            self._file.write(self._pack())
+            self._file.flush()
+        else:
+            with open(filename, 'rb') as f:
+                self._unpack(f.read(_HEADER.size))
+            if (mode == 'a'):
+                # Drop anything past the counted records (a writer that died
+                # between the payload and the count) before appending
+                self._file = open(filename, 'r+b')
+                self._file.seek(self._end())
+                self._file.truncate()
+                
+    '''
+        _end - file offset just past the last counted record
+    '''
+    def _end(self):
+        shape, cls = _KINDS[self.kind]
+        return _HEADER.size + self.count * int(np.prod(shape)) * self.dtype.itemsize
+        
+    def _pack(self):
+        return _HEADER.pack(MAGIC, VERSION, self.kind, self.dtype.str.encode(),
+                            self.layout.encode(), self.count, self.t0, self.dt)
+        
+    def _unpack(self, header):
+        if (len(header) != _HEADER.size):
+            raise ValueError('File is too short to be an ephemeris')
+        magic, version, kind, dtype, layout, count, t0, dt = _HEADER.unpack(header)
+        if (magic != MAGIC):
+            raise ValueError('File is not an ephemeris')
+        if (version != VERSION):
+            raise ValueError('Unsupported ephemeris version ' + str(version))
+        if (kind not in _KINDS):
+            raise ValueError('Unknown ephemeris kind ' + str(kind))
+            
+        self.kind = kind
+        self.dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        self.layout = layout.rstrip(b'\0').decode()
+        self.count = count
+        self.t0 = t0
+        self.dt = dt
+        
+    '''
+        refresh - re-read the header and remap the payload, picking up any
+        records appended since the file was opened
+    '''
+    def refresh(self):
+        with open(self.filename, 'rb') as f:
+            self._unpack(f.read(_HEADER.size))
+        self._data = None
+        
+    '''
+        data - quaternion (Nx1x4) or dcm (Nx3x3) view of the whole payload
+    '''
+    @property
+    def data(self):
+        if self._data is None:
+            shape, cls = _KINDS[self.kind]
+            if (self.count == 0):
+                m = np.empty((0,) + shape, dtype=self.dtype)
+            else:
+                m = np.memmap(self.filename, dtype=self.dtype,
+                              mode=('r+' if self.mode == 'r+' else 'r'),
+                              offset=_HEADER.size, shape=(self.count,) + shape)
+            if (self.layout == 'columns'):
+                m = m.transpose(0, 2, 1)
+            self._data = m.view(cls)
+        return self._data
+        
+    def __len__(self):
+        return self.count
+        
+    '''
+        times - sample times for records i0 up to (not including) i1
+    '''
+    def times(self, i0=0, i1=None):
+        if i1 is None:
+            i1 = self.count
+        return self.t0 + self.dt * np.arange(i0, i1)
+        
+    '''
+        window - view of the records with start <= t <= stop
+        
+        Only the pages holding those records are read from disk.
+    '''
+    def window(self, start, stop):
+        i0 = int(np.ceil((start - self.t0) / self.dt))
+        i1 = int(np.floor((stop - self.t0) / self.dt)) + 1
+        i0 = min(max(i0, 0), self.count)
+        i1 = min(max(i1, i0), self.count)
+        return self.data[i0:i1]
+        
+    '''
+        append - write more records to the end of the file
+        
+        x is an Nx1x4 (quaternion) or Nx3x3 (dcm) stack matching the kind
+        of the file; it is converted to the file dtype and layout. The
+        header count is updated after the payload is written so readers
+        never see a partial record.
+    '''
+    def append(self, x):
+        if self._file is None:
+            raise IOError('ephemeris was not opened for appending')
+            
+        shape, cls = _KINDS[self.kind]
+        x = np.asarray(x)
+        if (x.shape == shape):
+            x = x[np.newaxis,...]
+        if (x.shape[1:] != shape):
+            raise ValueError('Only Nx' + 'x'.join(str(i) for i in shape) +
+                             ' records can be appended to this ephemeris')
+        if (self.layout == 'columns'):
+            x = x.transpose(0, 2, 1)
+            
+        self._file.write(np.ascontiguousarray(x, dtype=self.dtype).data)
+        self.count += x.shape[0]
+        
+        self._file.seek(_COUNT_OFFSET)
+        self._file.write(_COUNT.pack(self.count))
+        self._file.seek(self._end())
+        self._file.flush()
+        self._data = None
+        
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = None
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *args):
+        self.close()
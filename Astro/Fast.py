@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+fast - Functional fast path for Astrodynamic Toolkit
+
+Plain ndarray kernels behind the dcm and quaternion classes. Nothing in
+here parses arguments, sniffs types, or wraps results in the ndarray
+subclasses; callers pass correctly shaped stacks (Nx1x4 quaternions,
+Nx3x3 DCMs) and optionally preallocated outputs and get plain arrays
+back. Use these directly in tight loops (e.g., one attitude at a time in
+a 1 kHz loop) where the class constructor overhead matters.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import math
+
+import numpy as np
+
+# Hamilton product expansion, one row per output component (w, x, y, z)
+# Each term is (index into a, index into b, sign) such that
+#     (a * b)[k] = sum(sign * a[i] * b[j])
+_HAMILTON = (((0, 0,  1.0), (1, 1, -1.0), (2, 2, -1.0), (3, 3, -1.0)),
+             ((0, 1,  1.0), (1, 0,  1.0), (2, 3,  1.0), (3, 2, -1.0)),
+             ((0, 2,  1.0), (1, 3, -1.0), (2, 0,  1.0), (3, 1,  1.0)),
+             ((0, 3,  1.0), (1, 2,  1.0), (2, 1, -1.0), (3, 0,  1.0)))
+
+# Shepperd's method, rows of the symmetric K = 4 * q * q' matrix expressed
+# as indices into the 10 unique elements
+#     [K00, K11, K22, K33, K01, K02, K03, K12, K13, K23]
+_SHEPPERD = np.array([[0, 4, 5, 6],
+                      [4, 1, 7, 8],
+                      [5, 7, 2, 9],
+                      [6, 8, 9, 3]])
+
+# Sign pattern of the quaternion conjugate
+_CONJUGATE = np.array([1.0, -1.0, -1.0, -1.0])
+
+# Rotation sequence axes, either by name or by aerospace number
+_AXES = {'x' : 0, 'y' : 1, 'z' : 2,
+         '1' : 0, '2' : 1, '3' : 2}
+
+'''
+    to_quat - Nx3x3 DCM stack to Nx1x4 quaternion stack
+    
+    Shepperd's method (c. 1978 Journal of Guidance, Control, and Dynamics)
+    picks one of four algebraically equivalent forms depending on which of
+    4*qw^2, 4*qx^2, 4*qy^2, 4*qz^2 is large enough to divide by. All four
+    forms are rows of the symmetric matrix
+    
+      K = 4 * q * q'
+    
+        = [[1+m00+m11+m22  m21-m12        m02-m20        m10-m01      ]
+           [m21-m12        1+m00-m11-m22  m01+m10        m02+m20      ]
+           [m02-m20        m01+m10        1-m00+m11-m22  m12+m21      ]
+           [m10-m01        m02+m20        m12+m21        1-m00-m11+m22]]
+    
+    so the quaternion is just the selected row k scaled by
+    1 / (2 * sqrt(K[k,k])). The row is selected the same way the classic
+    c-style logic does it
+    
+    if (tr > 0)                           k = 0 (qw)
+    else if ((m00 > m11)&(m00 > m22))     k = 1 (qx)
+    else if (m11 > m22)                   k = 2 (qy)
+    else                                  k = 3 (qz)
+    
+    Only the 10 unique elements of K are formed (as contiguous rows, see
+    _SHEPPERD) and the selected row is gathered in one pass over the stack
+    with no per-branch index sets or copies. A single DCM (N=1) takes the
+    scalar path in _to_quat1 instead.
+    
+    dtype sets the computation and output type when out is not supplied
+    (default float64). work is an optional 10xN scratch array (same type
+    as out) for callers converting many stacks with reusable buffers.
+'''
+def to_quat(d, out=None, dtype=None, work=None):
+    t = d.shape[0]
+    if out is None:
+        out = np.empty((t,1,4), dtype=(np.float64 if dtype is None else dtype))
+        
+    if (t == 1):
+        out[0,0] = _to_quat1(d[0].tolist())
+        return out
+        
+    if work is None:
+        work = np.empty((10,t), dtype=out.dtype)
+    row, S = _shepperd(lambda i, j: d[:,i,j], work)
+    row /= S
+    
+    out[:,0,:] = row.T
+    return out
+
+'''
+    _shepperd - the K rows and branch selection of Shepperd's method shared
+    by to_quat and Soa.to_quat
+    
+    m(i, j) returns the length N array of DCM element (i,j) in whatever
+    layout the caller has; K is a 10xN scratch array. Returns the selected
+    rows of K gathered as (w, x, y, z) numerators (4xN, a new array) and the
+    divisors S (1xN, a new array); the quaternion components are row / S.
+'''
+def _shepperd(m, K):
+    m00 = m(0,0)
+    m11 = m(1,1)
+    m22 = m(2,2)
+    
+    np.add(m00, m11, out=K[0])
+    K[0] += m22
+    np.subtract(m00, m11, out=K[1])
+    K[1] -= m22
+    np.subtract(m11, m00, out=K[2])
+    K[2] -= m22
+    np.subtract(m22, m00, out=K[3])
+    K[3] -= m11
+    K[0:4] += 1.0
+    np.subtract(m(2,1), m(1,2), out=K[4])
+    np.subtract(m(0,2), m(2,0), out=K[5])
+    np.subtract(m(1,0), m(0,1), out=K[6])
+    np.add(m(0,1), m(1,0), out=K[7])
+    np.add(m(0,2), m(2,0), out=K[8])
+    np.add(m(1,2), m(2,1), out=K[9])
+    
+    # trace > 0 is the same test as K[0,0] > 1
+    k = np.select([K[0] > 1.0],
+                  [0],
+                  default=1 + np.argmax(K[1:4], axis=0))
+    
+    S = np.take_along_axis(K, k[np.newaxis,:], axis=0)
+    np.sqrt(S, out=S)
+    S *= 2.0
+    
+    return np.take_along_axis(K, _SHEPPERD[k].T, axis=0), S
+
+'''
+    _to_quat1 - single DCM (nested lists) to (w, x, y, z) with Python floats
+    
+    Per-element numpy overhead dwarfs the arithmetic for a single attitude
+    so the classic branching form of Shepperd's method is used here.
+'''
+def _to_quat1(m):
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = m
+    tr = m00 + m11 + m22
+    if (tr > 0):
+        S = math.sqrt(tr + 1.0) * 2.0                   # S=4*qw
+        return (0.25 * S, (m21 - m12) / S, (m02 - m20) / S, (m10 - m01) / S)
+    elif ((m00 > m11) and (m00 > m22)):
+        S = math.sqrt(1.0 + m00 - m11 - m22) * 2.0      # S=4*qx
+        return ((m21 - m12) / S, 0.25 * S, (m01 + m10) / S, (m02 + m20) / S)
+    elif (m11 > m22):
+        S = math.sqrt(1.0 + m11 - m00 - m22) * 2.0      # S=4*qy
+        return ((m02 - m20) / S, (m01 + m10) / S, 0.25 * S, (m12 + m21) / S)
+    else:
+        S = math.sqrt(1.0 + m22 - m00 - m11) * 2.0      # S=4*qz
+        return ((m10 - m01) / S, (m02 + m20) / S, (m12 + m21) / S, 0.25 * S)
+
+'''
+    to_dcm - Nx1x4 quaternion stack to Nx3x3 DCM stack
+    
+    Quaternions are not assessed for normality, they are converted
+    element by element.
+'''
+def to_dcm(q, out=None):
+    if out is None:
+        out = np.empty((q.shape[0],3,3), dtype=q.dtype)
+        
+    if (q.shape[0] == 1):
+        w, x, y, z = q[0,0].tolist()
+        out[0] = ((1.0 - 2.0 * (y*y + z*z), 2.0 * (x*y - w*z), 2.0 * (x*z + w*y)),
+                  (2.0 * (x*y + w*z), 1.0 - 2.0 * (z*z + x*x), 2.0 * (y*z - w*x)),
+                  (2.0 * (x*z - w*y), 2.0 * (y*z + w*x), 1.0 - 2.0 * (x*x + y*y)))
+        return out
+        
+    w = q[:,0,0]
+    x = q[:,0,1]
+    y = q[:,0,2]
+    z = q[:,0,3]
+    xx = x * x
+    yy = y * y
+    zz = z * z
+    wx = w * x
+    wy = w * y
+    wz = w * z
+    xy = x * y
+    xz = x * z
+    yz = y * z
+    
+    out[:,0,0] = 1.0 - 2.0 * (yy + zz)
+    out[:,0,1] = 2.0 * (xy - wz)
+    out[:,0,2] = 2.0 * (xz + wy)
+    out[:,1,0] = 2.0 * (xy + wz)
+    out[:,1,1] = 1.0 - 2.0 * (zz + xx)
+    out[:,1,2] = 2.0 * (yz - wx)
+    out[:,2,0] = 2.0 * (xz - wy)
+    out[:,2,1] = 2.0 * (yz + wx)
+    out[:,2,2] = 1.0 - 2.0 * (xx + yy)
+    return out
+
+'''
+    multiply - Hamilton product of two Nx1x4 quaternion stacks (a * b)
+    
+    The sequence axes are broadcast against each other so a single
+    quaternion can be applied to a stack (1 vs N, N vs 1) or two stacks
+    can be multiplied sample by sample (N vs N).
+    
+    If out is supplied the product is written directly into it and only a
+    single N element scratch array is allocated (or none if scratch is
+    also supplied). A single product (1 vs 1) is formed with Python floats
+    to avoid per-element numpy overhead. When out may overlap one of the
+    inputs the product is formed in work (a new buffer if work is not
+    supplied) and then copied into out, so a @= b with reused scratch and
+    work buffers allocates nothing.
+'''
+def multiply(a, b, out=None, scratch=None, work=None):
+    if (a.shape == b.shape):
+        shape = a.shape
+    else:
+        shape = np.broadcast_shapes(a.shape, b.shape)
+        
+    if (shape == (1,1,4)):
+        if out is None:
+            out = np.empty(shape, dtype=np.result_type(a, b))
+        a0, a1, a2, a3 = a[0,0].tolist()
+        b0, b1, b2, b3 = b[0,0].tolist()
+        out[0,0] = (a0*b0 - a1*b1 - a2*b2 - a3*b3,
+                    a0*b1 + a1*b0 + a2*b3 - a3*b2,
+                    a0*b2 - a1*b3 + a2*b0 + a3*b1,
+                    a0*b3 + a1*b2 - a2*b1 + a3*b0)
+        return out
+        
+    if out is None:
+        r = np.empty(shape, dtype=np.result_type(a, b))
+    elif (np.may_share_memory(out, a) or np.may_share_memory(out, b)):
+        r = np.empty(shape, dtype=out.dtype) if work is None else work
+    else:
+        r = out
+        
+    if scratch is None:
+        scratch = np.empty(shape[:-1], dtype=r.dtype)
+        
+    for k in range(4):
+        rk = r[...,k]
+        terms = _HAMILTON[k]
+        i, j, sign = terms[0]
+        np.multiply(a[...,i], b[...,j], out=rk)
+        for i, j, sign in terms[1:]:
+            np.multiply(a[...,i], b[...,j], out=scratch)
+            if (sign > 0):
+                np.add(rk, scratch, out=rk)
+            else:
+                np.subtract(rk, scratch, out=rk)
+                
+    if ((out is not None) and (r is not out)):
+        out[...] = r
+        r = out
+        
+    return r
+
+'''
+    rotate - rotate vectors by a quaternion (Nx1x4) or DCM (Nx3x3) stack
+    
+    v may be an Nx3 stack (one vector per attitude) or an NxMx3 stack (a
+    cloud of M vectors per attitude); a single attitude (N=1) is broadcast
+    over all vectors. If out is supplied the vectors are written directly
+    into it; out may be v itself for an in-place rotation.
+    
+    Quaternions use the sandwich product q * v * ~q expanded directly in
+    terms of the vector part r and scalar part w of each (unit) quaternion
+    
+        t  = 2 (r x v)
+        v' = v + w t + r x t
+        
+    so no intermediate DCM stack is formed.
+'''
+def rotate(x, v, out=None):
+    if out is None:
+        shape = np.broadcast_shapes(x.shape[:1], v.shape[:1]) + v.shape[1:]
+        out = np.empty(shape, dtype=np.result_type(x, v))
+        
+    if (out.shape == (1,3)):
+        if (x.shape[-1] == 4):
+            w, r0, r1, r2 = x[0,0].tolist()
+            v0, v1, v2 = v[0].tolist()
+            t0 = 2.0 * (r1*v2 - r2*v1)
+            t1 = 2.0 * (r2*v0 - r0*v2)
+            t2 = 2.0 * (r0*v1 - r1*v0)
+            out[0] = (v0 + w*t0 + r1*t2 - r2*t1,
+                      v1 + w*t1 + r2*t0 - r0*t2,
+                      v2 + w*t2 + r0*t1 - r1*t0)
+        else:
+            (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = x[0].tolist()
+            v0, v1, v2 = v[0].tolist()
+            out[0] = (m00*v0 + m01*v1 + m02*v2,
+                      m10*v0 + m11*v1 + m12*v2,
+                      m20*v0 + m21*v1 + m22*v2)
+        return out
+        
+    if (x.shape[-1] == 4):
+        # Line up the scalar and vector parts with the vector axes
+        # (Nx1 and Nx3 for Nx3 vectors, Nx1x1 and Nx1x3 for NxMx3)
+        q = x.reshape(x.shape[:1] + (1,) * (len(v.shape) - 2) + (4,))
+        w = q[...,0:1]
+        r = q[...,1:4]
+        
+        t = np.cross(r, v)
+        t *= 2.0
+        c = np.cross(r, t)
+        c += v
+        
+        # out may alias v, everything that reads v is complete by now
+        np.multiply(w, t, out=out)
+        out += c
+    elif (len(v.shape) < 3):
+        # One vector per DCM, einsum avoids the column vector reshape
+        # that matmul would need and is the faster of the two here
+        if np.may_share_memory(out, v):
+            v = v.copy()
+        np.einsum('nij,nj->ni', x, v, out=out)
+    else:
+        # Vector clouds are a row stack per DCM so post-multiply by the
+        # transpose; matmul hands this to the BLAS-like inner loops
+        np.matmul(v, x.transpose(0, 2, 1), out=out)
+        
+    return out
+
+'''
+    normalize - scale each quaternion in an Nx1x4 stack to unit length
+    
+    out may be q itself; work (Nx1) receives the norms so nothing is
+    allocated when both are supplied.
+'''
+def normalize(q, out=None, work=None):
+    if work is None:
+        n = np.einsum('...i,...i->...', q, q)
+    else:
+        # matmul rather than einsum since einsum allocates even given out
+        n = work
+        np.matmul(q[...,np.newaxis,:], q[...,:,np.newaxis],
+                  out=n[...,np.newaxis,np.newaxis])
+    np.sqrt(n, out=n)
+    if work is None:
+        return np.divide(q, n[...,np.newaxis], out=out)
+        
+    # Component by component, a broadcast divide would buffer N elements
+    if out is None:
+        out = np.empty(q.shape, dtype=np.result_type(q, n))
+    for k in range(q.shape[-1]):
+        np.divide(q[...,k], n, out=out[...,k])
+    return out
+
+'''
+    inverse - inverse of each quaternion (Nx1x4) or DCM (Nx3x3) in a stack
+    
+    The conjugate for (unit) quaternions and the transpose for DCMs.
+    out may be x itself for an in-place inverse; a DCM stack is then
+    transposed by swapping the off-diagonal pairs through an N element
+    scratch array (allocated if not supplied).
+'''
+def inverse(x, out=None, scratch=None):
+    if (x.shape[-1] == 4):
+        return np.multiply(x, _CONJUGATE, out=out)
+    elif out is None:
+        return np.ascontiguousarray(np.swapaxes(x, -1, -2))
+    elif np.may_share_memory(out, x):
+        if (out is not x):
+            out[...] = x
+        if scratch is None:
+            scratch = np.empty(out.shape[:-2], dtype=out.dtype)
+        for i, j in ((0,1), (0,2), (1,2)):
+            np.copyto(scratch, out[...,i,j])
+            np.copyto(out[...,i,j], out[...,j,i])
+            np.copyto(out[...,j,i], scratch)
+        return out
+    else:
+        out[...] = np.swapaxes(x, -1, -2)
+        return out
+
+'''
+    _sequence - axis indices (i, j, k) and parity e of a rotation sequence
+    
+    For Tait-Bryan sequences (e.g., 'zyx', '321') k is the third axis; for
+    proper Euler sequences (e.g., 'zxz', '313') k is the axis that does not
+    appear. e is +1 when (i, j, k) is a cyclic permutation of (x, y, z)
+    and -1 otherwise.
+'''
+def _sequence(seq):
+    try:
+        axes = [_AXES[a] for a in seq.lower()]
+    except (KeyError, AttributeError):
+        axes = []
+    if ((len(axes) != 3) or (axes[0] == axes[1]) or (axes[1] == axes[2])):
+        raise ValueError('seq must be one of the 12 rotation sequences, e.g., "zyx" or "313"')
+        
+    i, j = axes[0], axes[1]
+    k = 3 - i - j
+    e = 1.0 if ((j - i) % 3 == 1) else -1.0
+    return i, j, k, e, (axes[2] == i)
+
+'''
+    _elementary - Nx3x3 active rotations by angle a (N) about one axis
+'''
+def _elementary(axis, a, out):
+    c = np.cos(a)
+    s = np.sin(a)
+    j = (axis + 1) % 3
+    k = (axis + 2) % 3
+    out[...] = 0.0
+    out[:,axis,axis] = 1.0
+    out[:,j,j] = c
+    out[:,k,k] = c
+    out[:,j,k] = -s
+    out[:,k,j] = s
+    return out
+
+'''
+    from_euler - Nx3 Euler angles (radians) to Nx3x3 DCM stack
+    
+    The angles are in sequence order and the DCM is the product of the
+    active elementary rotations in that order, e.g., for 'zyx' and
+    [yaw, pitch, roll]
+    
+        M = Rz(yaw) * Ry(pitch) * Rx(roll)
+    
+    (the body to reference DCM of the aerospace 3-2-1 sequence).
+'''
+def from_euler(seq, angles, out=None):
+    _sequence(seq)
+    axes = [_AXES[a] for a in seq.lower()]
+    
+    angles = np.asarray(angles)
+    if (len(angles.shape) < 2):
+        angles = angles[np.newaxis,...]
+    n = angles.shape[0]
+    if out is None:
+        out = np.empty((n,3,3), dtype=np.result_type(angles, np.float64))
+        
+    r = np.empty((n,3,3), dtype=out.dtype)
+    m = np.empty((n,3,3), dtype=out.dtype)
+    _elementary(axes[0], angles[:,0], m)
+    _elementary(axes[1], angles[:,1], r)
+    np.matmul(m, r, out=out)
+    _elementary(axes[2], angles[:,2], r)
+    np.matmul(out, r, out=m)
+    out[...] = m
+    return out
+
+'''
+    to_euler - Nx3x3 DCM (or Nx1x4 quaternion) stack to Nx3 Euler angles
+    (radians) in sequence order, the inverse of from_euler
+    
+    The middle angle is in [-pi/2, pi/2] for Tait-Bryan sequences and
+    [0, pi] for proper Euler sequences. The outer angles are in [-pi, pi].
+    
+    Gimbal lock: where the first and third axes line up (cos of the middle
+    angle below tolerance for Tait-Bryan, sin for proper Euler) only their
+    combination is observable. There the third angle is set to 0 and the
+    whole rotation is assigned to the first angle.
+'''
+def to_euler(x, seq, out=None, tolerance=1.0e-9):
+    i, j, k, e, proper = _sequence(seq)
+    if (x.shape[-1] == 4):
+        x = to_dcm(x)
+    n = x.shape[0]
+    if out is None:
+        out = np.empty((n,3), dtype=np.result_type(x, np.float64))
+        
+    if proper:
+        # M = Ri(a) * Rj(b) * Ri(c)
+        sb = np.hypot(x[:,i,j], x[:,i,k])
+        np.arctan2(sb, x[:,i,i], out=out[:,1])
+        np.arctan2(x[:,j,i], -e * x[:,k,i], out=out[:,0])
+        np.arctan2(x[:,i,j], e * x[:,i,k], out=out[:,2])
+        
+        locked = (sb < tolerance)
+        if np.any(locked):
+            cb = np.where(x[locked,i,i] < 0.0, -1.0, 1.0)
+            out[locked,0] = np.arctan2(-e * cb * x[locked,j,k], cb * x[locked,k,k])
+            out[locked,2] = 0.0
+    else:
+        # M = Ri(a) * Rj(b) * Rk(c)
+        cb = np.hypot(x[:,i,i], x[:,i,j])
+        np.arctan2(e * x[:,i,k], cb, out=out[:,1])
+        np.arctan2(-e * x[:,j,k], x[:,k,k], out=out[:,0])
+        np.arctan2(-e * x[:,i,j], x[:,i,i], out=out[:,2])
+        
+        locked = (cb < tolerance)
+        if np.any(locked):
+            out[locked,0] = np.arctan2(e * x[locked,k,j], x[locked,j,j])
+            out[locked,2] = 0.0
+            
+    return out
+
+'''
+    orthonormal_error - Frobenius norm of M * M' - I for each DCM in an
+    Nx3x3 stack
+    
+    Formed from the six unique row dot products, so the only temporary is
+    one N element array.
+'''
+def orthonormal_error(d, out=None):
+    n = d.shape[0]
+    if out is None:
+        out = np.empty(n, dtype=np.result_type(d, np.float64))
+    t = np.empty(n, dtype=out.dtype)
+    
+    out[...] = 0.0
+    for a, b, identity, weight in ((0, 0, 1.0, 1.0), (1, 1, 1.0, 1.0), (2, 2, 1.0, 1.0),
+                                   (0, 1, 0.0, 2.0), (0, 2, 0.0, 2.0), (1, 2, 0.0, 2.0)):
+        np.einsum('ni,ni->n', d[:,a], d[:,b], out=t)
+        t -= identity
+        t *= t
+        t *= weight
+        out += t
+    return np.sqrt(out, out=out)
+
+'''
+    orthonormalize - correct drifting DCMs in an Nx3x3 stack in place
+    
+    A cheap mask pass (orthonormal_error) finds the samples whose error
+    exceeds tolerance and only those are gathered, corrected and written
+    back. Methods
+    
+        'newton'  Newton-Schulz iteration toward the polar factor
+                      M = 1.5 * M - 0.5 * M * M' * M
+                  quadratically convergent for the small drift of a long
+                  integration, repeated at most iterations times
+        'svd'     Exact polar decomposition, M = U * V' from the SVD
+                  (the nearest rotation in the Frobenius sense)
+    
+    Returns the per-sample error norms found before the correction.
+'''
+def orthonormalize(d, tolerance=1.0e-9, method='newton', iterations=4):
+    if (method not in ('newton', 'svd')):
+        raise ValueError('method must be either "newton" or "svd"')
+        
+    err = orthonormal_error(d)
+    idx = np.flatnonzero(err > tolerance)
+    if (idx.shape[0] == 0):
+        return err
+        
+    m = d[idx]
+    if (method == 'svd'):
+        u, s, vt = np.linalg.svd(m)
+        # Keep a proper rotation (det = +1) if the drift flipped handedness
+        flip = (np.linalg.det(u) * np.linalg.det(vt) < 0.0)
+        u[flip,:,2] *= -1.0
+        np.matmul(u, vt, out=m)
+    else:
+        for k in range(iterations):
+            p = np.matmul(m, np.matmul(m.transpose(0, 2, 1), m))
+            m *= 1.5
+            p *= 0.5
+            m -= p
+            if (np.max(orthonormal_error(m)) <= tolerance):
+                break
+                
+    d[idx] = m
+    return err
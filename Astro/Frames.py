@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+frames - Reference frame graph for Astrodynamic Toolkit
+
+Named frames joined by static or time varying DCMs, with the chain
+between any two frames composed on request and memoized per time grid.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import collections
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Interpolate
+from Astro import Quaternion
+
+class framegraph(object):
+    '''
+    % FRAMEGRAPH Named reference frame graph constructor
+    %           Holds the DCMs between named frames (body, sensor, LVLH,
+    %           inertial, ...) as the edges of a graph and composes the
+    %           chain between any two connected frames on request. Composed
+    %           stacks are memoized per (from, to, time grid) with least
+    %           recently used eviction, so repeated analyses of the same
+    %           chain do not re-multiply or reallocate.
+    %
+    % Usage:    G = framegraph();
+    %           G.add('body', 'sensor', D);                % Static 3x3
+    %           G.add('lvlh', 'body', q, t=tq);            % Sampled, slerped
+    %           G.add('inertial', 'lvlh', lambda t: O.lvlh(t)[:,0]);
+    %           D = G.transform('sensor', 'inertial', t);  % Kx3x3 dcm
+    %
+    % Inputs:   cache    Number of composed stacks to keep (default 16)
+    %
+    % Edges:    add(a, b, x, t=None) stores the DCM taking vectors in frame
+    %           a into frame b; the reverse direction is its transpose. x
+    %           is one of
+    %               a 3x3 (or 1x3x3) dcm, fixed in time
+    %               an Nx3x3 dcm or Nx1x4 quaternion sampled at the N
+    %               times t, interpolated (slerp) onto the requested times
+    %               a callable f(t) returning a Kx3x3 stack for K times
+    %
+    % Notes:    Results are shared read only dcm stacks; adding or removing
+    %           an edge clears the memoized results.
+    %
+    % See also dcm, slerp, orbit
+    %
+    %==============================================================================
+    '''
+    def __init__(self, cache=16):
+        self.cache = int(cache)
+        self._edges = {}
+        self._paths = {}
+        self._results = collections.OrderedDict()
+        
+    '''
+        add - add (or replace) the edge from frame a to frame b
+    '''
+    def add(self, a, b, x, t=None):
+        if (a == b):
+            raise ValueError('An edge must join two different frames')
+            
+        if callable(x):
+            edge = ('function', x)
+        elif t is None:
+            d = np.array(Dcm.dcm(x).view(np.ndarray), dtype=np.float64)
+            if (d.shape == (3,3)):
+                d = d[np.newaxis,...]
+            if (d.shape != (1,3,3)):
+                raise ValueError('A static edge must be a single 3x3 dcm (give t for a stack)')
+            edge = ('static', d)
+        else:
+            if isinstance(x, Dcm.dcm) or (np.shape(x)[-2:] == (3,3)):
+                q = Quaternion.quaternion(Dcm.dcm(x))
+            else:
+                q = Quaternion.quaternion(x)
+            t = np.array(t, dtype=np.float64).ravel()
+            if (t.shape[0] != q.shape[0]):
+                raise ValueError('Must have one time for each sample')
+            edge = ('sampled', (t, q))
+            
+        self.remove(a, b)
+        self._edges.setdefault(a, {})[b] = (edge, False)
+        self._edges.setdefault(b, {})[a] = (edge, True)
+        
+    '''
+        remove - remove the edge between frames a and b (if any)
+    '''
+    def remove(self, a, b):
+        self._edges.get(a, {}).pop(b, None)
+        self._edges.get(b, {}).pop(a, None)
+        self._paths.clear()
+        self._results.clear()
+        
+    '''
+        frames - names of every frame in the graph
+    '''
+    def frames(self):
+        return [f for f in self._edges if self._edges[f]]
+        
+    '''
+        path - list of frames from a to b (fewest edges), found once and kept
+    '''
+    def path(self, a, b):
+        key = (a, b)
+        if key not in self._paths:
+            previous = {a : None}
+            queue = collections.deque([a])
+            while queue and (b not in previous):
+                f = queue.popleft()
+                for g in self._edges.get(f, {}):
+                    if g not in previous:
+                        previous[g] = f
+                        queue.append(g)
+            if b not in previous:
+                raise KeyError('No path from frame ' + repr(a) + ' to frame ' + repr(b))
+                
+            p = [b]
+            while p[-1] != a:
+                p.append(previous[p[-1]])
+            self._paths[key] = p[::-1]
+        return self._paths[key]
+        
+    '''
+        _evaluate - the Kx3x3 (or 1x3x3) stack of one edge at the times t
+    '''
+    def _evaluate(self, edge, reverse, t):
+        kind, x = edge
+        if (kind == 'static'):
+            d = x
+        elif t is None:
+            raise ValueError('Times are required for a path through a time varying edge')
+        elif (kind == 'function'):
+            d = np.asarray(x(t), dtype=np.float64)
+            if (d.shape == (3,3)):
+                d = d[np.newaxis,...]
+        else:
+            d = Fast.to_dcm(Interpolate.slerp(x[0], x[1], t.ravel()).view(np.ndarray))
+        if reverse:
+            d = d.transpose(0, 2, 1)
+        return d
+        
+    '''
+        transform - dcm stack taking vectors in frame a into frame b at the
+        times t
+        
+        Returns a Kx3x3 dcm for K times, or 1x3x3 when t is None (every edge
+        on the path must then be static). The result is memoized; the same
+        read only stack is handed back until it is evicted or the graph
+        changes.
+    '''
+    def transform(self, a, b, t=None):
+        if t is not None:
+            t = np.array(t, dtype=np.float64).ravel()
+            key = (a, b, t.shape[0], hash(t.tobytes()))
+        else:
+            key = (a, b, None, None)
+            
+        hit = self._results.get(key)
+        if (hit is not None) and ((t is None) or np.array_equal(hit[0], t)):
+            self._results.move_to_end(key)
+            return hit[1]
+            
+        p = self.path(a, b)
+        n = 1 if t is None else t.shape[0]
+        out = np.empty((n,3,3))
+        work = np.empty((n,3,3))
+        out[...] = np.eye(3)
+        for f, g in zip(p[:-1], p[1:]):
+            edge, reverse = self._edges[f][g]
+            np.matmul(self._evaluate(edge, reverse, t), out, out=work)
+            out, work = work, out
+            
+        out.flags.writeable = False
+        out = out.view(Dcm.dcm)
+        if (self.cache > 0):
+            self._results[key] = (t, out)
+            if (len(self._results) > self.cache):
+                self._results.popitem(last=False)
+        return out
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+index - Nearest attitude search for Astrodynamic Toolkit
+
+Matches measured attitudes against large catalogs of reference
+orientations (pointing tables, lookup-table control) with a k-d tree over
+unit quaternions, accounting for q and -q describing the same attitude.
+k nearest and radius queries are batched over Mx1x4 stacks.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import pickle
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Quaternion
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Chord between unit quaternions 90 degrees apart on the hypersphere, i.e.,
+# attitudes a 180 degree rotation apart. Every catalog entry is within this
+# chord of either q or -q, so each sign only needs to report entries inside it.
+_HALF = np.sqrt(2.0)
+
+'''
+    _rows - unit quaternion rows (Mx4 float64) from a quaternion or dcm stack
+    or anything the quaternion constructor accepts
+'''
+def _rows(x):
+    if not isinstance(x, (Quaternion.quaternion, Dcm.dcm)):
+        x = np.asarray(x, dtype=np.float64)
+        if (x.shape[-2:] == (3,3)):
+            x = Dcm.dcm(x)
+    if isinstance(x, Dcm.dcm):
+        x = Quaternion.quaternion(x)
+    p = np.asarray(x, dtype=np.float64).reshape(-1, 4)
+    return Fast.normalize(p)
+
+'''
+    _chord - chord length between unit quaternions for a rotation angle
+    between attitudes, and its inverse _angle
+'''
+def _chord(angle):
+    return 2.0 * np.sin(np.minimum(np.asarray(angle, dtype=np.float64), np.pi) / 4.0)
+
+def _angle(chord):
+    return 4.0 * np.arcsin(np.minimum(chord, _HALF) / 2.0)
+
+class attitudeindex(object):
+    '''
+    % ATTITUDEINDEX Nearest attitude search index constructor
+    %           Builds a k-d tree over a catalog of unit quaternions on the
+    %           4D hypersphere so measured attitudes can be matched against
+    %           millions of reference orientations in O(M log N) instead of
+    %           O(M N). q and -q are the same attitude, so every query is
+    %           made with both signs and the results merged.
+    %
+    % Usage:    I = attitudeindex(q);                  % q is Nx1x4 (or Nx3x3 dcm)
+    %           a, i = I.query(qm);                    % Nearest entry
+    %           a, i = I.query(qm, k=5);               % 5 nearest entries
+    %           l = I.radius(qm, np.radians(2.0));     % Entries within 2 deg
+    %           I.save('catalog.idx');
+    %           I = attitudeindex.load('catalog.idx');
+    %
+    % Inputs:   q         Catalog, Nx1x4 quaternion or Nx3x3 dcm stack
+    %
+    %           leafsize  k-d tree leaf size, default 16
+    %
+    % Outputs:  Angles a are the rotation angle (radians) between the query
+    %           and catalog attitudes; indices i refer to the catalog rows.
+    %
+    % Notes:    Requires scipy. load() unpickles the file, so only load
+    %           indexes from trusted sources.
+    %
+    % See also quaternion, attitudeseries
+    %
+    %==============================================================================
+    '''
+    def __init__(self, q, leafsize=16):
+        if cKDTree is None:
+            raise ImportError('attitudeindex requires scipy')
+        self._tree = cKDTree(_rows(q), leafsize=leafsize)
+        
+    def __len__(self):
+        return self._tree.n
+        
+    '''
+        data - the catalog as an Nx1x4 quaternion (unit, float64)
+    '''
+    @property
+    def data(self):
+        return self._tree.data.reshape(-1, 1, 4).view(Quaternion.quaternion)
+        
+    '''
+        query - k nearest catalog attitudes for each of M query attitudes
+        
+        Returns (angle, index), each Mxk (or M when k is 1). Missing
+        neighbors (k larger than the catalog) have an infinite angle and
+        an index equal to len(self), following scipy.spatial.cKDTree.
+        workers is passed through to cKDTree.query (-1 uses every CPU).
+    '''
+    def query(self, q, k=1, workers=1):
+        p = _rows(q)
+        d0, i0 = self._tree.query(p, k=k, workers=workers)
+        d1, i1 = self._tree.query(-p, k=k, workers=workers)
+        d0 = np.reshape(d0, (p.shape[0], -1))
+        d1 = np.reshape(d1, (p.shape[0], -1))
+        
+        # Each entry is kept only from the sign it is nearer to (ties go
+        # to +q) so the merge below cannot report an entry twice
+        d0[d0 > _HALF] = np.inf
+        d1[d1 >= _HALF] = np.inf
+        
+        d = np.concatenate((d0, d1), axis=1)
+        i = np.concatenate((np.reshape(i0, d0.shape), np.reshape(i1, d1.shape)), axis=1)
+        j = np.argsort(d, axis=1, kind='stable')[:,:k]
+        d = np.take_along_axis(d, j, axis=1)
+        i = np.take_along_axis(i, j, axis=1)
+        missing = np.isinf(d)
+        i[missing] = self._tree.n
+        
+        a = _angle(d)
+        a[missing] = np.inf
+        if (k == 1):
+            return a[:,0], i[:,0]
+        return a, i
+        
+    '''
+        radius - catalog indices within angle (radians) of each query
+        
+        Returns a list holding one sorted index array per query attitude.
+    '''
+    def radius(self, q, angle, workers=1):
+        p = _rows(q)
+        r = _chord(angle)
+        l0 = self._tree.query_ball_point(p, r, workers=workers)
+        l1 = self._tree.query_ball_point(-p, r, workers=workers)
+        return [np.union1d(np.asarray(a, dtype=np.intp), np.asarray(b, dtype=np.intp))
+                for a, b in zip(l0, l1)]
+        
+    '''
+        save - write the built index to filename so it need not be rebuilt
+    '''
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump(self._tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+            
+    '''
+        load - read an index written by save
+    '''
+    @staticmethod
+    def load(filename):
+        with open(filename, 'rb') as f:
+            tree = pickle.load(f)
+        if ((cKDTree is None) or not isinstance(tree, cKDTree)):
+            raise ValueError('File is not an attitude index')
+        index = attitudeindex.__new__(attitudeindex)
+        index._tree = tree
+        return index
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+interpolate - Quaternion interpolation for Astrodynamic Toolkit
+
+Resamples a time varying quaternion (Nx1x4 stack tagged with N times)
+onto a new time base using spherical linear interpolation (SLERP) or
+spherical quadrangle interpolation (SQUAD, continuous angular rate across
+samples).
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import numpy as np
+from Astro import Fast
+from Astro import Quaternion
+
+# Below this angle between neighbors sin(theta) is too small to divide by
+# and a normalized linear blend is indistinguishable from the great arc
+_SMALL_ANGLE = 1.0e-6
+
+'''
+    _bracket - index of the sample at or before each query time and the
+    fraction of the way to the next sample
+    
+    Queries before the first or after the last sample are held at the end
+    points (u is clipped to [0, 1]). Across a zero length segment (repeated
+    sample times) the later sample holds from that time on.
+'''
+def _bracket(t, tq):
+    i = np.searchsorted(t, tq, side='right') - 1
+    np.clip(i, 0, t.shape[0] - 2, out=i)
+    t0 = t[i]
+    t1 = t[i + 1]
+    dt = t1 - t0
+    u = (tq >= t1).astype(np.float64)
+    np.divide(tq - t0, dt, out=u, where=(dt > 0.0))
+    np.clip(u, 0.0, 1.0, out=u)
+    return i, u[:,np.newaxis,np.newaxis]
+
+'''
+    _slerp - great arc blend between two Nx1x4 stacks, u is Nx1x1
+    
+    With shortest True q1 is negated where it is more than 180 degrees
+    from q0 (q and -q are the same attitude) so the shorter arc is taken.
+'''
+def _slerp(q0, q1, u, out, shortest=True):
+    dot = np.sum(q0 * q1, axis=2, keepdims=True)
+    if shortest:
+        sign = np.where(dot < 0.0, -1.0, 1.0)
+        dot *= sign
+        q1 = q1 * sign
+    np.clip(dot, -1.0, 1.0, out=dot)
+    
+    theta = np.arccos(dot)
+    s = np.sin(theta)
+    small = (s < _SMALL_ANGLE)
+    s[small] = 1.0
+    
+    w0 = np.sin((1.0 - u) * theta) / s
+    w1 = np.sin(u * theta) / s
+    
+    # Nearly coincident neighbors, fall back to a linear blend and let
+    # the normalization below put it back on the sphere
+    w0 = np.where(small, 1.0 - u, w0)
+    w1 = np.where(small, u, w1)
+    
+    np.multiply(w0, q0, out=out)
+    out += w1 * q1
+    return Fast.normalize(out, out=out)
+
+'''
+    _align - negate each quaternion in q where it is more than 180 degrees
+    from the matching reference quaternion
+'''
+def _align(q, ref):
+    dot = np.sum(q * ref, axis=2, keepdims=True)
+    return np.where(dot < 0.0, -q, q)
+
+'''
+    _log - vector part of the log of each unit quaternion (Nx1x3)
+'''
+def _log(q):
+    r = q[...,1:4]
+    n = np.sqrt(np.sum(r * r, axis=2, keepdims=True))
+    angle = np.arctan2(n, q[...,0:1])
+    n[n < _SMALL_ANGLE] = 1.0
+    return r * (angle / n)
+
+'''
+    _exp - unit quaternion (Nx1x4) from the exp of a pure vector (Nx1x3)
+'''
+def _exp(v):
+    n = np.sqrt(np.sum(v * v, axis=2, keepdims=True))
+    q = np.empty(v.shape[:2] + (4,))
+    q[...,0:1] = np.cos(n)
+    k = np.ones_like(n)
+    big = (n >= _SMALL_ANGLE)
+    k[big] = np.sin(n[big]) / n[big]
+    q[...,1:4] = v * k
+    return q
+
+'''
+    _intermediate - SQUAD control points s[i] for the neighbors q[i-1],
+    q[i], q[i+1] (already on the same side of the sphere as q[i])
+    
+        s[i] = q[i] * exp(-(log(~q[i] * q[i+1]) + log(~q[i] * q[i-1])) / 4)
+'''
+def _intermediate(qm, q, qp):
+    qi = Fast.inverse(q)
+    v = _log(Fast.multiply(qi, qp))
+    v += _log(Fast.multiply(qi, qm))
+    v *= -0.25
+    return Fast.multiply(q, _exp(v))
+
+'''
+    _prepare - common argument handling for slerp and squad
+'''
+def _prepare(t, q, tq, out):
+    t = np.asarray(t, dtype=np.float64)
+    tq = np.asarray(tq, dtype=np.float64)
+    q = np.asarray(q)
+    if (len(q.shape) < 3):
+        q = q[np.newaxis,...]
+    if (q.shape[1:] != (1,4)):
+        raise ValueError('Only Nx1x4 quaternion stacks can be interpolated')
+    if ((len(t.shape) != 1) or (t.shape[0] != q.shape[0])):
+        raise ValueError('t must have one time per quaternion')
+    if (t.shape[0] < 2):
+        raise ValueError('At least two samples are required to interpolate')
+    if (len(tq.shape) != 1):
+        raise ValueError('tq must be a 1-D array of query times')
+        
+    if out is None:
+        out = np.empty((tq.shape[0],1,4), dtype=np.float64)
+    elif (out.shape != (tq.shape[0],1,4)):
+        raise ValueError('out must have shape ' + str((tq.shape[0],1,4)))
+        
+    return t, q, tq, out
+
+'''
+    slerp - resample a quaternion series with spherical linear interpolation
+    
+    % Usage:    qq = slerp(t, q, tq)
+    %           qq = slerp(t, q, tq, out=buffer, chunk=65536)
+    %
+    % Inputs:   t      Nx1 increasing sample times of q
+    %           q      Nx1x4 quaternion stack (unit quaternions)
+    %           tq     Mx1 query times (any order), held at the end
+    %                  points outside [t[0], t[-1]]
+    %           out    Optional Mx1x4 output buffer
+    %           chunk  Number of queries processed at a time, bounds the
+    %                  working memory independent of M
+    %
+    % Outputs:  qq     Mx1x4 quaternion
+'''
+def slerp(t, q, tq, out=None, chunk=65536):
+    t, q, tq, out = _prepare(t, q, tq, out)
+    o = out.view(np.ndarray)
+    
+    for k in range(0, tq.shape[0], chunk):
+        i, u = _bracket(t, tq[k:k+chunk])
+        _slerp(q[i], q[i + 1], u, o[k:k+chunk])
+        
+    return out.view(Quaternion.quaternion)
+
+'''
+    squad - resample a quaternion series with spherical quadrangle
+    interpolation
+    
+    Like slerp but the angular rate is continuous across samples (C1), at
+    the cost of three slerps per query. Same arguments as slerp.
+'''
+def squad(t, q, tq, out=None, chunk=65536):
+    t, q, tq, out = _prepare(t, q, tq, out)
+    o = out.view(np.ndarray)
+    n = t.shape[0]
+    
+    for k in range(0, tq.shape[0], chunk):
+        i, u = _bracket(t, tq[k:k+chunk])
+        
+        # Neighborhood of each bracket, clamped at the ends of the series,
+        # and all pulled onto the same side of the sphere as q[i]
+        q1 = q[i]
+        q0 = _align(q[np.maximum(i - 1, 0)], q1)
+        q2 = _align(q[i + 1], q1)
+        q3 = _align(q[np.minimum(i + 2, n - 1)], q2)
+        
+        s1 = _intermediate(q0, q1, q2)
+        s2 = _intermediate(q1, q2, q3)
+        
+        a = np.empty_like(q1)
+        b = np.empty_like(q1)
+        _slerp(q1, q2, u, a, shortest=False)
+        _slerp(s1, s2, u, b, shortest=False)
+        _slerp(a, b, 2.0 * u * (1.0 - u), o[k:k+chunk], shortest=False)
+        
+    return out.view(Quaternion.quaternion)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+orbit - Vectorized Kepler orbit propagation for Astrodynamic Toolkit
+
+Propagates element sets for thousands of objects at once with two body
+motion and optional secular J2 drift, returning position/velocity stacks
+on arbitrary time grids and LVLH dcm frames that chain with the attitude
+types.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import numpy as np
+from Astro import Dcm
+
+# Earth constants (WGS-84 / EGM-96), SI units
+MU_EARTH = 3.986004418e14       # m^3/s^2
+R_EARTH = 6378137.0             # m
+J2_EARTH = 1.08262668e-3
+
+'''
+    kepler - eccentric anomaly E for each mean anomaly M by solving
+    
+        M = E - e sin(E)
+    
+    with a vectorized Newton (default) or Halley iteration. Only the
+    entries that have not yet converged (|dE| > tolerance) are updated on
+    each pass, so a few slow (high eccentricity) objects do not cost a
+    full pass over the whole set. M and e broadcast together.
+'''
+def kepler(M, e, tolerance=1.0e-12, iterations=30, method='newton'):
+    if (method not in ('newton', 'halley')):
+        raise ValueError('method must be either "newton" or "halley"')
+        
+    M, e = np.broadcast_arrays(np.asarray(M, dtype=np.float64),
+                               np.asarray(e, dtype=np.float64))
+    shape = M.shape
+    M = np.remainder(M.ravel(), 2.0 * np.pi)
+    e = e.ravel()
+    
+    # Starting guess good for all 0 <= e < 1 (pi for highly eccentric orbits)
+    E = np.where(e < 0.8, M + e * np.sin(M), np.pi)
+    idx = np.arange(E.shape[0])
+    
+    for k in range(iterations):
+        if (idx.shape[0] == 0):
+            break
+        x = E[idx]
+        ek = e[idx]
+        s = ek * np.sin(x)
+        c = ek * np.cos(x)
+        f = x - s - M[idx]
+        if (method == 'halley'):
+            d = f * (1.0 - c) / ((1.0 - c) * (1.0 - c) - 0.5 * f * s)
+        else:
+            d = f / (1.0 - c)
+        E[idx] = x - d
+        idx = idx[np.abs(d) > tolerance]
+        
+    return E.reshape(shape)
+
+'''
+    lvlh - local vertical local horizontal frames for position and velocity
+    stacks (...x3)
+    
+    The rows of each DCM are the LVLH axes in inertial coordinates, so the
+    DCM takes inertial vectors into LVLH
+    
+        z  nadir, -r/|r|
+        y  negative orbit normal, -(r x v)/|r x v|
+        x  y cross z, along the velocity for circular orbits
+'''
+def lvlh(r, v, out=None):
+    r = np.asarray(r, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    if out is None:
+        out = np.empty(np.broadcast(r, v).shape[:-1] + (3,3))
+    d = out.view(np.ndarray)
+    
+    h = np.cross(r, v)
+    np.divide(r, -np.linalg.norm(r, axis=-1, keepdims=True), out=d[...,2,:])
+    np.divide(h, -np.linalg.norm(h, axis=-1, keepdims=True), out=d[...,1,:])
+    d[...,0,:] = np.cross(d[...,1,:], d[...,2,:])
+    return out.view(Dcm.dcm)
+
+class orbit(object):
+    '''
+    % ORBIT Orbit propagator constructor
+    %           Holds classical element sets for N objects in a structure of
+    %           arrays layout (one length N array per element) and
+    %           propagates them all at once with two body motion, optionally
+    %           adding the secular J2 drift of the node, argument of
+    %           perigee, and mean anomaly.
+    %
+    % Usage:    O = orbit(a, e, i, raan, argp, M0);
+    %           O = orbit(a, e, i, raan, argp, M0, epoch=t0, j2=True);
+    %           r, v = O.propagate(t);         % t scalar -> Nx3, K times -> KxNx3
+    %           D = O.lvlh(t);                 % Nx3x3 (or KxNx3x3) dcm
+    %
+    % Inputs:   a        Semi-major axis (m)
+    %           e        Eccentricity, 0 <= e < 1
+    %           i        Inclination (rad)
+    %           raan     Right ascension of the ascending node (rad)
+    %           argp     Argument of perigee (rad)
+    %           M0       Mean anomaly at epoch (rad)
+    %
+    %           Each is a scalar or length N array (broadcast together).
+    %
+    %           epoch    Time of the elements (s), scalar or length N
+    %           mu       Gravitational parameter (m^3/s^2), default Earth
+    %           j2       True to include secular J2 rates (default False)
+    %           radius   Equatorial radius for J2 (m), default Earth
+    %           J2       J2 coefficient, default Earth
+    %
+    % Outputs:  r, v     Inertial position (m) and velocity (m/s)
+    %
+    % See also dcm, kepler, lvlh
+    %
+    %==============================================================================
+    '''
+    def __init__(self, a, e, i, raan, argp, M0, epoch=0.0, mu=MU_EARTH,
+                 j2=False, radius=R_EARTH, J2=J2_EARTH):
+        (self.a, self.e, self.i, self.raan,
+         self.argp, self.M0, self.epoch) = [np.array(x, dtype=np.float64) for x in
+                                            np.broadcast_arrays(*[np.atleast_1d(x) for x in
+                                                                  (a, e, i, raan, argp, M0, epoch)])]
+        if np.any((self.e < 0.0) | (self.e >= 1.0)):
+            raise ValueError('Only elliptical orbits (0 <= e < 1) can be propagated')
+        if np.any(self.a <= 0.0):
+            raise ValueError('Semi-major axis must be positive')
+            
+        self.mu = float(mu)
+        self.j2 = bool(j2)
+        self.radius = float(radius)
+        self.J2 = float(J2)
+        self._rates()
+        
+    def __len__(self):
+        return self.a.shape[0]
+        
+    '''
+        _rates - mean motion and the secular J2 rates of the node, argument
+        of perigee, and mean anomaly
+    '''
+    def _rates(self):
+        self.n = np.sqrt(self.mu / self.a**3)
+        if self.j2:
+            p = self.a * (1.0 - self.e * self.e)
+            k = 1.5 * self.J2 * (self.radius / p)**2 * self.n
+            si2 = np.sin(self.i)**2
+            self.raanDot = -k * np.cos(self.i)
+            self.argpDot = k * (2.0 - 2.5 * si2)
+            self.MDot = self.n + k * np.sqrt(1.0 - self.e * self.e) * (1.0 - 1.5 * si2)
+        else:
+            self.raanDot = np.zeros_like(self.n)
+            self.argpDot = np.zeros_like(self.n)
+            self.MDot = self.n
+            
+    '''
+        propagate - position and velocity of every object at the times t
+        
+        t is a scalar (returns Nx3 stacks) or K times (returns KxNx3).
+        out may be an (r, v) pair of preallocated arrays of that shape.
+    '''
+    def propagate(self, t, out=None, tolerance=1.0e-12, method='newton'):
+        t = np.asarray(t, dtype=np.float64)
+        dt = t.reshape(-1, 1) - self.epoch
+        
+        e = self.e
+        M = self.M0 + self.MDot * dt
+        E = kepler(M, e, tolerance=tolerance, method=method)
+        W = self.raan + self.raanDot * dt
+        w = self.argp + self.argpDot * dt
+        
+        cW, sW = np.cos(W), np.sin(W)
+        cw, sw = np.cos(w), np.sin(w)
+        ci, si = np.cos(self.i), np.sin(self.i)
+        cE, sE = np.cos(E), np.sin(E)
+        b = np.sqrt(1.0 - e * e)
+        
+        # Perifocal coordinates and rates, rotated by the P and Q unit vectors
+        # (the mean anomaly advances at MDot, which includes the J2 drift)
+        x = self.a * (cE - e)
+        y = self.a * b * sE
+        k = self.MDot * self.a / (1.0 - e * cE)
+        xDot = -k * sE
+        yDot = k * b * cE
+        
+        P = np.stack((cW * cw - sW * sw * ci, sW * cw + cW * sw * ci, sw * si), axis=-1)
+        Q = np.stack((-cW * sw - sW * cw * ci, -sW * sw + cW * cw * ci, cw * si), axis=-1)
+        
+        if out is None:
+            r = np.empty(P.shape)
+            v = np.empty(P.shape)
+        else:
+            r, v = out
+            r = r.reshape(P.shape)
+            v = v.reshape(P.shape)
+        np.multiply(x[...,np.newaxis], P, out=r)
+        r += y[...,np.newaxis] * Q
+        np.multiply(xDot[...,np.newaxis], P, out=v)
+        v += yDot[...,np.newaxis] * Q
+        
+        # The perifocal frame itself turns with the node (about z) and the
+        # perigee (about the orbit normal h = P x Q): v += w x r
+        if self.j2:
+            h = np.stack((sW * si, -cW * si, np.broadcast_to(ci, sW.shape)), axis=-1)
+            omega = self.argpDot[...,np.newaxis] * h
+            omega[...,2] += self.raanDot
+            v += np.cross(omega, r)
+        
+        if (t.ndim == 0):
+            return r[0], v[0]
+        return r, v
+        
+    '''
+        lvlh - LVLH frame (dcm, inertial to LVLH) of every object at the
+        times t; Nx3x3 for a scalar t or KxNx3x3 for K times
+    '''
+    def lvlh(self, t, out=None):
+        r, v = self.propagate(t)
+        return lvlh(r, v, out=out)
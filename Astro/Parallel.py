@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+parallel - Multi-core execution of the Astro.fast kernels
+
+Partitions large dcm/quaternion stacks into contiguous slabs that live in
+multiprocessing.shared_memory and runs the Astro.fast kernels on each
+slab in a process pool. Only the block names, offsets, shapes and strides
+are pickled to the workers; payloads are never copied between processes
+and results are written in place into shared output blocks that the
+caller gets back as ordinary dcm/quaternion views.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Quaternion
+
+'''
+    _work - run one Astro.fast kernel over rows start:stop (worker side)
+    
+    Each spec is (name, offset, shape, strides, dtype string) of an array
+    in a shared block. Inputs with a single row (e.g., one attitude
+    applied to a whole vector stack) are broadcast rather than sliced.
+'''
+def _work(kernel, specs, outSpec, start, stop):
+    blocks = {}
+    def attach(spec):
+        name, offset, shape, strides, dtype = spec
+        if name not in blocks:
+            blocks[name] = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf,
+                          offset=offset, strides=strides)
+        
+    args = []
+    for spec in specs:
+        x = attach(spec)
+        args.append(x if (x.shape[0] == 1) else x[start:stop])
+    out = attach(outSpec)[start:stop]
+    getattr(Fast, kernel)(*args, out=out)
+    
+    # Drop every view before detaching so the mappings can be closed
+    del args, out, x
+    for shm in blocks.values():
+        shm.close()
+    return stop - start
+
+class _shared(shared_memory.SharedMemory):
+    '''
+    SharedMemory block that is not closed when the object is collected.
+    Arrays handed back to the caller are built on the block buffer and
+    keep the mapping alive through it; the mapping is released when the
+    last of them is gone rather than pulled out from under them.
+    '''
+    def __del__(self):
+        pass
+
+class executor(object):
+    '''
+    % EXECUTOR  Parallel executor constructor
+    %           Creates a process pool and the shared memory blocks used to
+    %           run Astro.fast kernels across cores.
+    %
+    % Usage:    with executor(workers=8) as X:
+    %               d = X.share(d)          % optional, avoids a copy per call
+    %               q = X.to_quat(d)
+    %               X.normalize(q, out=q)
+    %
+    % Inputs:   workers  Number of worker processes (default os.cpu_count())
+    %
+    %           slabs    Number of contiguous slabs each stack is split into
+    %                    (default workers)
+    %
+    % Notes:    Stacks that do not already live in one of the executor's
+    %           shared blocks are copied into one first. Results stay valid
+    %           after close(); the shared blocks are unlinked at close and
+    %           released once the last view of them is gone.
+    %
+    % See also fast
+    %
+    %==============================================================================
+    '''
+    def __init__(self, workers=None, slabs=None):
+        self.workers = workers if workers else os.cpu_count()
+        self.slabs = slabs if slabs else self.workers
+        self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self._blocks = []
+        
+    '''
+        empty - uninitialized array in a new shared block
+    '''
+    def empty(self, shape, dtype=np.float64, cls=np.ndarray):
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        shm = _shared(create=True, size=size)
+        
+        x = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        
+        # Remember where the block is mapped so views of it can be found
+        # again from any array handed to the executor
+        self._blocks.append((shm, x.__array_interface__['data'][0], size))
+        
+        return x.view(cls)
+        
+    '''
+        share - x itself if it already lives in a shared block of this
+        executor, otherwise a copy of x (same class) in a new shared block
+    '''
+    def share(self, x):
+        x = np.asanyarray(x)
+        if self._spec(x) is not None:
+            return x
+        cls = type(x) if isinstance(x, (Dcm.dcm, Quaternion.quaternion)) else np.ndarray
+        s = self.empty(x.shape, x.dtype, cls)
+        s[...] = x
+        return s
+        
+    def _spec(self, x):
+        address = x.__array_interface__['data'][0]
+        for shm, base, size in self._blocks:
+            if (base <= address < base + size):
+                return (shm.name, address - base, x.shape, x.strides, x.dtype.str)
+        return None
+        
+    '''
+        _input - spec of an input, copying it into a temporary shared block
+        if it does not already live in one (returns the spec and the
+        temporary block or None)
+        
+        The copy is not returned, so once the spec is built nothing in this
+        process refers to the temporary block and it can be released.
+    '''
+    def _input(self, x):
+        x = np.asanyarray(x).view(np.ndarray)
+        spec = self._spec(x)
+        if spec is not None:
+            return spec, None
+        spec = self._spec(self.share(x).view(np.ndarray))
+        return spec, self._blocks[-1]
+        
+    '''
+        _release - unlink a temporary block once the workers are done with it
+    '''
+    def _release(self, block):
+        self._blocks.remove(block)
+        block[0].close()
+        block[0].unlink()
+        
+    '''
+        _map - run a kernel over slabs of the inputs into out
+        
+        Inputs that are not already shared are copied into temporary blocks
+        for the call only; they are unlinked when the call completes.
+    '''
+    def _map(self, kernel, inputs, out):
+        outSpec = self._spec(out.view(np.ndarray))
+        if outSpec is None:
+            raise ValueError('out must be an array from this executor (see empty or share)')
+            
+        specs = []
+        temporary = []
+        try:
+            for x in inputs:
+                spec, block = self._input(x)
+                specs.append(spec)
+                if block is not None:
+                    temporary.append(block)
+                    
+            n = out.shape[0]
+            bounds = np.linspace(0, n, min(self.slabs, n) + 1).astype(int)
+            futures = [self._pool.submit(_work, kernel, specs, outSpec, int(a), int(b))
+                       for a, b in zip(bounds[:-1], bounds[1:]) if (b > a)]
+            for f in futures:
+                f.result()
+        finally:
+            for block in temporary:
+                self._release(block)
+        return out
+        
+    def _out(self, out, shape, dtype, cls):
+        if out is None:
+            return self.empty(shape, dtype, cls)
+        if (out.shape != shape):
+            raise ValueError('out must have shape ' + str(shape))
+        return out
+        
+    '''
+        to_quat - Nx3x3 DCM stack to Nx1x4 quaternion stack
+    '''
+    def to_quat(self, d, out=None):
+        d = np.asanyarray(d)
+        out = self._out(out, (d.shape[0],1,4), d.dtype, Quaternion.quaternion)
+        return self._map('to_quat', (d,), out)
+        
+    '''
+        to_dcm - Nx1x4 quaternion stack to Nx3x3 DCM stack
+    '''
+    def to_dcm(self, q, out=None):
+        q = np.asanyarray(q)
+        out = self._out(out, (q.shape[0],3,3), q.dtype, Dcm.dcm)
+        return self._map('to_dcm', (q,), out)
+        
+    '''
+        multiply - Hamilton product of two Nx1x4 quaternion stacks
+    '''
+    def multiply(self, a, b, out=None):
+        a = np.asanyarray(a)
+        b = np.asanyarray(b)
+        shape = np.broadcast_shapes(a.shape, b.shape)
+        out = self._out(out, shape, np.result_type(a, b), Quaternion.quaternion)
+        return self._map('multiply', (a, b), out)
+        
+    '''
+        rotate - rotate an Nx3 or NxMx3 vector stack by a quaternion or DCM
+        stack (out may be v for an in-place rotation)
+    '''
+    def rotate(self, x, v, out=None):
+        x = np.asanyarray(x)
+        v = np.asanyarray(v)
+        shape = np.broadcast_shapes(x.shape[:1], v.shape[:1]) + v.shape[1:]
+        out = self._out(out, shape, np.result_type(x, v), np.ndarray)
+        return self._map('rotate', (x, v), out)
+        
+    '''
+        normalize - scale each quaternion to unit length (out may be q for
+        an in-place normalization)
+    '''
+    def normalize(self, q, out=None):
+        q = np.asanyarray(q)
+        out = self._out(out, q.shape, q.dtype, Quaternion.quaternion)
+        return self._map('normalize', (q,), out)
+        
+    '''
+        close - shut down the workers and unlink the shared blocks
+        
+        Each block stays mapped in this process until the last view of it
+        is gone, so results remain usable after close.
+    '''
+    def close(self):
+        self._pool.shutdown()
+        for shm, base, size in self._blocks:
+            shm.unlink()
+        self._blocks = []
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *args):
+        self.close()
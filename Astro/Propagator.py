@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+propagator - Attitude propagation class for Astrodynamic Toolkit
+
+Integrates body angular rate samples into a time varying quaternion for
+one vehicle or a whole fleet of independent vehicles in lockstep.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import numpy as np
+from Astro import Fast
+from Astro import Quaternion
+
+class propagator(object):
+    '''
+    % PROPAGATOR Attitude propagator constructor
+    %           Creates a propagator that integrates body angular rates into
+    %           quaternions using the kinematic equation
+    %
+    %               qdot = 0.5 * q * [0, w]
+    %
+    %           for K independent vehicles at once. Rates may be fed in
+    %           chunks (streaming); the attitude, last rate sample and
+    %           renormalization count are carried between calls.
+    %
+    % Usage:    P = propagator(q0, dt);
+    %           P = propagator(q0, dt, method='rk4', renormalize=10);
+    %           q = P.propagate(w);
+    %
+    % Inputs:   q0           Initial attitude, quaternion (1x1x4 or Kx1x4)
+    %                        Default is the identity for a single vehicle
+    %
+    %           dt           Time between rate samples (seconds)
+    %
+    %           method       'exp' (default) exponential map step at the
+    %                        mean rate of the two samples bounding the step,
+    %                        exact when the rate is constant over the step
+    %                        'rk2' Heun (trapezoidal) Runge-Kutta
+    %                        'rk4' classic Runge-Kutta with the midpoint
+    %                        rate taken as the mean of the bounding samples
+    %
+    %           renormalize  Number of steps between renormalization of the
+    %                        attitude (default 1, every step; 0 never)
+    %
+    %           w            Nx3 (single vehicle) or KxNx3 rate samples
+    %                        (rad/s) in the body frame
+    %
+    % Outputs:  q            Nx1x4 (single vehicle) or KxNx1x4 quaternion,
+    %                        one attitude per rate sample. The very first
+    %                        sample of a propagator is the initial attitude.
+    %
+    % See also quaternion
+    %
+    %==============================================================================
+    '''
+    def __init__(self, q0=None, dt=1.0, method='exp', renormalize=1):
+        if (method.lower() not in ('exp', 'rk2', 'rk4')):
+            raise ValueError('method must be one of "exp", "rk2", or "rk4"')
+        self.method = method.lower()
+        self.dt = float(dt)
+        self.renormalize = int(renormalize)
+        self.reset(q0)
+        
+    '''
+        reset - restart propagation from a new initial attitude
+    '''
+    def reset(self, q0=None):
+        if q0 is None:
+            q0 = Quaternion.quaternion()
+        q0 = np.array(q0, dtype=np.float64)
+        if (len(q0.shape) < 3):
+            q0 = q0[np.newaxis,...]
+        if (q0.shape[1:] != (1,4)):
+            raise ValueError('q0 must be a 1x1x4 or Kx1x4 quaternion')
+        
+        self.q = q0
+        self.w = None
+        self._count = 0
+        
+    '''
+        _derivative - qdot = 0.5 * q * [0, w] for Kx1x4 q and Kx1x3 w
+        
+        p is a Kx1x4 buffer for the pure quaternion [0, w] whose scalar
+        part is already zero.
+    '''
+    def _derivative(self, q, w, out, scratch, p):
+        p[...,1:4] = w
+        Fast.multiply(q, p, out=out, scratch=scratch)
+        out *= 0.5
+        return out
+        
+    '''
+        _increments - exponential map rotation over each step (KxNx4)
+        
+        dq = [cos(|w| dt / 2), w / |w| sin(|w| dt / 2)]
+    '''
+    def _increments(self, w):
+        half = 0.5 * self.dt * w
+        angle = np.sqrt(np.sum(half * half, axis=-1, keepdims=True))
+        dq = np.empty(w.shape[:-1] + (4,))
+        dq[...,0:1] = np.cos(angle)
+        
+        # sin(x)/x -> 1 as x -> 0
+        k = np.ones_like(angle)
+        big = (angle > 1.0e-8)
+        k[big] = np.sin(angle[big]) / angle[big]
+        dq[...,1:4] = half * k
+        return dq
+        
+    '''
+        propagate - integrate the next chunk of rate samples
+    '''
+    def propagate(self, w, out=None):
+        w = np.asarray(w, dtype=np.float64)
+        single = (len(w.shape) == 2)
+        if single:
+            w = w[np.newaxis,...]
+        if ((len(w.shape) != 3) or (w.shape[-1] != 3)):
+            raise ValueError('Rates must be Nx3 or KxNx3')
+            
+        K = np.broadcast_shapes(self.q.shape[:1], w.shape[:1])[0]
+        n = w.shape[1]
+        w = np.broadcast_to(w, (K,) + w.shape[1:])
+        single = (single and (K == 1))
+        if (self.q.shape[0] != K):
+            self.q = np.repeat(self.q, K, axis=0)
+        if ((self.w is not None) and (self.w.shape[0] != K)):
+            self.w = np.repeat(self.w, K, axis=0)
+            
+        shape = (n, 1, 4) if single else (K, n, 1, 4)
+        if out is None:
+            out = np.empty(shape)
+        elif (out.shape != shape):
+            raise ValueError('out must have shape ' + str(shape))
+        o = out.view(np.ndarray)
+        if single:
+            o = o[np.newaxis,...]
+        
+        if (n > 0):
+            # Each step is bounded by the previous sample and this one. The
+            # first sample ever seen has no predecessor and is simply the
+            # initial attitude
+            if self.w is None:
+                o[:,0] = self.q
+                w0 = w[:,0:1]
+                first = 1
+            else:
+                w0 = self.w[:,np.newaxis,:]
+                first = 0
+            wa = np.concatenate((w0, w[:,first:]), axis=1)
+            
+            scratch = np.empty((K,1))
+            if (self.method == 'exp'):
+                dq = self._increments(0.5 * (wa[:,:-1] + wa[:,1:]))
+                
+                # For a fleet o[:,j] and the state o[:,j-1] are strided views
+                # of one buffer that Fast.multiply cannot prove disjoint, so
+                # it forms the product in work; reuse one for every step
+                work = np.empty((K,1,4))
+                for j in range(first, n):
+                    Fast.multiply(self.q, dq[:,j-first,np.newaxis,:], out=o[:,j],
+                                  scratch=scratch, work=work)
+                    self.q = self._renormalize(o[:,j])
+            else:
+                k1 = np.empty((K,1,4))
+                k2 = np.empty((K,1,4))
+                k3 = np.empty((K,1,4))
+                k4 = np.empty((K,1,4))
+                p = np.zeros((K,1,4))
+                h = self.dt
+                for j in range(first, n):
+                    wl = wa[:,j-first,np.newaxis,:]
+                    wr = wa[:,j-first+1,np.newaxis,:]
+                    q = self.q
+                    if (self.method == 'rk2'):
+                        self._derivative(q, wl, k1, scratch, p)
+                        self._derivative(q + h * k1, wr, k2, scratch, p)
+                        k1 += k2
+                        k1 *= 0.5 * h
+                    else:
+                        wm = 0.5 * (wl + wr)
+                        self._derivative(q, wl, k1, scratch, p)
+                        self._derivative(q + (0.5 * h) * k1, wm, k2, scratch, p)
+                        self._derivative(q + (0.5 * h) * k2, wm, k3, scratch, p)
+                        self._derivative(q + h * k3, wr, k4, scratch, p)
+                        k2 += k3
+                        k2 *= 2.0
+                        k1 += k2
+                        k1 += k4
+                        k1 *= h / 6.0
+                    np.add(q, k1, out=o[:,j])
+                    self.q = self._renormalize(o[:,j])
+                    
+            self.q = self.q.copy()
+            self.w = w[:,-1].copy()
+            
+        return out.view(Quaternion.quaternion)
+        
+    '''
+        _renormalize - batched renormalization of the Kx1x4 state every
+        renormalize steps
+    '''
+    def _renormalize(self, q):
+        self._count += 1
+        if ((self.renormalize > 0) and (self._count >= self.renormalize)):
+            Fast.normalize(q, out=q)
+            self._count = 0
+        return q
+
+'''
+    propagate - integrate a complete rate history in one call
+    
+    Convenience wrapper around propagator for data that fits in memory;
+    see propagator for the arguments.
+'''
+def propagate(w, dt, q0=None, method='exp', renormalize=1):
+    return propagator(q0, dt, method=method, renormalize=renormalize).propagate(w)
@@ -33,6 +33,7 @@ SOFTWARE.
 
 import numpy as np
 from Astro import Dcm
+from Astro import Fast
 
 class quaternion(np.ndarray):
     '''
@@ -68,6 +69,9 @@ class quaternion(np.ndarray):
     %           option2  Used to specify if theta should be dataunit. A string
     %                    corresponding to a valid angular unit (e.g., 'rad', 'deg').
     %
+    %           dtype    Optional storage type, e.g., np.float32 to halve the
+    %                    footprint of long series (see Soa for the accuracy)
+    %
     % Outputs:  q        The quaternion object
     %
     %           theta    The eigenangle (1xN double (radians) or dataunit)
@@ -87,6 +91,14 @@ class quaternion(np.ndarray):
         # Crease an exception we can just reference for convenience
         dimError = ValueError('Only 3x3xN, 4xN, 9xN, dcm, or quaternion allowed.')
         
+        # Optional storage type, e.g., np.float32 to halve the footprint
+        # of long series. Default keeps the input type (float64 for
+        # anything converted from a dcm)
+        dtype = None
+        for key in kwargs:
+            if (key.lower() == 'dtype'):
+                dtype = kwargs[key]
+        
         if data is None:
            data = np.zeros([1,1,4])
            data[:,:,0] = 1
@@ -99,13 +111,13 @@ class quaternion(np.ndarray):
 
         inType = type(data)
         if (issubclass(inType,quaternion)):
-            q = data
+            q = data if (dtype is None) else data.astype(dtype, copy=False)
         elif (issubclass(inType,list) or
               issubclass(inType,np.ndarray)):
                 
             # TODO: If data has units, strip the units they are not required
                 
-            q = np.array(data).view(cls)
+            q = np.array(data, dtype=dtype).view(cls)
             
             # Parse the dimensions to fiqure out what we have
             # t slices (in "time" or sequence)
@@ -129,43 +141,7 @@ class quaternion(np.ndarray):
             # with Shepperd's method (c. 1978 Journal of Guidance, Control, and Dynamics) 
             # to reduce affects of singularities
             #
-            # The following c-style code exemplifies the logic that will
-            # be implemented using the index slicing in python
-            #
-            #float tr = m00 + m11 + m22
-            #
-            # if (tr > 0) 
-            # { 
-            #   float S = sqrt(tr+1.0) * 2; // S=4*qw 
-            #   qw = 0.25 * S;
-            #   qx = (m21 - m12) / S;
-            #   qy = (m02 - m20) / S; 
-            #   qz = (m10 - m01) / S; 
-            # } 
-            # else if ((m00 > m11)&(m00 > m22)) // m00 is max
-            # { 
-            #   float S = sqrt(1.0 + m00 - m11 - m22) * 2; // S=4*qx 
-            #   qw = (m21 - m12) / S;
-            #   qx = 0.25 * S;
-            #   qy = (m01 + m10) / S; 
-            #   qz = (m02 + m20) / S; 
-            # } 
-            # else if (m11 > m22) // m11 is max
-            # { 
-            #   float S = sqrt(1.0 + m11 - m00 - m22) * 2; // S=4*qy
-            #   qw = (m02 - m20) / S;
-            #   qx = (m01 + m10) / S; 
-            #   qy = 0.25 * S;
-            #   qz = (m12 + m21) / S; 
-            # } 
-            # else // m22 is max
-            # { 
-            #   float S = sqrt(1.0 + m22 - m00 - m11) * 2; // S=4*qz
-            #   qw = (m10 - m01) / S;
-            #   qx = (m02 + m20) / S;
-            #   qy = (m12 + m21) / S;
-            #   qz = 0.25 * S;
-            # }            
+            # See Fast.to_quat for the single pass formulation
             if ((r==1 and c==9) or (r==3 and c==3)):
                 # Parse the keyword arguments, extracting what makes sense
                 # and tossing what doesn't
@@ -180,71 +156,11 @@ class quaternion(np.ndarray):
                 else:
                     rowcol = 'rows'
                     
-                d = Dcm.dcm(data,direction=rowcol)
-                
-                diagonal = d.diagonal()
-
-                trace = sum(diagonal)
-                idx_trace_positive = np.where(trace > 0)[0]
-
-                # Numpy does not provide a function that returns
-                # both the index and the max value, but since we don't
-                # really need to max values in this algorithm we can just
-                # use the index function
-                idx_diag_max = np.argmax(diagonal,axis=0)
-                
-                # Avoid duplication of trace positive with one of the
-                # dominant diagonals
-                idx0 = np.setdiff1d(np.where(idx_diag_max == 0)[0], idx_trace_positive)
-                idx1 = np.setdiff1d(np.where(idx_diag_max == 1)[0], idx_trace_positive)
-                idx2 = np.setdiff1d(np.where(idx_diag_max == 2)[0], idx_trace_positive)
-                
-                q = np.nan * np.zeros((t,1,4))
-                
-                if (idx_trace_positive.shape[0] != 0):      # Where the trace is dominant
- 
-                    m = d[idx_trace_positive].view(np.ndarray)
-
-                    S = 2.0 * np.sqrt(trace[idx_trace_positive] + 1.0)
-                                    
-                    q[idx_trace_positive,0,0] = 0.25 * S
-                    q[idx_trace_positive,0,1] = (m[:,2,1] - m[:,1,2]) / S
-                    q[idx_trace_positive,0,2] = (m[:,0,2] - m[:,2,0]) / S
-                    q[idx_trace_positive,0,3] = (m[:,1,0] - m[:,0,1]) / S
-                    
-                if (idx0.shape[0] != 0):                    # Where m00 is dominant
-                    
-                    m = d[idx0].view(np.ndarray)
-                    
-                    S = 2.0 * np.sqrt(1.0 + m[:,0,0] - m[:,1,1] - m[:,2,2])
-                     
-                    q[idx0,0,0] = (m[:,2,1] - m[:,1,2]) / S
-                    q[idx0,0,1] = 0.25 * S
-                    q[idx0,0,2] = (m[:,0,1] + m[:,1,0]) / S
-                    q[idx0,0,3] = (m[:,0,2] + m[:,2,0]) / S
-            
-                if (idx1.shape[0] != 0):                    # Where m11 is dominant
-                    
-                    m = d[idx1].view(np.ndarray)
-                    
-                    S = 2.0 * np.sqrt(1.0 + m[:,1,1] - m[:,0,0] - m[:,2,2])
-                    
-                    q[idx1,0,0] = (m[:,0,2] - m[:,2,0]) / S
-                    q[idx1,0,1] = (m[:,0,1] + m[:,1,0]) / S
-                    q[idx1,0,2] = 0.25 * S
-                    q[idx1,0,3] = (m[:,1,2] + m[:,2,1]) / S
-                        
-                if (idx2.shape[0] != 0):                    # Where m22 is dominant
-                    
-                    m = d[idx2].view(np.ndarray)
-                    
-                    S = 2.0 * np.sqrt(1.0 + m[:,2,2] - m[:,0,0] - m[:,1,1])
-                    
-                    q[idx2,0,0] = (m[:,1,0] - m[:,0,1]) / S
-                    q[idx2,0,1] = (m[:,0,2] + m[:,2,0]) / S
-                    q[idx2,0,2] = (m[:,1,2] + m[:,2,1]) / S
-                    q[idx2,0,3] = 0.25 * S
+                d = Dcm.dcm(data,direction=rowcol).view(np.ndarray)
+                if (len(d.shape) < 3):
+                    d = d[np.newaxis,...]
                 
+                q = Fast.to_quat(d, dtype=dtype)
                 
         else:
             raise TypeError('Input must be derived from list, np.array, dcm, or quaternion')
@@ -278,13 +194,161 @@ class quaternion(np.ndarray):
     def transpose(self):
         # If the user sliced off the t (sequence) axis we need to
         # only transpose the axes present in the correct order
-        x = np.array([1, -1, -1, -1])
-        if (len(self.shape) < 3):
-            return x * self[np.newaxis,...].view(quaternion)
-        else:
-            return x * self
+        q = self.view(np.ndarray)
+        if (len(q.shape) < 3):
+            q = q[np.newaxis,...]
+        return Fast.inverse(q).view(quaternion)
+
+    '''
+    invert - conjugate (inverse) of each unit quaternion in the stack
+    
+    Like transpose but out may be supplied, including self for an in-place
+    conjugation that allocates nothing.
+    '''
+    def invert(self, out=None):
+        q = self.view(np.ndarray)
+        if (len(q.shape) < 3):
+            q = q[np.newaxis,...]
+        if out is not None:
+            Fast.inverse(q, out=out.view(np.ndarray))
+            return out
+        return Fast.inverse(q).view(quaternion)
+
+    '''
+    normalize - scale each quaternion in the stack to unit length
+    
+    out may be self for an in-place normalization that reuses the
+    quaternion's work buffers (see _workspace and release).
+    '''
+    def normalize(self, out=None):
+        q = self.view(np.ndarray)
+        if (len(q.shape) < 3):
+            q = q[np.newaxis,...]
+        if isinstance(out, quaternion) and (out.shape == q.shape):
+            work, scratch = out._workspace()
+            Fast.normalize(q, out=out.view(np.ndarray), work=scratch)
+            return out
+        if out is not None:
+            Fast.normalize(q, out=out.view(np.ndarray))
+            return out
+        return Fast.normalize(q).view(quaternion)
+
+    '''
+    _workspace - Nx1x4 work and Nx1 scratch buffers kept on the quaternion
+    
+    Allocated on first use and reused by every later in-place operation on
+    the same stack, so a loop such as q @= dq allocates nothing after its
+    first pass. The cost is a second copy of the stack (plus a quarter for
+    the scratch) that lives as long as the quaternion does; call release()
+    to drop it, e.g., after the loop on a large stack.
+    '''
+    def _workspace(self):
+        shape = self.shape if (len(self.shape) == 3) else (1,) + self.shape
+        w = getattr(self, '_work', None)
+        if ((w is None) or (w[0].shape != shape) or (w[0].dtype != self.dtype)):
+            w = (np.empty(shape, dtype=self.dtype), np.empty(shape[:-1], dtype=self.dtype))
+            self._work = w
+        return w
+
+    '''
+    release - drop the work buffers of in-place operations (see _workspace)
+    
+    They are allocated again by the next in-place operation.
+    '''
+    def release(self):
+        self._work = None
+
+    '''
+    multiply - Hamilton product of two quaternion stacks (self * b)
+    
+    The sequence axes are broadcast against each other so a single
+    quaternion can be applied to a stack (1 vs N, N vs 1) or two stacks
+    can be multiplied sample by sample (N vs N).
+    
+    If out is supplied (Nx1x4) the product is written directly into it.
+    A quaternion out lends its work buffers (see _workspace), so nothing
+    is allocated even when out is one of the inputs (q @= dq).
+    '''
+    def multiply(self, b, out=None):
+        a = self.view(np.ndarray)
+        b = np.asarray(b)
+        if (len(a.shape) < 3):
+            a = a[np.newaxis,...]
+        if (len(b.shape) < 3):
+            b = b[np.newaxis,...]
+        if ((a.shape[-2:] != (1,4)) or (b.shape[-2:] != (1,4))):
+            raise ValueError('Only Nx1x4 quaternion stacks can be multiplied')
+            
+        work = scratch = None
+        if out is not None:
+            shape = np.broadcast_shapes(a.shape, b.shape)
+            if (out.shape != shape):
+                raise ValueError('out must have shape ' + str(shape))
+            if isinstance(out, quaternion):
+                work, scratch = out._workspace()
+            Fast.multiply(a, b, out=out.view(np.ndarray), scratch=scratch, work=work)
+            return out
+            
+        return Fast.multiply(a, b).view(quaternion)
+
+    '''
+    rotate - rotate a set of vectors by each quaternion in the stack
+    
+    Uses the sandwich product q * v * ~q expanded directly in terms of the
+    vector part r and scalar part w of each (unit) quaternion
+    
+        t  = 2 (r x v)
+        v' = v + w t + r x t
+        
+    so no intermediate DCM stack is formed. v may be a single 3 vector, an
+    Nx3 stack (one vector per quaternion) or an NxMx3 stack (a cloud of M
+    vectors per quaternion). If out is supplied the vectors are written
+    directly into it; out may be v itself for an in-place rotation.
+    '''
+    def rotate(self, v, out=None):
+        q = self.view(np.ndarray)
+        v = np.asarray(v)
+        if (len(q.shape) < 3):
+            q = q[np.newaxis,...]
+        if (len(v.shape) < 2):
+            v = v[np.newaxis,...]
+        if ((v.shape[-1] != 3) or (len(v.shape) > 3)):
+            raise ValueError('Only 3, Nx3, or NxMx3 vectors can be rotated')
+            
+        if out is not None:
+            shape = np.broadcast_shapes(q.shape[:1], v.shape[:1]) + v.shape[1:]
+            if (out.shape != shape):
+                raise ValueError('out must have shape ' + str(shape))
+            
+        return Fast.rotate(q, v, out=out)
      
-            # -------------------------------------------------------------------
+    '''
+    __array_ufunc__ - numpy ufunc hook
+    
+    np.matmul of two quaternions is the Hamilton product and honors out=
+    (np.matmul(q, dq, out=q) is the same as q @= dq). Every other ufunc
+    works on the plain array values, writing into out when given, and a
+    new array result comes back as a quaternion.
+    '''
+    def __array_ufunc__(self, ufunc, method, *inputs, out=None, **kwargs):
+        if ((ufunc is np.matmul) and (method == '__call__') and (not kwargs) and
+            all(isinstance(x, quaternion) for x in inputs)):
+            return inputs[0].multiply(inputs[1], out=None if out is None else out[0])
+            
+        args = [x.view(np.ndarray) if isinstance(x, quaternion) else x for x in inputs]
+        if out is not None:
+            kwargs['out'] = tuple(x.view(np.ndarray) if isinstance(x, quaternion) else x
+                                  for x in out)
+        results = getattr(ufunc, method)(*args, **kwargs)
+        
+        if out is not None:
+            return out[0] if (len(out) == 1) else out
+        if isinstance(results, tuple):
+            return tuple(r.view(quaternion) if isinstance(r, np.ndarray) else r
+                         for r in results)
+        return results.view(quaternion) if isinstance(results, np.ndarray) else results
+     
+    # -------------------------------------------------------------------
     # Operator Overloads
     # 
     # Returns NotImplemented for anything that does not make sense
@@ -313,13 +377,16 @@ class quaternion(np.ndarray):
     def __matmul__(self, b):
         inType = type(b)
         if (issubclass(inType,quaternion)):
-            return np.matmul(self,b.view(np.ndarray).transpose((0,2,1))).view(quaternion)
+            return self.multiply(b)
         elif (issubclass(inType,list) or
               issubclass(inType,np.ndarray)):
-            # TODO: Need to implement matric vector logic
+            # Only vectors (trailing axis of 3) are rotated; anything else,
+            # e.g. a slice of the components times an array, is elementwise
+            if (np.shape(b)[-1:] == (3,)) and (self.shape[-1:] == (4,)):
+                return self.rotate(b)
             return NotImplemented
         else:
-            raise TypeError('Target type must be a dcm')
+            raise TypeError('Target type must be a quaternion or vector')
 
     '''
         object.__truediv__(self, other)             /
@@ -499,14 +566,21 @@ class quaternion(np.ndarray):
         object.__imul__(self, other)                *=
     '''
     def __imul__(self,b):
-        return NotImplemented
+        return self.__imatmul__(b)
     
 
     '''
         object.__imatmul__(self, other)             @=
+        
+        In-place Hamilton product (self = self * b) when the product has
+        the shape of self; otherwise Python falls back to self * b
     '''
     def __imatmul__(self,b):
-        return NotImplemented
+        if (not issubclass(type(b),quaternion)) or (len(self.shape) < 3):
+            return NotImplemented
+        if (np.broadcast_shapes(self.shape, b.shape) != self.shape):
+            return NotImplemented
+        return self.multiply(b, out=self)
     
 
     '''
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+series - Time tagged attitude series for Astrodynamic Toolkit
+
+Holds a quaternion or DCM stack with its sample times, answers time
+lookups by binary search, and caches the derived quantities that analysis
+scripts ask for over and over on the same long histories.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Interpolate
+from Astro import Quaternion
+
+class attitudeseries(object):
+    '''
+    % ATTITUDESERIES Time tagged attitude series constructor
+    %           Pairs an Nx1x4 quaternion or Nx3x3 DCM stack with N sorted
+    %           sample times. Lookups by time are O(log N) through
+    %           np.searchsorted, and derived quantities (eigenangle,
+    %           eigenaxis, diagonal, trace, det, and the conversion to the
+    %           other attitude form) are computed once on first use and
+    %           kept until the series is modified.
+    %
+    % Usage:    S = attitudeseries(t, q);
+    %           S = attitudeseries(t, D);
+    %           i = S.index(12.5);                % Sample at or before t
+    %           q = S.at(12.5);
+    %           q = S.window(100.0, 160.0);
+    %           q = S.interpolate(tq);            % slerp onto a new time base
+    %           a = S.eigenangle();               % Cached after first call
+    %           S[10:20] = q2;                    % Clears the cache
+    %           S.append(t2, q2);                 % Clears the cache
+    %
+    % Inputs:   t      N sample times, sorted into increasing order if needed
+    %
+    %           x      Nx1x4 quaternion or Nx3x3 dcm stack (anything the
+    %                  quaternion or dcm constructors accept)
+    %
+    % Notes:    times and data are read only views; change the samples
+    %           through item assignment or append so the cached quantities
+    %           stay consistent.
+    %
+    % See also quaternion, dcm, ephemeris, slerp
+    %
+    %==============================================================================
+    '''
+    def __init__(self, t, x):
+        t = np.array(t, dtype=np.float64).ravel()
+        if isinstance(x, Dcm.dcm):
+            cls = Dcm.dcm
+        elif isinstance(x, Quaternion.quaternion):
+            cls = Quaternion.quaternion
+        else:
+            a = np.asarray(x)
+            cls = Dcm.dcm if (a.shape[-2:] == (3,3)) else Quaternion.quaternion
+            x = cls(x)
+            
+        x = np.array(x.view(np.ndarray))
+        if (len(x.shape) < 3):
+            x = x[np.newaxis,...]
+        if (x.shape[0] != t.shape[0]):
+            raise ValueError('Must have one time for each sample')
+            
+        if np.any(t[1:] < t[:-1]):
+            i = np.argsort(t, kind='stable')
+            t = t[i]
+            x = x[i]
+            
+        self._cls = cls
+        self._t = t
+        self._x = x
+        self._count = t.shape[0]
+        self._cache = {}
+        
+    @property
+    def kind(self):
+        return 'dcm' if (self._cls is Dcm.dcm) else 'quaternion'
+        
+    '''
+        times - read only view of the sample times
+    '''
+    @property
+    def times(self):
+        t = self._t[:self._count]
+        t.flags.writeable = False
+        return t
+        
+    '''
+        data - read only quaternion (Nx1x4) or dcm (Nx3x3) view of the samples
+    '''
+    @property
+    def data(self):
+        x = self._x[:self._count]
+        x.flags.writeable = False
+        return x.view(self._cls)
+        
+    def __len__(self):
+        return self._count
+        
+    def __getitem__(self, key):
+        return self.data[key]
+        
+    '''
+        __setitem__ - overwrite samples in place; clears the cached quantities
+        
+        Values are converted as in append, so e.g. a dcm series accepts
+        quaternions.
+    '''
+    def __setitem__(self, key, value):
+        self._x[:self._count][key] = np.asarray(self._cls(value).view(np.ndarray))
+        self._cache.clear()
+        
+    '''
+        append - add samples at the end of the series
+        
+        Times must not precede the last sample already held. Storage grows
+        geometrically so repeated appends are amortized O(1) per sample.
+        Clears the cached quantities.
+    '''
+    def append(self, t, x):
+        t = np.asarray(t, dtype=np.float64).ravel()
+        x = np.asarray(self._cls(x).view(np.ndarray))
+        if (len(x.shape) < 3):
+            x = x[np.newaxis,...]
+        if (x.shape[0] != t.shape[0]):
+            raise ValueError('Must have one time for each sample')
+        if np.any(t[1:] < t[:-1]) or ((self._count > 0) and (t.shape[0] > 0) and
+                                      (t[0] < self._t[self._count - 1])):
+            raise ValueError('Appended times must be in increasing order')
+            
+        n = self._count + t.shape[0]
+        if (n > self._t.shape[0]):
+            size = max(n, 2 * self._t.shape[0])
+            tt = np.empty(size, dtype=self._t.dtype)
+            xx = np.empty((size,) + self._x.shape[1:], dtype=self._x.dtype)
+            tt[:self._count] = self._t[:self._count]
+            xx[:self._count] = self._x[:self._count]
+            self._t = tt
+            self._x = xx
+            
+        self._t[self._count:n] = t
+        self._x[self._count:n] = x
+        self._count = n
+        self._cache.clear()
+        
+    '''
+        index - sample index for each time in t, O(log N) per query
+        
+        side='right' (default) gives the last sample at or before t, which
+        is -1 for times before the first sample; side='left' gives the
+        first sample at or after t, which is N for times past the last.
+    '''
+    def index(self, t, side='right'):
+        i = np.searchsorted(self.times, t, side=side)
+        if (side == 'right'):
+            i = i - 1
+        return i
+        
+    '''
+        at - sample at or before each time in t (zero order hold)
+        
+        Times before the first sample take the first sample.
+    '''
+    def at(self, t):
+        return self.data[np.maximum(self.index(t), 0)]
+        
+    '''
+        window - view of the samples with start <= t <= stop
+    '''
+    def window(self, start, stop):
+        i0 = np.searchsorted(self.times, start, side='left')
+        i1 = np.searchsorted(self.times, stop, side='right')
+        return self.data[i0:max(i0, i1)]
+        
+    '''
+        interpolate - resample onto the times tq with slerp (default) or
+        squad; see Interpolate.slerp
+    '''
+    def interpolate(self, tq, method='slerp', out=None):
+        f = {'slerp' : Interpolate.slerp, 'squad' : Interpolate.squad}.get(method.lower())
+        if f is None:
+            raise ValueError('method must be either "slerp" or "squad"')
+        return f(self.times, self.quaternion(), tq, out=out)
+        
+    '''
+        _cached - look up a derived quantity, computing it on first use
+        
+        The result is marked read only since it is shared by every caller
+        until the next change to the series.
+    '''
+    def _cached(self, name, compute):
+        x = self._cache.get(name)
+        if x is None:
+            x = compute()
+            if isinstance(x, np.ndarray):
+                x.flags.writeable = False
+            self._cache[name] = x
+        return x
+        
+    '''
+        quaternion - the samples as an Nx1x4 quaternion (converted once for
+        a dcm series)
+    '''
+    def quaternion(self):
+        if (self._cls is Quaternion.quaternion):
+            return self.data
+        return self._cached('quaternion',
+                            lambda: Fast.to_quat(self._x[:self._count]).view(Quaternion.quaternion))
+        
+    '''
+        dcm - the samples as an Nx3x3 dcm (converted once for a quaternion
+        series)
+    '''
+    def dcm(self):
+        if (self._cls is Dcm.dcm):
+            return self.data
+        return self._cached('dcm',
+                            lambda: Fast.to_dcm(self._x[:self._count]).view(Dcm.dcm))
+        
+    def eigenangle(self):
+        return self._cached('eigenangle', lambda: self.quaternion().eigenangle())
+        
+    def eigenaxis(self):
+        return self._cached('eigenaxis', lambda: self.quaternion().eigenaxis())
+        
+    def diagonal(self):
+        return self._cached('diagonal', lambda: self.dcm().diagonal())
+        
+    def trace(self):
+        return self._cached('trace', lambda: np.sum(self.diagonal(), axis=0))
+        
+    def det(self):
+        return self._cached('det', lambda: self.dcm().det())
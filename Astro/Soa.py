@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+soa - Structure of arrays storage and kernels for Astrodynamic Toolkit
+
+The quaternion (Nx1x4) and dcm (Nx3x3) stacks store each attitude's
+components together. For long series it is often better to keep each
+component in its own contiguous row, a 4xN (quaternion) or 9xN (dcm)
+array, so every kernel streams through unit stride memory. Combined with
+float32 storage (the dtype option of to_soa, quaternion, and dcm) this
+halves the footprint of a float64 stack.
+
+to_soa and from_soa convert between the layouts; multiply, normalize,
+to_dcm, to_quat, and rotate work on the component rows directly and keep
+the storage type (float32 in, float32 arithmetic and float32 out).
+
+Accuracy of float32 storage against float64 for unit attitudes (checked
+in TestAstro.py)
+
+    quaternion * quaternion     |error| < 1e-6
+    quaternion -> dcm -> quat   |error| < 1e-6
+    quaternion * vector         |error| < 1e-6 * |v|
+
+i.e., a few float32 ulps (eps = 1.2e-7); errors grow roughly linearly
+with the number of chained products, so renormalize long chains.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Quaternion
+
+# Component rows of a 9xN DCM, m[3*i + j] is element (i, j)
+_M00, _M01, _M02, _M10, _M11, _M12, _M20, _M21, _M22 = range(9)
+
+'''
+    to_soa - quaternion (Nx1x4) or dcm (Nx3x3) stack to a 4xN or 9xN array
+    of contiguous component rows
+    
+    dtype sets the storage type (default keeps the input type); out may be
+    a preallocated 4xN or 9xN array.
+'''
+def to_soa(x, dtype=None, out=None):
+    a = np.asarray(x)
+    if (len(a.shape) < 3):
+        a = a[np.newaxis,...]
+    if (a.shape[1:] not in ((1,4), (3,3))):
+        raise ValueError('Only Nx1x4 quaternion or Nx3x3 dcm stacks can be converted')
+    n = a.shape[0]
+    c = 4 if (a.shape[1:] == (1,4)) else 9
+    if out is None:
+        out = np.empty((c,n), dtype=(a.dtype if dtype is None else dtype))
+    out[...] = a.reshape(n, c).T
+    return out
+
+'''
+    from_soa - 4xN or 9xN component rows back to a quaternion (Nx1x4) or
+    dcm (Nx3x3) stack
+'''
+def from_soa(s, out=None):
+    c, n = s.shape
+    if (c == 4):
+        shape, cls = (n,1,4), Quaternion.quaternion
+    elif (c == 9):
+        shape, cls = (n,3,3), Dcm.dcm
+    else:
+        raise ValueError('Only 4xN or 9xN component arrays can be converted')
+    if out is None:
+        out = np.empty(shape, dtype=s.dtype)
+    out.view(np.ndarray).reshape(n, c)[...] = s.T
+    return out.view(cls)
+
+'''
+    multiply - Hamilton product of two 4xN quaternion arrays (a * b)
+    
+    A 4x1 operand is broadcast against the other. scratch is an optional
+    N element array, so with out supplied nothing is allocated. out must
+    not be one of the inputs.
+'''
+def multiply(a, b, out=None, scratch=None):
+    n = max(a.shape[1], b.shape[1])
+    if out is None:
+        out = np.empty((4,n), dtype=np.result_type(a, b))
+    if scratch is None:
+        scratch = np.empty(n, dtype=out.dtype)
+        
+    for k in range(4):
+        terms = Fast._HAMILTON[k]
+        i, j, sign = terms[0]
+        np.multiply(a[i], b[j], out=out[k])
+        for i, j, sign in terms[1:]:
+            np.multiply(a[i], b[j], out=scratch)
+            if (sign > 0):
+                out[k] += scratch
+            else:
+                out[k] -= scratch
+    return out
+
+'''
+    normalize - scale each column of a 4xN quaternion array to unit length
+    
+    out may be q itself; scratch is an optional N element array.
+'''
+def normalize(q, out=None, scratch=None):
+    if out is None:
+        out = np.empty(q.shape, dtype=q.dtype)
+    if scratch is None:
+        scratch = np.empty(q.shape[1], dtype=q.dtype)
+    n = np.multiply(q[0], q[0])
+    for k in range(1, 4):
+        np.multiply(q[k], q[k], out=scratch)
+        n += scratch
+    np.sqrt(n, out=n)
+    np.divide(q, n, out=out)
+    return out
+
+'''
+    to_dcm - 4xN quaternion array to 9xN DCM component rows (see Fast.to_dcm)
+    
+    scratch is an optional N element array.
+'''
+def to_dcm(q, out=None, scratch=None):
+    if out is None:
+        out = np.empty((9,q.shape[1]), dtype=q.dtype)
+    if scratch is None:
+        scratch = np.empty(q.shape[1], dtype=out.dtype)
+    w, x, y, z = q
+    
+    # Diagonal, 1 - 2 (b^2 + c^2)
+    for r, b, c in ((_M00, y, z), (_M11, z, x), (_M22, x, y)):
+        np.multiply(b, b, out=out[r])
+        np.multiply(c, c, out=scratch)
+        out[r] += scratch
+        out[r] *= -2.0
+        out[r] += 1.0
+        
+    # Off diagonal pairs, 2 (ab - cd) and 2 (ab + cd)
+    for minus, plus, a, b, c, d in ((_M01, _M10, x, y, w, z),
+                                    (_M20, _M02, x, z, w, y),
+                                    (_M12, _M21, y, z, w, x)):
+        np.multiply(a, b, out=out[minus])
+        np.multiply(c, d, out=scratch)
+        np.add(out[minus], scratch, out=out[plus])
+        out[minus] -= scratch
+        out[minus] *= 2.0
+        out[plus] *= 2.0
+    return out
+
+'''
+    to_quat - 9xN DCM component rows to a 4xN quaternion array with the
+    single pass Shepperd method of Fast.to_quat
+    
+    work is an optional 10xN scratch array.
+'''
+def to_quat(m, out=None, work=None):
+    n = m.shape[1]
+    if out is None:
+        out = np.empty((4,n), dtype=m.dtype)
+    if work is None:
+        work = np.empty((10,n), dtype=out.dtype)
+        
+    row, S = Fast._shepperd(lambda i, j: m[3*i + j], work)
+    np.divide(row, S, out=out)
+    return out
+
+'''
+    rotate - rotate a 3xN vector array by a 4xN quaternion array (one vector
+    per quaternion, or a 4x1 quaternion applied to every vector) with the
+    sandwich expansion of Fast.rotate
+'''
+def rotate(q, v, out=None):
+    n = max(q.shape[1], v.shape[1])
+    if out is None:
+        out = np.empty((3,n), dtype=np.result_type(q, v))
+    w, r0, r1, r2 = q
+    v0, v1, v2 = v
+    t0 = 2.0 * (r1*v2 - r2*v1)
+    t1 = 2.0 * (r2*v0 - r0*v2)
+    t2 = 2.0 * (r0*v1 - r1*v0)
+    np.add(v0, w*t0 + r1*t2 - r2*t1, out=out[0])
+    np.add(v1, w*t1 + r2*t0 - r0*t2, out=out[1])
+    np.add(v2, w*t2 + r0*t1 - r1*t0, out=out[2])
+    return out
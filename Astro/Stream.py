@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+stream - Chunked streaming conversions for Astrodynamic Toolkit
+
+Generators that run conversions, normalization checks and Euler angle
+extraction over attitude data one fixed-size chunk at a time, so flight
+logs far larger than memory (e.g., an ephemeris memmap) can be processed
+with a working set of a few chunk-sized buffers.
+
+Every generator takes either a single (possibly memory mapped) stack or
+any iterable of stacks; incoming stacks larger than the chunk size are
+split, smaller ones pass through as they are.
+
+average reduces a quaternion stream to one mean attitude per fixed window
+of samples (e.g., 1 s windows over 1 kHz data) without holding the full
+rate data.
+
+NOTE: The yielded arrays are views of buffers that are reused for the next
+chunk. Consume (or copy) each one before advancing the generator.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+
+import numpy as np
+from Astro import Dcm
+from Astro import Fast
+from Astro import Quaternion
+
+CHUNK = 65536
+
+'''
+    chunked - split a stack into views of at most size samples
+'''
+def chunked(x, size=CHUNK):
+    for k in range(0, x.shape[0], size):
+        yield x[k:k+size]
+
+'''
+    _pieces - normalize the input to a sequence of plain ndarray stacks of
+    at most size samples
+'''
+def _pieces(chunks, size):
+    if isinstance(chunks, np.ndarray):
+        chunks = (chunks,)
+    for c in chunks:
+        c = np.asarray(c)
+        if (len(c.shape) < 3):
+            c = c[np.newaxis,...]
+        for k in range(0, c.shape[0], size):
+            yield c[k:k+size]
+
+'''
+    dcm_to_quat - stream of Nx3x3 DCM chunks to Nx1x4 quaternion chunks
+'''
+def dcm_to_quat(chunks, size=CHUNK, dtype=np.float64):
+    out = np.empty((size,1,4), dtype=dtype)
+    work = np.empty((10,size), dtype=dtype)
+    for d in _pieces(chunks, size):
+        if (d.shape[1:] != (3,3)):
+            raise ValueError('Only Nx3x3 DCM chunks can be converted')
+        n = d.shape[0]
+        yield Fast.to_quat(d, out=out[:n], work=work[:,:n]).view(Quaternion.quaternion)
+
+'''
+    quat_to_dcm - stream of Nx1x4 quaternion chunks to Nx3x3 DCM chunks
+'''
+def quat_to_dcm(chunks, size=CHUNK, dtype=np.float64):
+    out = np.empty((size,3,3), dtype=dtype)
+    for q in _pieces(chunks, size):
+        if (q.shape[1:] != (1,4)):
+            raise ValueError('Only Nx1x4 quaternion chunks can be converted')
+        n = q.shape[0]
+        yield Fast.to_dcm(q, out=out[:n]).view(Dcm.dcm)
+
+'''
+    normalize - stream of Nx1x4 quaternion chunks scaled to unit length
+'''
+def normalize(chunks, size=CHUNK, dtype=np.float64):
+    out = np.empty((size,1,4), dtype=dtype)
+    for q in _pieces(chunks, size):
+        if (q.shape[1:] != (1,4)):
+            raise ValueError('Only Nx1x4 quaternion chunks can be normalized')
+        n = q.shape[0]
+        yield Fast.normalize(q, out=out[:n]).view(Quaternion.quaternion)
+
+'''
+    isnormal - stream of boolean masks, True for each sample that is
+    sufficiently normal
+    
+    Quaternions (Nx1x4) are checked for |1 - |q|| <= tolerance and DCMs
+    (Nx3x3) for |M * M' - I| <= tolerance (Frobenius norm, see
+    Fast.orthonormal_error). Default tolerance is 1e-9.
+'''
+def isnormal(chunks, tolerance=1.0e-9, size=CHUNK):
+    out = np.empty(size, dtype=bool)
+    err = np.empty(size)
+    for x in _pieces(chunks, size):
+        n = x.shape[0]
+        e = err[:n]
+        if (x.shape[1:] == (1,4)):
+            np.einsum('nij,nij->n', x, x, out=e)
+            np.sqrt(e, out=e)
+            e -= 1.0
+            np.abs(e, out=e)
+        elif (x.shape[1:] == (3,3)):
+            Fast.orthonormal_error(x, out=e)
+        else:
+            raise ValueError('Only Nx1x4 or Nx3x3 chunks can be checked')
+        yield np.less_equal(e, tolerance, out=out[:n])
+
+'''
+    euler - stream of quaternion (Nx1x4) or DCM (Nx3x3) chunks to Nx3
+    Euler angle chunks (radians, in sequence order, see Fast.to_euler)
+    
+    Default sequence is 'zyx' (aerospace 3-2-1), i.e., [yaw, pitch, roll]
+'''
+def euler(chunks, seq='zyx', size=CHUNK):
+    out = np.empty((size,3))
+    work = None
+    for x in _pieces(chunks, size):
+        n = x.shape[0]
+        if (x.shape[1:] == (1,4)):
+            if work is None:
+                work = np.empty((size,3,3))
+            x = Fast.to_dcm(x, out=work[:n])
+        elif (x.shape[1:] != (3,3)):
+            raise ValueError('Only Nx1x4 or Nx3x3 chunks can be converted')
+        yield Fast.to_euler(x, seq, out=out[:n])
+
+'''
+    average - stream of Nx1x4 quaternion chunks to the mean attitude of each
+    window of samples (Markley's eigenvector method)
+    
+    The 4x4 matrix M = sum(q * q') is accumulated over each window of
+    window samples, carrying across chunk boundaries, and the mean is the
+    eigenvector of M with the largest eigenvalue. Since q and -q give the
+    same M, sign flips in the input do not matter. The eigenvectors of all
+    the windows completed in a chunk come from one batched np.linalg.eigh.
+    
+    Yields the means of the windows completed so far (scalar part >= 0),
+    skipping chunks that complete none. A trailing partial window is
+    averaged at the end of the stream unless partial is False.
+'''
+def average(chunks, window, size=CHUNK, partial=True):
+    window = int(window)
+    if (window < 1):
+        raise ValueError('window must be at least one sample')
+        
+    out = np.empty((size // window + 2,1,4))
+    m = np.empty((size // window + 2,4,4))
+    carry = np.zeros((4,4))
+    count = 0
+    
+    for q in _pieces(chunks, size):
+        if (q.shape[1:] != (1,4)):
+            raise ValueError('Only Nx1x4 quaternion chunks can be averaged')
+        p = q.reshape(-1, 4)
+        n = p.shape[0]
+        w = 0
+        i = 0
+        
+        # Finish the window carried over from the previous chunk
+        if (count > 0):
+            i = min(window - count, n)
+            carry += np.matmul(p[:i].T, p[:i])
+            count += i
+            if (count == window):
+                m[w] = carry
+                w += 1
+                count = 0
+                
+        full = (n - i) // window
+        if (full > 0):
+            b = p[i:i + full * window].reshape(full, window, 4)
+            np.einsum('wni,wnj->wij', b, b, out=m[w:w + full])
+            w += full
+            i += full * window
+            
+        if (i < n):
+            np.matmul(p[i:].T, p[i:], out=carry)
+            count = n - i
+            
+        if (w > 0):
+            yield _dominant(m[:w], out[:w])
+            
+    if partial and (count > 0):
+        m[0] = carry
+        yield _dominant(m[:1], out[:1])
+
+'''
+    _dominant - unit eigenvector of the largest eigenvalue of each symmetric
+    4x4 in a stack, as an Nx1x4 quaternion with scalar part >= 0
+'''
+def _dominant(m, out):
+    lam, v = np.linalg.eigh(m)
+    out[:,0,:] = v[:,:,-1]
+    out[out[:,0,0] < 0.0] *= -1.0
+    return out.view(Quaternion.quaternion)
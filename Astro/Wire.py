@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+wire - Binary wire format for Astrodynamic Toolkit
+
+Ships quaternion and dcm stacks between processes (ZMQ, UDP, pipes) as a
+small fixed header followed by the raw buffer. Senders hand out a
+memoryview of the stack (no copy), receivers get quaternion/dcm views of
+the received buffer (no copy), and the header and payload travel as
+separate frames so multi-frame messages can be scatter-gathered.
+
+Copyright (c) 2017 - Michael Kessel (mailto: the.rocketredneck@gmail.com)
+a.k.a. RocketRedNeck, RocketRedNeck.com, RocketRedNeck.net 
+
+RocketRedNeck and MIT Licenses 
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for 
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where 
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes. 
+
+Permission is hereby granted, free of charge, to any person obtaining a copy 
+of this software and associated documentation files (the "Software"), to deal 
+in the Software without restriction, including without limitation the rights 
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell 
+copies of the Software, and to permit persons to whom the Software is 
+furnished to do so, subject to the following conditions: 
+
+The above copyright notice and this permission notice shall be included in all 
+copies or substantial portions of the Software. 
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE 
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, 
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE 
+SOFTWARE. 
+**************************************************************************************************** 
+"""
+
+import struct
+
+import numpy as np
+from Astro import Dcm
+from Astro import Quaternion
+from Astro import Soa
+
+MAGIC = b'ASTW'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBcc4sQ5x')
+HEADER_SIZE = _HEADER.size
+
+_KINDS = {b'q' : ((1,4), Quaternion.quaternion),
+          b'd' : ((3,3), Dcm.dcm)}
+
+_LAYOUTS = {'rows' : b'r', 'columns' : b'c', 'soa' : b's'}
+
+'''
+    to_buffer - header and payload frames for a quaternion (Nx1x4) or dcm
+    (Nx3x3) stack
+    
+    Returns (header, payload) where header is HEADER_SIZE bytes and payload
+    is a memoryview of the stack itself when the layout is 'rows' and the
+    stack is C contiguous (no copy); otherwise the payload is a new buffer
+    in the requested layout. The two frames can be sent as one
+    scatter-gather message (e.g., zmq send_multipart or socket.sendmsg) or
+    joined with b''.join for a single datagram.
+    
+    Header (little endian)
+    
+        offset  size  field
+         0       4    magic b'ASTW'
+         4       1    version (1)
+         5       1    kind b'q' (quaternion) or b'd' (dcm)
+         6       1    layout b'r' (rows), b'c' (columns, dcm only), or
+                      b's' (soa, 4xN or 9xN component rows, see Soa)
+         7       4    dtype string, e.g. b'<f8' (padded with NUL)
+        11       8    count N (uint64)
+        19       5    reserved (zero), keeps the payload 8 byte aligned
+'''
+def to_buffer(x, layout='rows'):
+    if (layout not in _LAYOUTS):
+        raise ValueError('layout must be one of "rows", "columns", or "soa"')
+        
+    if isinstance(x, Dcm.dcm):
+        kind = b'd'
+    elif isinstance(x, Quaternion.quaternion):
+        kind = b'q'
+    else:
+        raise TypeError('Only quaternion or dcm stacks can be serialized')
+    if ((kind == b'q') and (layout == 'columns')):
+        raise ValueError('quaternion stacks only support the "rows" and "soa" layouts')
+        
+    a = x.view(np.ndarray)
+    if (len(a.shape) < 3):
+        a = a[np.newaxis,...]
+    a = a.astype(a.dtype.newbyteorder('<'), copy=False)
+    
+    if (layout == 'soa'):
+        a = Soa.to_soa(a)
+    elif (layout == 'columns'):
+        a = np.ascontiguousarray(a.transpose(0, 2, 1))
+    else:
+        a = np.ascontiguousarray(a)
+        
+    header = _HEADER.pack(MAGIC, VERSION, kind, _LAYOUTS[layout],
+                          a.dtype.str.encode(), x.shape[0] if (len(x.shape) == 3) else 1)
+    return header, memoryview(a).cast('B')
+
+'''
+    from_buffer - quaternion or dcm stack viewing a received buffer
+    
+    buffer is either the whole message (header followed by payload) or,
+    with payload given, just the header frame. Any object supporting the
+    buffer protocol works (bytes, bytearray, memoryview, zmq frames, ...).
+    The result is a view of the payload, no copy is made; it is read only
+    when the buffer is (e.g., bytes). 'columns' and 'soa' payloads come
+    back as strided views that still present the usual Nx3x3 / Nx1x4 rows.
+'''
+def from_buffer(buffer, payload=None):
+    m = memoryview(buffer).cast('B')
+    if (m.nbytes < HEADER_SIZE):
+        raise ValueError('Buffer is too short to hold a header')
+    magic, version, kind, layout, dtype, count = _HEADER.unpack(m[:HEADER_SIZE])
+    if (magic != MAGIC):
+        raise ValueError('Buffer does not hold an Astro stack')
+    if (version != VERSION):
+        raise ValueError('Unsupported wire version ' + str(version))
+    if (kind not in _KINDS) or (layout not in _LAYOUTS.values()):
+        raise ValueError('Unknown kind or layout in header')
+        
+    if payload is None:
+        payload = m[HEADER_SIZE:]
+    shape, cls = _KINDS[kind]
+    dtype = np.dtype(dtype.rstrip(b'\0').decode())
+    size = shape[0] * shape[1]
+    if (memoryview(payload).nbytes != count * size * dtype.itemsize):
+        raise ValueError('Payload size does not match the header')
+        
+    a = np.frombuffer(payload, dtype=dtype, count=count * size)
+    if (layout == b's'):
+        a = a.reshape(size, count).T.reshape((count,) + shape)
+    elif (layout == b'c'):
+        a = a.reshape(count, 3, 3).transpose(0, 2, 1)
+    else:
+        a = a.reshape((count,) + shape)
+    return a.view(cls)
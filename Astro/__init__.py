@@ -35,4 +35,15 @@ SOFTWARE.
 
 from Astro.Dcm import dcm
 from Astro.Quaternion import quaternion
-
+from Astro import Fast as fast
+from Astro import Stream as stream
+from Astro.Interpolate import slerp, squad
+from Astro.Propagator import propagator, propagate
+from Astro.Ephemeris import ephemeris
+from Astro.Parallel import executor
+from Astro.Series import attitudeseries
+from Astro.Index import attitudeindex
+from Astro.Orbit import orbit, kepler, lvlh
+from Astro.Frames import framegraph
+from Astro import Soa as soa
+from Astro.Wire import to_buffer, from_buffer
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+BenchAstro.py
+
+Benchmark suite for the Astro attitude types with regression tracking.
+
+Times construction (from Nx1x9, Nx3x3 and Nx1x4 inputs), dcm <-> quaternion
+conversion, products, vector rotations, det/trace and eigenaxis for each
+stack size and storage type, and checks every result against a plain,
+independent reference formulation (np.linalg.det, per-sample Shepperd,
+matrix products of the DCMs, ...) so a fast path that drifts numerically
+is caught along with one that slows down.
+
+Results are written to JSON. Given a baseline (an earlier results file)
+every case that is slower than the baseline by more than the threshold is
+flagged, and the exit status is 1 when anything is flagged.
+
+Usage:  python BenchAstro.py [--sizes 1,1000,1000000,10000000]
+                             [--dtypes float64,float32]
+                             [--output BenchAstro.json]
+                             [--baseline old.json] [--threshold 1.25]
+
+NOTE: N = 10^7 needs a few GB of memory for the float64 cases.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+import Astro
+
+# Agreement required between each fast path and its reference
+TOLERANCE = {'float64' : 1.0e-12,
+             'float32' : 1.0e-5}
+
+# Number of samples checked against the (slow) reference implementations
+CHECK = 10000
+
+'''
+    best - shortest time (seconds) of one call of f
+
+    The call is repeated enough times that each measurement lasts at least
+    budget seconds, and the best of repeat measurements is kept.
+'''
+def best(f, repeat=3, budget=0.05):
+    t0 = time.perf_counter()
+    f()
+    once = time.perf_counter() - t0
+    number = max(1, int(budget / max(once, 1.0e-9)))
+
+    t = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for k in range(number):
+            f()
+        t.append((time.perf_counter() - t0) / number)
+    return min(t)
+
+'''
+    Reference implementations, one sample at a time or through the generic
+    numpy routines, independent of Astro.fast
+'''
+def ref_to_quat(d):
+    q = np.empty((d.shape[0],1,4))
+    for n in range(d.shape[0]):
+        m = d[n]
+        tr = m[0,0] + m[1,1] + m[2,2]
+        if (tr > 0):
+            S = np.sqrt(tr + 1.0) * 2.0
+            q[n,0] = (0.25 * S, (m[2,1] - m[1,2]) / S, (m[0,2] - m[2,0]) / S, (m[1,0] - m[0,1]) / S)
+        elif ((m[0,0] > m[1,1]) and (m[0,0] > m[2,2])):
+            S = np.sqrt(1.0 + m[0,0] - m[1,1] - m[2,2]) * 2.0
+            q[n,0] = ((m[2,1] - m[1,2]) / S, 0.25 * S, (m[0,1] + m[1,0]) / S, (m[0,2] + m[2,0]) / S)
+        elif (m[1,1] > m[2,2]):
+            S = np.sqrt(1.0 + m[1,1] - m[0,0] - m[2,2]) * 2.0
+            q[n,0] = ((m[0,2] - m[2,0]) / S, (m[0,1] + m[1,0]) / S, 0.25 * S, (m[1,2] + m[2,1]) / S)
+        else:
+            S = np.sqrt(1.0 + m[2,2] - m[0,0] - m[1,1]) * 2.0
+            q[n,0] = ((m[1,0] - m[0,1]) / S, (m[0,2] + m[2,0]) / S, (m[1,2] + m[2,1]) / S, 0.25 * S)
+    return q
+
+def ref_to_dcm(q):
+    w, x, y, z = [q[:,0,k] for k in range(4)]
+    return np.stack((np.stack((w*w + x*x - y*y - z*z, 2*(x*y - w*z), 2*(x*z + w*y)), axis=-1),
+                     np.stack((2*(x*y + w*z), w*w - x*x + y*y - z*z, 2*(y*z - w*x)), axis=-1),
+                     np.stack((2*(x*z - w*y), 2*(y*z + w*x), w*w - x*x - y*y + z*z), axis=-1)),
+                    axis=1)
+
+def ref_multiply(a, b):
+    # Left multiplication matrix of a applied to b
+    w, x, y, z = [a[:,0,k] for k in range(4)]
+    L = np.stack((np.stack((w, -x, -y, -z), axis=-1),
+                  np.stack((x,  w, -z,  y), axis=-1),
+                  np.stack((y,  z,  w, -x), axis=-1),
+                  np.stack((z, -y,  x,  w), axis=-1)), axis=1)
+    return np.matmul(L, b[:,0,:,np.newaxis])[...,0][:,np.newaxis,:]
+
+def ref_rotate(d, v):
+    return np.matmul(d, v[...,np.newaxis])[...,0]
+
+def ref_eigenaxis(q):
+    r = q[:,0,1:4]
+    return r / np.linalg.norm(r, axis=1, keepdims=True)
+
+'''
+    inputs - random unit quaternions, their DCMs, and vectors for N samples
+'''
+def inputs(n, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    q = rng.normal(size=(n,1,4))
+    q /= np.linalg.norm(q, axis=2, keepdims=True)
+    q[q[:,0,0] < 0.0] *= -1.0
+    d = Astro.fast.to_dcm(q)
+    v = rng.normal(size=(n,3))
+    return q.astype(dtype), d.astype(dtype), v.astype(dtype)
+
+'''
+    cases - (name, timed call, check) for one size and type
+
+    Each check returns the largest difference between the fast path and
+    the reference on the first CHECK samples.
+'''
+def cases(n, dtype):
+    q, d, v = inputs(n, dtype)
+    p = np.ascontiguousarray(q[::-1])
+    d9 = d.reshape(n,1,9)
+    Q = Astro.quaternion(q)
+    P = Astro.quaternion(p)
+    D = Astro.dcm(d)
+    E = Astro.dcm(np.ascontiguousarray(d[::-1]))
+    m = min(n, CHECK)
+
+    def err(a, b):
+        return float(np.max(np.abs(np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64))))
+
+    return [('construct dcm from Nx1x9',
+             lambda: Astro.dcm(d9),
+             lambda: err(Astro.dcm(d9[:m]).view(np.ndarray), d[:m])),
+            ('construct dcm from Nx3x3',
+             lambda: Astro.dcm(d),
+             lambda: err(Astro.dcm(d[:m]).view(np.ndarray), d[:m])),
+            ('construct quaternion from Nx1x4',
+             lambda: Astro.quaternion(q),
+             lambda: err(Astro.quaternion(q[:m]).view(np.ndarray), q[:m])),
+            ('dcm -> quaternion',
+             lambda: Astro.quaternion(D, dtype=dtype),
+             lambda: err(Astro.quaternion(D[:m], dtype=dtype).view(np.ndarray),
+                         ref_to_quat(d[:m].astype(np.float64)))),
+            ('quaternion -> dcm',
+             lambda: Astro.dcm(Q),
+             lambda: err(Astro.dcm(Q[:m]).view(np.ndarray), ref_to_dcm(q[:m].astype(np.float64)))),
+            ('quaternion * quaternion',
+             lambda: Q * P,
+             lambda: err((Q[:m] * P[:m]).view(np.ndarray),
+                         ref_multiply(q[:m].astype(np.float64), p[:m].astype(np.float64)))),
+            ('dcm * dcm',
+             lambda: D * E,
+             lambda: err((D[:m] * E[:m]).view(np.ndarray),
+                         np.einsum('nij,njk->nik', d[:m].astype(np.float64),
+                                   E[:m].view(np.ndarray).astype(np.float64)))),
+            ('quaternion * vector',
+             lambda: Q * v,
+             lambda: err(Q[:m] * v[:m], ref_rotate(d[:m].astype(np.float64), v[:m].astype(np.float64)))),
+            ('dcm * vector',
+             lambda: D * v,
+             lambda: err(D[:m] * v[:m], ref_rotate(d[:m].astype(np.float64), v[:m].astype(np.float64)))),
+            ('dcm det',
+             lambda: D.det(),
+             lambda: err(D[:m].det(), np.linalg.det(d[:m].astype(np.float64)))),
+            ('dcm trace',
+             lambda: D.trace(),
+             lambda: err(D[:m].trace(), np.trace(d[:m].astype(np.float64), axis1=1, axis2=2))),
+            ('quaternion eigenaxis',
+             lambda: Q.eigenaxis(),
+             lambda: err(Q[:m].eigenaxis(), ref_eigenaxis(q[:m].astype(np.float64))))]
+
+'''
+    run - time and check every case for every size and type
+'''
+def run(sizes, dtypes, verbose=True):
+    results = []
+    for dtype in dtypes:
+        for n in sizes:
+            for name, f, check in cases(n, np.dtype(dtype)):
+                seconds = best(f)
+                error = check()
+                ok = error <= TOLERANCE[dtype]
+                results.append({'case' : name, 'n' : n, 'dtype' : dtype,
+                                'seconds' : seconds, 'ns_per_sample' : seconds / n * 1e9,
+                                'error' : error, 'agrees' : bool(ok)})
+                if verbose:
+                    print('%-32s %9d %8s %12.3e s %10.2f ns/sample  err %.1e%s' %
+                          (name, n, dtype, seconds, seconds / n * 1e9, error,
+                           '' if ok else '  DISAGREES'))
+    return results
+
+'''
+    compare - flag every case slower than its baseline by more than
+    threshold (ratio of times), returns the list of flagged messages
+'''
+def compare(results, baseline, threshold):
+    old = {(r['case'], r['n'], r['dtype']) : r for r in baseline['results']}
+    flagged = []
+    for r in results:
+        b = old.get((r['case'], r['n'], r['dtype']))
+        if b is None:
+            continue
+        ratio = r['seconds'] / b['seconds']
+        if (ratio > threshold):
+            flagged.append('%s (N=%d, %s) is %.2fx slower than the baseline' %
+                           (r['case'], r['n'], r['dtype'], ratio))
+    return flagged
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Astro benchmark suite')
+    parser.add_argument('--sizes', default='1,1000,1000000,10000000',
+                        help='comma separated stack sizes')
+    parser.add_argument('--dtypes', default='float64,float32',
+                        help='comma separated storage types')
+    parser.add_argument('--output', default='BenchAstro.json',
+                        help='results file to write')
+    parser.add_argument('--baseline', default=None,
+                        help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio that is flagged')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    dtypes = [s.strip() for s in args.dtypes.split(',')]
+    for dtype in dtypes:
+        if dtype not in TOLERANCE:
+            parser.error('dtypes must be from ' + ', '.join(TOLERANCE))
+
+    results = run(sizes, dtypes)
+    with open(args.output, 'w') as f:
+        json.dump({'python' : platform.python_version(),
+                   'numpy' : np.__version__,
+                   'machine' : platform.platform(),
+                   'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results' : results}, f, indent=1)
+    print('results written to', args.output)
+
+    flagged = ['%s (N=%d, %s) disagrees with the reference by %.1e' %
+               (r['case'], r['n'], r['dtype'], r['error']) for r in results if not r['agrees']]
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            flagged += compare(results, json.load(f), args.threshold)
+
+    for message in flagged:
+        print('FLAGGED:', message)
+    return 1 if flagged else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+BenchAstroFast.py
+
+Compares the per-call cost of the Astro dcm/quaternion classes against the
+Astro.fast functional kernels for a single attitude (N=1), the case that
+matters in a 1 kHz loop where one attitude is converted at a time.
+
+The class path pays for the __new__ argument parsing and the ndarray
+subclass wrapping on every call; the fast path works on plain arrays and
+writes into preallocated outputs.
+"""
+
+import timeit
+
+import numpy as np
+
+import Astro
+
+n = 20000
+
+q = np.array([[[0.5, 0.5, 0.5, 0.5]]])
+dq = np.array([[[np.cos(0.005), np.sin(0.005), 0.0, 0.0]]])
+d = Astro.fast.to_dcm(q)
+v = np.array([[1.0, 0.0, 0.0]])
+
+Q = Astro.quaternion(q)
+DQ = Astro.quaternion(dq)
+D = Astro.dcm(d)
+
+# Preallocated outputs for the fast path
+qOut = np.empty((1,1,4))
+dOut = np.empty((1,3,3))
+vOut = np.empty((1,3))
+scratch = np.empty((1,1))
+
+cases = [('dcm -> quaternion',
+          lambda: Astro.quaternion(d),
+          lambda: Astro.fast.to_quat(d, out=qOut)),
+         ('quaternion -> dcm',
+          lambda: Astro.dcm(q),
+          lambda: Astro.fast.to_dcm(q, out=dOut)),
+         ('quaternion * quaternion',
+          lambda: Q * DQ,
+          lambda: Astro.fast.multiply(q, dq, out=qOut, scratch=scratch)),
+         ('quaternion * vector',
+          lambda: Q * v,
+          lambda: Astro.fast.rotate(q, v, out=vOut)),
+         ('dcm * vector',
+          lambda: D * v,
+          lambda: Astro.fast.rotate(d, v, out=vOut)),
+         ('quaternion inverse',
+          lambda: ~Q,
+          lambda: Astro.fast.inverse(q, out=qOut))]
+
+print('%-24s %12s %12s %8s' % ('operation', 'class (us)', 'fast (us)', 'ratio'))
+for name, slow, fast in cases:
+    tSlow = min(timeit.repeat(slow, number=n, repeat=3)) / n * 1e6
+    tFast = min(timeit.repeat(fast, number=n, repeat=3)) / n * 1e6
+    print('%-24s %12.2f %12.2f %8.1f' % (name, tSlow, tFast, tSlow / tFast))
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+BenchAstroParallel.py
+
+Scaling benchmark for Astro.executor, the shared memory process pool that
+runs the Astro.fast kernels across cores. Each kernel is timed on the same
+stack with 1, 2, 4 and 8 workers and compared to a single in-process call
+of the Astro.fast kernel.
+
+Inputs are placed in shared memory once up front (X.share) so the timings
+are for the kernels alone, not for copying the stacks into shared memory.
+
+Usage:  python BenchAstroParallel.py [N]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import Astro
+
+def best(f, repeat=3):
+    t = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        t.append(time.perf_counter() - t0)
+    return min(t)
+
+if __name__ == '__main__':
+    n = int(float(sys.argv[1])) if (len(sys.argv) > 1) else 2000000
+    
+    q = np.random.randn(n,1,4)
+    q /= np.sqrt(np.sum(q * q, axis=2, keepdims=True))
+    d = Astro.fast.to_dcm(q)
+    v = np.random.randn(n,3)
+    
+    serial = {'to_quat'   : best(lambda: Astro.fast.to_quat(d)),
+              'to_dcm'    : best(lambda: Astro.fast.to_dcm(q)),
+              'rotate'    : best(lambda: Astro.fast.rotate(q, v)),
+              'normalize' : best(lambda: Astro.fast.normalize(q))}
+    
+    print('N = %d' % n)
+    print('%-10s %8s %10s %8s' % ('kernel', 'workers', 'time (s)', 'speedup'))
+    for name in serial:
+        print('%-10s %8s %10.4f %8.2f' % (name, 'fast', serial[name], 1.0))
+        
+    for workers in (1, 2, 4, 8):
+        with Astro.executor(workers) as X:
+            qs = X.share(q)
+            ds = X.share(d)
+            vs = X.share(v)
+            qOut = X.empty(q.shape)
+            dOut = X.empty(d.shape)
+            vOut = X.empty(v.shape)
+            
+            # Let the pool spin up before timing
+            X.normalize(qs, out=qOut)
+            
+            t = {'to_quat'   : best(lambda: X.to_quat(ds, out=qOut)),
+                 'to_dcm'    : best(lambda: X.to_dcm(qs, out=dOut)),
+                 'rotate'    : best(lambda: X.rotate(qs, vs, out=vOut)),
+                 'normalize' : best(lambda: X.normalize(qs, out=qOut))}
+            
+            for name in t:
+                print('%-10s %8d %10.4f %8.2f' % (name, workers, t[name], serial[name] / t[name]))
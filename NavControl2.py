@@ -26,6 +26,8 @@ import llap
 import serial
 
 import serialPorts
+
+import Astro
    
 
 class NavigationThread(QtCore.QThread):
@@ -340,6 +342,12 @@ class QuadWidget(QtOpenGL.QGLWidget):
         
         self.heading = 0.0
         
+        # Orientation buffers reused every frame; openGL takes a 4x4
+        # (column major) matrix holding the 3x3 rotation
+        self.euler = numpy.zeros((1,3))
+        self.orientation = numpy.zeros((1,3,3))
+        self.glOrientation = numpy.identity(4, dtype=numpy.float32)
+        
     def paintGL(self):
         
         #while (glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE):
@@ -372,44 +380,21 @@ class QuadWidget(QtOpenGL.QGLWidget):
                
         glTranslatef(0.0, 0.0, 0.0)     # Origin where we want the object rotated
 
-        rtd = 180 / pi
-        glRotatef(self.yaw * rtd,   0, 1, 0)  # about screen y (y point up)
-        glRotatef(self.pitch * rtd, 0, 0, 1)  # about screen z (z out of screen)
-        glRotatef(self.roll * rtd,  1, 0, 0)  # about screen x (x points right)
-        
         # Compute the orientation matrix directly
         # openGL uses a 4x4 matrix to store (rotation) orientation, translation
         # and scaling. The 3x3 rotation matrix is inside the 4x4
-
-#        sroll = sin(self.roll)
-#        croll = cos(self.roll)
-#        spitch = sin(self.pitch)
-#        cpitch = cos(self.pitch)
-#        syaw = sin(self.yaw)
-#        cyaw = cos(self.yaw)
-#        
-#        m = (ctypes.c_float * 16)()
-#        m[0] = cpitch * cyaw
-#        m[1] = spitch * cyaw
-#        m[2] = -syaw
-#        m[3] = 0;
-#        
-#        m[4] = cpitch * syaw * sroll - spitch * croll
-#        m[5] = cpitch * croll + spitch * syaw * sroll
-#        m[6] = cyaw * sroll
-#        m[7] = 0;
-#        
-#        m[8] = cpitch * syaw * croll + spitch * croll
-#        m[9] = spitch * syaw * croll - cpitch * sroll
-#        m[10] = cyaw * sroll;
-#        m[11] = 0;
-#        
-#        m[12] = 0;  # No translation
-#        m[13] = 0; 
-#        m[14] = 0; 
-#        m[15] = 1;
-#        
-#        glMultMatrixf(m)        
+        #
+        # Same rotations as
+        #   glRotatef(yaw,   0, 1, 0)  # about screen y (y point up)
+        #   glRotatef(pitch, 0, 0, 1)  # about screen z (z out of screen)
+        #   glRotatef(roll,  1, 0, 0)  # about screen x (x points right)
+        # i.e., M = Ry(yaw) * Rz(pitch) * Rx(roll)
+        self.euler[0] = (self.yaw, self.pitch, self.roll)
+        Astro.dcm.from_euler('yzx', self.euler, out=self.orientation)
+        
+        # Row major transpose is the column major layout openGL expects
+        self.glOrientation[0:3,0:3] = self.orientation[0].T
+        glMultMatrixf(self.glOrientation)
                 
         # Make the object look-at a specific point from the origin
         # Here we define "up" as "down" (-1) via the screen y-axis
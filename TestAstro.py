@@ -7,6 +7,7 @@ Created on Fri Sep 29 19:23:36 2017
 
 import Astro
 import numpy as np
+import tracemalloc
 
 # Stack the data tx1x9, which is easy for people to read
 # sequence (or time) goes down the page and each row
@@ -72,6 +73,221 @@ print(d7)
 print("q...")
 print(q)
 
+print("q * q... (Hamilton product)")
+print(q*q)
 
+print("q[0] * q... (1 vs N)")
+print(q[0]*q)
 
+print("A * y... (vector rotation)")
+y = np.array([0.0, 1.0, 0.0])
+print(A*y)
 
+print("q * y... (vector rotation, should match A * y)")
+print(q*y)
+
+print("q resampled at 4x the rate... (slerp)")
+tq = np.arange(0, len(phi) - 1, 0.25)
+print(Astro.slerp(np.arange(len(phi)), q, tq)[0:8])
+
+print("attitude series... (cached eigenangle, lookup by time)")
+S = Astro.attitudeseries(np.arange(len(phi)), q)
+print(S.eigenangle()[0:4])
+print(S.at(2.5))
+
+print("q @= dq in a loop... (in place, no per-step allocations)")
+qs = Astro.quaternion(np.tile(q.view(np.ndarray), (100,1,1)))
+dq = Astro.quaternion(np.tile(q[1].view(np.ndarray), (qs.shape[0],1,1)))
+qs @= dq                    # first pass sizes the work buffers
+qs.normalize(out=qs)
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+tracemalloc.reset_peak()
+for k in range(1000):
+    qs @= dq
+    qs.normalize(out=qs)
+current, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print('bytes kept per step:', (current - before) / 1000.0)
+print('peak bytes in flight:', peak - before, 'for a', qs.nbytes, 'byte stack')
+assert (current - before) < 1000     # less than a byte per step, i.e., nothing kept
+assert (peak - before) < qs.nbytes   # no stack sized temporaries
+qs.release()                         # the work buffers go with it
+assert qs._work is None
+qs @= dq
+assert qs._work[0].shape == qs.shape
+qs.release()
+Ds = Astro.dcm(A.view(np.ndarray).copy())
+Ds @= A
+assert Ds._work[0].shape == Ds.shape
+Ds.release()
+assert Ds._work is None
+
+print("float32 structure of arrays vs float64 stacks... (accuracy bounds, see Astro/Soa.py)")
+q64 = Astro.quaternion(np.concatenate((q.view(np.ndarray), qs[0:7].view(np.ndarray))))
+p64 = (q64 * q64[3]).view(np.ndarray)
+v64 = np.tile(np.array([[1.0, -2.0, 0.5]]), (q64.shape[0],1))
+q32 = Astro.soa.to_soa(q64, dtype=np.float32)
+p32 = Astro.soa.to_soa(p64, dtype=np.float32)
+err = np.abs(Astro.soa.from_soa(Astro.soa.multiply(q32, p32)).view(np.ndarray) -
+             Astro.fast.multiply(q64.view(np.ndarray), p64)).max()
+print('quaternion * quaternion:', err)
+assert err < 1.0e-6
+err = np.abs(Astro.soa.from_soa(Astro.soa.to_quat(Astro.soa.to_dcm(q32))).view(np.ndarray) -
+             q64.view(np.ndarray)).max()
+print('quaternion -> dcm -> quaternion:', err)
+assert err < 1.0e-6
+err = np.abs(Astro.soa.rotate(q32, v64.T.astype(np.float32)).T - q64.rotate(v64)).max()
+print('quaternion * vector:', err / np.abs(v64).max())
+assert err < 1.0e-6 * np.abs(v64).max()
+print('bytes:', q64.nbytes, '->', q32.nbytes)
+
+print("q over the wire... (header + payload frames, received as a view)")
+header, payload = Astro.to_buffer(q)
+print(len(header), 'byte header,', payload.nbytes, 'byte payload')
+print(Astro.from_buffer(b''.join((header, payload)))[0:2])
+
+print("orbit velocity vs finite difference of position... (two body and J2)")
+for j2 in (False, True):
+    O = Astro.orbit(7.0e6, 0.01, 0.9, 0.3, 0.5, 0.1, j2=j2)
+    h = 1.0e-3
+    r1, _ = O.propagate(1000.0 + h)
+    r0, _ = O.propagate(1000.0 - h)
+    _, v = O.propagate(1000.0)
+    err = np.abs((r1 - r0) / (2.0 * h) - v).max()
+    print('j2' if j2 else 'two body', err)
+    assert err < 1.0e-4
+
+print("ephemeris write, reopen and window... (append after a torn write)")
+import os
+import tempfile
+path = os.path.join(tempfile.mkdtemp(), 'test.eph')
+with Astro.ephemeris(path, 'w', t0=10.0, dt=0.5) as E:
+    E.append(q[0:3])
+with open(path, 'ab') as f:
+    f.write(b'\xff' * 20)       # payload of a writer that died before the count
+with Astro.ephemeris(path, 'a') as E:
+    E.append(q[3])
+E = Astro.ephemeris(path)
+print(len(E), E.times(), os.path.getsize(path))
+assert len(E) == 4
+assert np.array_equal(E.data.view(np.ndarray), q[0:4].view(np.ndarray))
+assert np.array_equal(E.window(10.5, 11.0).view(np.ndarray), q[1:3].view(np.ndarray))
+assert np.array_equal(E.times(), [10.0, 10.5, 11.0, 11.5])
+E.close()
+
+print("slerp and squad across repeated sample times... (no 0/0)")
+for f in (Astro.slerp, Astro.squad):
+    qq = f([0.0, 1.0, 1.0, 2.0], q[0:4], [0.5, 1.0, 1.5, 3.0]).view(np.ndarray)
+    assert np.all(np.isfinite(qq))
+    assert np.allclose(qq[1], q[2].view(np.ndarray))
+    qq = f([0.0, 1.0, 1.0], q[0:3], [1.0, 2.0]).view(np.ndarray)
+    assert np.allclose(qq, q[2].view(np.ndarray))
+print(Astro.slerp([0.0, 1.0, 1.0], q[0:3], [1.0]))
+
+print("propagate at a constant rate vs the closed form... (exp, rk2, rk4, chunked, fleet)")
+w0 = np.array([0.1, -0.2, 0.3])
+n = 201
+tw = 0.01 * np.arange(n)
+angle = np.linalg.norm(w0) * tw / 2.0
+exact = np.zeros((n,1,4))
+exact[:,0,0] = np.cos(angle)
+exact[:,0,1:4] = np.sin(angle)[:,np.newaxis] * w0 / np.linalg.norm(w0)
+exact = Astro.fast.multiply(q[3].view(np.ndarray), exact)
+w = np.tile(w0, (n,1))
+for method, tolerance in (('exp', 1.0e-12), ('rk2', 1.0e-6), ('rk4', 1.0e-12)):
+    err = np.abs(Astro.propagate(w, 0.01, q0=q[3], method=method).view(np.ndarray) - exact).max()
+    print(method, err)
+    assert err < tolerance
+P = Astro.propagator(q[3], 0.01, method='rk4')
+pieces = np.concatenate([P.propagate(c).view(np.ndarray) for c in np.split(w, [1, 50, 51, 130])])
+assert np.array_equal(pieces, Astro.propagate(w, 0.01, q0=q[3], method='rk4').view(np.ndarray))
+fleet = Astro.propagate(np.stack((w, -w, 2.0 * w)), 0.01, q0=q[3], method='rk4').view(np.ndarray)
+for k, s in enumerate((1.0, -1.0, 2.0)):
+    assert np.allclose(fleet[k], Astro.propagate(s * w, 0.01, q0=q[3], method='rk4').view(np.ndarray),
+                       rtol=0.0, atol=1.0e-15)
+
+print("streamed conversions in small chunks vs whole stacks...")
+Ad = A.view(np.ndarray)
+qd = np.concatenate([c.view(np.ndarray).copy() for c in
+                     Astro.stream.dcm_to_quat(Astro.stream.chunked(Ad, 7), size=5)])
+assert np.array_equal(qd, Astro.fast.to_quat(Ad))
+dd = np.concatenate([c.view(np.ndarray).copy() for c in Astro.stream.quat_to_dcm([qd[0:11], qd[11:]], size=4)])
+print('dcm -> quaternion -> dcm:', np.abs(dd - Ad).max())
+assert np.abs(dd - Ad).max() < 1.0e-12
+assert all(m.all() for m in Astro.stream.isnormal(Astro.stream.chunked(qd, 6)))
+assert not next(Astro.stream.isnormal(2.0 * qd)).any()
+
+print("Euler angles, from_euler -> to_euler for all 12 sequences... (and a known answer)")
+rng = np.random.default_rng(0)
+for seq in ('xyz', 'xzy', 'yxz', 'yzx', 'zxy', 'zyx', 'xyx', 'xzx', 'yxy', 'yzy', 'zxz', 'zyz'):
+    e = rng.uniform(-np.pi, np.pi, (100,3))
+    if seq[0] == seq[2]:
+        e[:,1] = rng.uniform(0.1, np.pi - 0.1, 100)
+    else:
+        e[:,1] = rng.uniform(-np.pi / 2 + 0.1, np.pi / 2 - 0.1, 100)
+    err = np.abs(Astro.dcm.from_euler(seq, e).to_euler(seq) - e).max()
+    assert err < 1.0e-12, seq
+yaw = Astro.dcm.from_euler('zyx', [np.pi / 2, 0.0, 0.0]).view(np.ndarray)
+assert np.allclose(yaw, [[[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]])
+e = np.array([[0.3, -0.4, 1.1]])
+assert np.allclose(next(Astro.stream.euler(Astro.fast.to_quat(Astro.fast.from_euler('zyx', e)))), e)
+
+print("orthonormalize drifting DCMs... (newton and svd)")
+for method in ('newton', 'svd'):
+    D = Astro.dcm(A.view(np.ndarray) + 1.0e-6 * np.random.default_rng(1).standard_normal(A.shape))
+    assert not D.orthonormal().any()
+    before = D.orthonormalize(method=method)
+    print(method, before.max(), Astro.fast.orthonormal_error(D.view(np.ndarray)).max())
+    assert D.orthonormal().all()
+    assert np.abs(D.view(np.ndarray) - A.view(np.ndarray)).max() < 1.0e-5
+
+print("nearest attitude index vs brute force... (q and -q are the same attitude)")
+if Astro.Index.cKDTree is None:
+    print('skipped, requires scipy')
+else:
+    rng = np.random.default_rng(2)
+    catalog = Astro.fast.normalize(rng.standard_normal((2000,1,4)))
+    queries = Astro.fast.normalize(rng.standard_normal((50,1,4)))
+    queries[0:10] = -catalog[0:10]
+    brute = 2.0 * np.arccos(np.clip(np.abs(queries[:,0,:] @ catalog[:,0,:].T), 0.0, 1.0))
+    I = Astro.attitudeindex(catalog)
+    a, i = I.query(queries, k=3)
+    assert np.array_equal(i, np.argsort(brute, axis=1, kind='stable')[:,0:3])
+    assert np.allclose(a, np.sort(brute, axis=1)[:,0:3], atol=1.0e-7)
+    assert np.array_equal(i[0:10,0], np.arange(10))
+    near = I.radius(queries, 0.5)
+    assert all(np.array_equal(l, np.flatnonzero(b <= 0.5)) for l, b in zip(near, brute))
+
+print("frame graph chains... (static, sampled and function edges, memoized)")
+Dab = Astro.dcm.from_euler('zyx', [0.3, -0.2, 0.1]).view(np.ndarray)
+Dbc = Astro.dcm.from_euler('zyx', [-1.0, 0.5, 0.7]).view(np.ndarray)
+ts = np.arange(len(phi), dtype=np.float64)
+G = Astro.framegraph()
+G.add('a', 'b', Dab)
+G.add('b', 'c', Dbc)
+G.add('c', 'd', A, t=ts)
+G.add('e', 'd', lambda t: Astro.dcm.from_euler('zyx', np.outer(t, [0.1, 0.0, 0.0])))
+assert G.path('a', 'e') == ['a', 'b', 'c', 'd', 'e']
+assert np.allclose(G.transform('a', 'c').view(np.ndarray), Dbc @ Dab)
+assert np.allclose(G.transform('c', 'a').view(np.ndarray), (Dbc @ Dab).transpose(0, 2, 1))
+D = G.transform('a', 'e', ts)
+De = Astro.dcm.from_euler('zyx', np.outer(ts, [0.1, 0.0, 0.0])).view(np.ndarray).transpose(0, 2, 1)
+assert np.allclose(D.view(np.ndarray), De @ A.view(np.ndarray) @ Dbc @ Dab)
+assert G.transform('a', 'e', ts) is D
+assert not D.flags.writeable
+
+print("windowed Markley average... (symmetric spread with sign flips, any chunking)")
+qm = q[5].view(np.ndarray)
+spread = Astro.dcm.from_euler('zyx', np.array([[0.05, 0.0, 0.0], [-0.05, 0.0, 0.0],
+                                               [0.0, 0.02, 0.0], [0.0, -0.02, 0.0]]))
+dq = Astro.fast.to_quat(spread.view(np.ndarray))
+samples = np.tile(Astro.fast.multiply(qm, dq), (5,1,1))
+samples[1::3] *= -1.0
+means = np.concatenate([m.view(np.ndarray).copy() for m in Astro.stream.average(samples, window=4)])
+assert np.allclose(means, qm * np.sign(qm[...,0:1]), atol=1.0e-12)
+pieces = np.concatenate([m.view(np.ndarray).copy() for m in
+                         Astro.stream.average(Astro.stream.chunked(samples, 3), window=6, size=5)])
+whole = np.concatenate([m.view(np.ndarray).copy() for m in Astro.stream.average(samples, window=6)])
+assert pieces.shape == (4,1,4)
+assert np.allclose(pieces, whole, atol=1.0e-12)
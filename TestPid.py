@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Checks of the vision to PID latency model tools (pidEvent, pidMonteCarlo)
+"""
+
+import numpy as np
+
+import pidEvent
+import pidMonteCarlo
+
+r = pidEvent.model(**pidEvent.PIDSIM3).run(seed=1)
+print('%d events' % r['events'])
+
+# Settling: a response that never leaves a (wide) band settled at once,
+# one still outside at the end of the step never settled
+m = pidMonteCarlo.metrics(r, band=5.0)
+print('settling, 500% band:', m['settling'])
+assert m['settling'] == 0.0
+
+ts = r['ts']
+never = dict(r, p=np.zeros_like(ts))
+m = pidMonteCarlo.metrics(never)
+print('settling, no response:', m['settling'])
+assert np.isnan(m['settling'])
+
+table = {'seed' : np.arange(2)}
+for name in pidMonteCarlo.METRICS:
+    table[name] = np.array([0.0, 1.0])
+assert pidMonteCarlo.bands(table)['unsettled'] == 0
+
+import pidDelay
+
+# Delay line blocks: the same output whether the signal arrives in one
+# chunk, one sample at a time (step) or in ragged chunks
+dt = 0.001
+x = np.sin(2.0 * np.pi * 3.0 * np.arange(2000) * dt)
+x = np.stack((x, -2.0 * x), axis=-1)       # a trailing batch axis rides along
+cuts = np.cumsum(np.random.default_rng(0).integers(0, 60, 200))
+cuts = cuts[cuts < len(x)]
+blocks = {'fixeddelay'      : lambda: pidDelay.fixeddelay(0.037, dt=dt),
+          'jittereddelay'   : lambda: pidDelay.jittereddelay(0.020, 0.0, 0.005, dt=dt, seed=3),
+          'sampleandhold'   : lambda: pidDelay.sampleandhold(0.0125, offset=0.002, dt=dt),
+          'frameintegrator' : lambda: pidDelay.frameintegrator(30.0, dt=dt),
+          'frame mean'      : lambda: pidDelay.frameintegrator(30.0, mode='mean', dt=dt),
+          'processingstage' : lambda: pidDelay.processingstage(3.0, 5.0, fetch=0.020, dt=dt, seed=4),
+          'pipeline'        : lambda: pidDelay.pipeline(pidDelay.frameintegrator(30.0, dt=dt),
+                                                        pidDelay.processingstage(3.0, 5.0, fetch=0.020,
+                                                                                 dt=dt, seed=1),
+                                                        pidDelay.jittereddelay(0.020, 0.0, 0.002,
+                                                                               dt=dt, seed=2))}
+for name, make in blocks.items():
+    whole = make()(x)
+    b = make()
+    stepped = np.array([b.step(s) for s in x])
+    b = make()
+    ragged = np.concatenate([b(c) for c in np.split(x, cuts)])
+    print('%-16s whole == step == ragged' % name)
+    assert np.array_equal(whole, stepped)
+    assert np.array_equal(whole, ragged)
+    b.reset()
+    assert np.array_equal(b(x), whole)
+
+# fixeddelay is an exact shift by samples, holding the initial value before
+b = pidDelay.fixeddelay(0.037, dt=dt, initial=0.5)
+y = b(x)
+assert b.samples == 37
+assert np.all(y[:37] == 0.5)
+assert np.array_equal(y[37:], x[:-37])
+
+# Publish instants on a ramp: 100 Hz frames (10 samples) show the middle
+# sample (or the mean) of each frame from the end of the frame on; a
+# sample and hold at 10 ms + 2.5 ms samples at the first step at or after
+ramp = np.arange(60.0)
+y = pidDelay.frameintegrator(100.0, dt=dt)(ramp)
+assert np.array_equal(y[:10], np.zeros(10))
+assert np.array_equal(y[10:60], np.repeat([5.0, 15.0, 25.0, 35.0, 45.0], 10))
+y = pidDelay.frameintegrator(100.0, mode='mean', dt=dt)(ramp)
+assert np.array_equal(y[10:60], np.repeat([4.5, 14.5, 24.5, 34.5, 44.5], 10))
+y = pidDelay.sampleandhold(0.010, offset=0.0025, dt=dt)(ramp)
+assert np.array_equal(y[:3], np.zeros(3))
+assert np.array_equal(y[3:53], np.repeat([3.0, 13.0, 23.0, 33.0, 43.0], 10))
+assert np.all(y[53:] == 53.0)
+
+# Event engine: closed form plant, held signals, event order, replay
+import pickle
+
+h, tau = 0.7, 0.3
+G, v, p = pidEvent.solution(h, 0.0, 0.0, 0.0, 1.0, order=1, kg=2.0, tau=tau)
+assert np.isclose(p, 2.0 * (h - tau * (1.0 - np.exp(-h / tau))))
+G, v, p = pidEvent.solution(h, 0.0, 0.0, 0.0, 1.0, order=2, kg=2.0, tau=tau, m=4.0)
+assert np.isclose(v, 0.5 * (h - tau * (1.0 - np.exp(-h / tau))))
+state = (0.2, -0.1, 0.3)
+once = pidEvent.solution(0.5, *state, u=0.8)
+twice = pidEvent.solution(0.2, *pidEvent.solution(0.3, *state, u=0.8), u=0.8)
+assert np.allclose(once, twice, rtol=1.0e-14)
+
+assert np.array_equal(pidEvent.hold([0.1, 0.3], [5.0, 7.0], np.array([0.0, 0.1, 0.2, 0.3, 0.4]), -1.0),
+                      [-1.0, 5.0, 5.0, 7.0, 7.0])
+
+s = pidEvent.scheduler()
+for t, kind, data in ((0.2, 1, 'c'), (0.1, 2, 'b'), (0.1, 1, 'a'), (0.2, 1, 'd')):
+    s.schedule(t, kind, data)
+assert [s.pop()[2] for k in range(len(s))] == ['a', 'b', 'c', 'd']
+
+sim = pidEvent.model(**pidEvent.PIDSIM2)
+r1, r2 = sim.run(seed=7), pickle.loads(pickle.dumps(sim)).run(seed=7)
+assert all(np.array_equal(r1[name], r2[name], equal_nan=True) for name in r1 if name != 'events')
+assert not np.array_equal(r1['p'], sim.run(seed=8)['p'])
+
+# Lockstep batch: K gain/plant sets in one run equal K single runs
+kd, tau = np.array([0.5, 0.8, 1.1]), np.array([0.2, 0.3, 0.4])
+batch = pidEvent.model(**dict(pidEvent.PIDSIM3, kd=kd, tau=tau[:,np.newaxis]))
+assert batch.shape == (3, 3)
+r = batch.run(seed=3, signals=('p', 'cvPid'))
+assert r['p'].shape == (3, 3, len(r['ts']))
+for i in range(3):
+    for j in range(3):
+        single = pidEvent.model(**dict(pidEvent.PIDSIM3, kd=kd[j], tau=tau[i])).run(seed=3)
+        assert np.array_equal(r['p'][i,j], single['p'])
+        assert np.array_equal(r['cvPid'][i,j], single['cvPid'])
+m = pidMonteCarlo.metrics(r)
+assert m['itae'].shape == (3, 3)
+
+# Tuner: batched candidates cost what they cost alone, memoized on disk,
+# and the search never ends worse than it started
+import os
+import tempfile
+import pidTune
+
+try:
+    pidTune.tuner(pidEvent.PIDSIM3, gains=('kd', 'dt'))
+    assert False, 'dt cannot be batched'
+except ValueError:
+    pass
+
+cache = os.path.join(tempfile.mkdtemp(), 'tune.json')
+params = dict(pidEvent.PIDSIM3, tmax=2.0)
+x = np.array([[0.0, 0.0, 0.8], [0.5, 0.0, 0.8], [0.0, 0.1, 1.2]])
+with pidTune.tuner(params, seeds=2, workers=0, cache=cache) as T:
+    c = T.cost(x)
+    assert T.evaluations == 3
+    assert np.array_equal(T.cost(x), c) and (T.evaluations == 3)
+    x1, f1 = T.minimize(x[0], method='coordinate', iterations=4)
+    assert f1 <= c[0]
+with pidTune.tuner(params, seeds=2, workers=0, cache=cache) as T:
+    for row, cost in zip(x, c):
+        assert T.cost(row)[0] == cost
+    assert T.evaluations == 0
+with pidTune.tuner(params, seeds=2, workers=0) as T:
+    # Same runs; only the metric sums over a batch round differently
+    assert np.allclose([T.cost(row)[0] for row in x], c, rtol=1.0e-12, atol=0.0)
+print('tuned cost %.4g from %.4g' % (f1, c[0]))
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""
+pidDelay.py
+
+Ring buffer delay line blocks for camera, communication and processing
+latency modeling.
+
+The latency chains of pidSim.py / pidSim2.py (cvComm0 -> G -> pvCam ->
+pvComm1 -> pvImage -> pvComm2 -> pvFinal) were written out by hand with
+full length np.zeros(nmax) arrays and index bookkeeping. Each stage here is
+a block that only keeps the state it needs, so memory is O(delay) rather
+than O(duration):
+
+    fixeddelay       constant transport delay (ring buffer of delay/dt samples)
+    jittereddelay    delay plus per sample normal jitter, delivered in order
+    sampleandhold    periodic sampling (e.g., a timer task) held in between
+    frameintegrator  camera frames: sample at mid frame (or average over the
+                     frame), published at the end of the frame
+    processingstage  busy/idle stage: fetch the latest input, process for a
+                     random duration, publish, start again
+
+All blocks run on a fixed time step dt and are fed in chunks of samples
+(time is the first axis; trailing axes, e.g. a batch, are carried along),
+or one sample at a time with step() for real-time use. Chunks may be any
+length; feeding a signal in one piece or in many pieces gives the same
+output. A pipeline strings blocks together declaratively
+
+    chain = pipeline(frameintegrator(rate=30.0),
+                     processingstage(minRate=3.0, maxRate=5.0, fetch=0.020, seed=1),
+                     fixeddelay(0.020))
+    for y in chain.stream(chunks):
+        ...
+
+and its latency (the sum of the nominal latencies of its blocks) can be
+used to compensate a measurement in real time.
+
+Copyright (c) 2016 - RocketRedNeck.com RocketRedNeck.net
+
+RocketRedNeck and MIT Licenses
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+****************************************************************************************************
+"""
+
+import numpy as np
+
+# Tolerance on sample instants computed from periods that are not whole
+# multiples of the time step
+EPS = 1.0e-9
+
+'''
+    _fill - output of a held signal over a chunk of m samples given the
+    chunk indices where it changes (increasing) and the new values
+'''
+def _fill(m, index, values, held):
+    held = np.asarray(held, dtype=np.float64)
+    if (len(index) == 0):
+        return np.broadcast_to(held, (m,) + held.shape).copy()
+    values = np.concatenate((held[np.newaxis], np.asarray(values, dtype=np.float64)))
+    marks = np.zeros(m, dtype=np.intp)
+    marks[index] = np.arange(1, len(index) + 1)
+    return values[np.maximum.accumulate(marks)]
+
+class ring(object):
+    '''
+    ring - fixed length ring buffer of samples
+
+    push(x) stores the chunk x and returns the samples it displaced, oldest
+    first, so a ring of length n is a delay of n samples.
+    '''
+    def __init__(self, length, initial=0.0):
+        self.length = int(length)
+        self.initial = initial
+        self.reset()
+
+    def reset(self):
+        self._buffer = None
+        self._head = 0
+
+    def push(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        n, m = self.length, len(x)
+        if (n == 0):
+            return x.copy()
+        if self._buffer is None:
+            self._buffer = np.full((n,) + x.shape[1:], self.initial, dtype=np.float64)
+
+        out = np.empty_like(x)
+        if (m <= n):
+            index = (self._head + np.arange(m)) % n
+            out[...] = self._buffer[index]
+            self._buffer[index] = x
+            self._head = (self._head + m) % n
+        else:
+            out[:n] = np.roll(self._buffer, -self._head, axis=0)
+            out[n:] = x[:m - n]
+            self._buffer[...] = x[m - n:]
+            self._head = 0
+        return out
+
+class block(object):
+    '''
+    block - base of the delay line blocks
+
+    Subclasses implement _chunk(x, k) for the samples x starting at global
+    sample index k. latency is the nominal delay of the block in seconds.
+    '''
+    latency = 0.0
+
+    def __init__(self, dt=0.001, initial=0.0):
+        self.dt = dt
+        self.initial = initial
+        self.k = 0
+
+    def reset(self):
+        self.k = 0
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        y = self._chunk(x, self.k)
+        self.k += len(x)
+        return y
+
+    '''
+        step - one sample in, one sample out
+    '''
+    def step(self, x):
+        return self(np.asarray(x, dtype=np.float64)[np.newaxis])[0]
+
+class fixeddelay(block):
+    '''
+    fixeddelay - constant transport delay, rounded to whole samples
+    '''
+    def __init__(self, delay, dt=0.001, initial=0.0):
+        block.__init__(self, dt, initial)
+        self.samples = int(round(delay / dt))
+        self.latency = self.samples * dt
+        self._ring = ring(self.samples, initial)
+
+    def reset(self):
+        block.reset(self)
+        self._ring.reset()
+
+    def _chunk(self, x, k):
+        return self._ring.push(x)
+
+class jittereddelay(block):
+    '''
+    jittereddelay - transport delay plus a normal jitter per sample with
+    3-sigma limits at minJitter and maxJitter (clipped to them)
+
+    Samples are delivered in order, as on a bus: one that would overtake an
+    earlier sample arrives with it. The output holds the latest sample
+    delivered. Only samples still in flight are kept, at most
+    (delay + maxJitter) / dt of them.
+    '''
+    def __init__(self, delay, minJitter=0.0, maxJitter=0.0, dt=0.001, initial=0.0, seed=None):
+        block.__init__(self, dt, initial)
+        self.delay = delay
+        self.minJitter = minJitter
+        self.maxJitter = maxJitter
+        self.latency = delay + 0.5 * (minJitter + maxJitter)
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        block.reset(self)
+        self._rng = np.random.default_rng(self.seed)
+        self._arrive = np.empty(0, dtype=np.int64)
+        self._values = None
+        self._held = self.initial
+
+    def _chunk(self, x, k):
+        m = len(x)
+        sigma = (self.maxJitter - self.minJitter) / 3.0
+        jitter = np.zeros(m)
+        if (sigma > 0.0):
+            jitter = np.clip(self._rng.normal(0.5 * (self.minJitter + self.maxJitter), sigma, m),
+                             self.minJitter, self.maxJitter)
+        arrive = k + np.arange(m) + np.round((self.delay + jitter) / self.dt).astype(np.int64)
+
+        values = x if self._values is None else np.concatenate((self._values, x))
+        arrive = np.maximum.accumulate(np.concatenate((self._arrive, arrive)))
+
+        # Delivered at or before each sample of the chunk
+        last = np.searchsorted(arrive, k + np.arange(m), side='right') - 1
+        held = np.broadcast_to(np.asarray(self._held, dtype=np.float64), x.shape[1:])
+        y = np.where((last >= 0).reshape((m,) + (1,) * (x.ndim - 1)),
+                     values[np.maximum(last, 0)], held)
+
+        if (m > 0) and (last[-1] >= 0):
+            self._held = values[last[-1]].copy()
+        keep = np.searchsorted(arrive, k + m - 1, side='right')
+        self._arrive = arrive[keep:]
+        self._values = values[keep:].copy()
+        return y
+
+class sampleandhold(block):
+    '''
+    sampleandhold - sample the input every period (first at offset) and
+    hold it in between; the sample instants need not be whole time steps
+    (each is taken at the first sample at or after it)
+    '''
+    def __init__(self, period, offset=0.0, dt=0.001, initial=0.0):
+        block.__init__(self, dt, initial)
+        self.period = period
+        self.offset = offset
+        self.latency = 0.5 * period
+        self.reset()
+
+    def reset(self):
+        block.reset(self)
+        self._held = self.initial
+
+    '''
+        _instant - sample index of the j-th sample instant
+    '''
+    def _instant(self, j):
+        return np.ceil((self.offset + j * self.period) / self.dt - EPS).astype(np.int64)
+
+    def _chunk(self, x, k):
+        m = len(x)
+        t = (k + np.arange(m)) * self.dt
+        j = np.floor((t - self.offset) / self.period + EPS).astype(np.int64)
+        j = j[j >= 0]
+        instants = np.unique(self._instant(np.unique(j))) - k if len(j) else np.empty(0, dtype=np.int64)
+        instants = instants[(instants >= 0) & (instants < m)]
+        y = _fill(m, instants, x[instants], np.broadcast_to(self._held, x.shape[1:]))
+        if (m > 0):
+            self._held = y[-1].copy()
+        return y
+
+class frameintegrator(block):
+    '''
+    frameintegrator - camera frames at rate (Hz) starting at offset
+
+    Each frame represents the input at its midpoint (mode 'middle') or the
+    mean over the frame (mode 'mean', e.g. for motion blur) and is
+    published at the end of the frame, held until the next frame is.
+    '''
+    def __init__(self, rate, offset=0.0, mode='middle', dt=0.001, initial=0.0):
+        block.__init__(self, dt, initial)
+        if mode not in ('middle', 'mean'):
+            raise ValueError('mode must be middle or mean')
+        self.period = 1.0 / rate
+        self.offset = offset
+        self.mode = mode
+        self.latency = 0.5 * self.period
+        self.reset()
+
+    def reset(self):
+        block.reset(self)
+        self._held = self.initial
+        self._frame = -1      # Frame being exposed
+        self._value = 0.0     # Its middle sample
+        self._samples = []    # Or its samples so far (mode 'mean')
+
+    def _chunk(self, x, k):
+        m = len(x)
+        t = (k + np.arange(m)) * self.dt
+        frame = np.floor((t - self.offset) / self.period + EPS).astype(np.int64)
+        held = np.broadcast_to(np.asarray(self._held, dtype=np.float64), x.shape[1:])
+
+        # Segments of samples in the same frame
+        start = np.flatnonzero(np.diff(frame, prepend=self._frame) != 0)
+        self._accumulate(x, k, frame, 0, start[0] if len(start) else m)
+        index, values = [], []
+        for n, a in enumerate(start):
+            if (self._frame >= 0):
+                # The frame being exposed ends here
+                index.append(a)
+                values.append(self._published())
+            self._frame = frame[a]
+            self._value, self._samples = 0.0, []
+            self._accumulate(x, k, frame, a, start[n + 1] if (n + 1 < len(start)) else m)
+
+        y = _fill(m, np.array(index, dtype=np.intp), values, held)
+        if (m > 0):
+            self._held = y[-1].copy()
+        return y
+
+    '''
+        _accumulate - fold the chunk samples a:b of the current frame in
+
+        For the mean the samples of the frame are kept (at most a frame of
+        them) and summed once it ends, so the result does not depend on
+        how the frame was split across chunks.
+    '''
+    def _accumulate(self, x, k, frame, a, b):
+        if (self._frame < 0) or (a == b):
+            return
+        if (self.mode == 'mean'):
+            self._samples.append(x[a:b].copy())
+        else:
+            middle = int(np.floor((self.offset + (self._frame + 0.5) * self.period) / self.dt + 0.5)) - k
+            if (a <= middle < b):
+                self._value = x[middle].copy()
+
+    '''
+        _published - value of the frame that just ended
+    '''
+    def _published(self):
+        if (self.mode == 'mean'):
+            return np.mean(np.concatenate(self._samples), axis=0)
+        return self._value
+
+class processingstage(block):
+    '''
+    processingstage - a stage that fetches the latest input, works on it
+    and publishes the result, then immediately fetches again
+
+    fetch is the time to fetch the input (e.g., the camera link); the
+    processing time is normal between 1/maxRate and 1/minRate with sigma
+    sigmas across that span (at least one time step).
+    '''
+    def __init__(self, minRate, maxRate, sigma=3.0, fetch=0.0, dt=0.001, initial=0.0, seed=None):
+        block.__init__(self, dt, initial)
+        self.shortest = 1.0 / maxRate
+        self.longest = 1.0 / minRate
+        self.sigma = sigma
+        self.fetch = fetch
+        self.latency = fetch + 0.5 * (self.shortest + self.longest)
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        block.reset(self)
+        self._rng = np.random.default_rng(self.seed)
+        self._held = self.initial
+        self._start = 0       # Sample the input is fetched at
+        self._work = None     # Input being worked on
+        self._done = None     # Sample the result is published at
+
+    def _duration(self):
+        mean = 0.5 * (self.shortest + self.longest)
+        d = mean
+        if (self.sigma != 0.0):
+            d = self._rng.normal(mean, (self.longest - self.shortest) / self.sigma)
+        return max(1, int(round((self.fetch + d) / self.dt)))
+
+    def _chunk(self, x, k):
+        m = len(x)
+        held = np.broadcast_to(np.asarray(self._held, dtype=np.float64), x.shape[1:])
+        index, values = [], []
+        while True:
+            if (self._work is None):
+                if (self._start >= k + m):
+                    break
+                self._work = x[self._start - k].copy()
+                self._done = self._start + self._duration()
+            if (self._done >= k + m):
+                break
+            index.append(self._done - k)
+            values.append(self._work)
+            self._start = self._done
+            self._work = None
+
+        y = _fill(m, np.array(index, dtype=np.intp), values, held)
+        if (m > 0):
+            self._held = y[-1].copy()
+        return y
+
+class pipeline(block):
+    '''
+    pipeline - blocks applied in order; itself a block, so pipelines nest
+    '''
+    def __init__(self, *blocks):
+        block.__init__(self, blocks[0].dt if blocks else 0.001)
+        self.blocks = list(blocks)
+
+    @property
+    def latency(self):
+        return sum(b.latency for b in self.blocks)
+
+    def reset(self):
+        block.reset(self)
+        for b in self.blocks:
+            b.reset()
+
+    def _chunk(self, x, k):
+        for b in self.blocks:
+            x = b(x)
+        return x
+
+    '''
+        stream - outputs for an iterable of input chunks, one chunk at a
+        time (constant memory for any run length)
+    '''
+    def stream(self, chunks):
+        for x in chunks:
+            yield self(x)
+
+if __name__ == '__main__':
+    import time
+    import tracemalloc
+    import matplotlib.pyplot as plot
+
+    # The pidSim2.py return path: camera, camera link + image processing,
+    # network table
+    dt = 0.001
+    def chain():
+        return pipeline(frameintegrator(rate=30.0, dt=dt),
+                        processingstage(minRate=3.0, maxRate=5.0, fetch=0.020, dt=dt, seed=1),
+                        jittereddelay(0.020, 0.0, 0.002, dt=dt, seed=2))
+
+    def source(seconds, chunk=1.0):
+        n = int(round(chunk / dt))
+        for c in range(int(round(seconds / chunk))):
+            yield np.sin(2.0 * np.pi * 0.25 * (c * n + np.arange(n)) * dt)
+
+    # An hour at 1 kHz in one second chunks, constant memory
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    c = chain()
+    last = None
+    for y in c.stream(source(3600.0)):
+        last = y
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('3600 s in %.2f s, peak %.0f kB (3.6e6 samples would be %.0f kB)' %
+          (time.perf_counter() - t0, peak / 1024.0, 3.6e6 * 8 / 1024.0))
+    print('nominal latency %.3f s' % c.latency)
+
+    ts = np.arange(0.0, 10.0, dt)
+    x = np.concatenate(list(source(10.0)))
+    plot.figure(1)
+    plot.cla()
+    plot.grid()
+    plot.plot(ts, x, label='input')
+    plot.plot(ts, chain()(x), label='pipeline')
+    plot.legend(loc='best')
+    plot.show()
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+pidEvent.py
+
+Discrete-event core for the vision to PID latency simulations (pidSim2.py,
+pidSim3.py).
+
+Instead of stepping every 1 ms tick and testing a dozen "is it time yet"
+conditions, the model keeps a heap ordered schedule of the things that
+actually happen: PID task wakeups and completions, CAN (comm0) deliveries,
+camera frame midpoints and ends, camera fetch (comm1) completions, image
+processing completions and network table (comm2) deliveries. Between
+events the plant input is constant, so the plant (a first order lag on the
+command followed by one or two integrations) is advanced with its closed
+form solution. Held signals are recorded only when they change and are
+expanded onto the output time grid at the end with vectorized lookups.
+
+The cost therefore scales with the number of events, not with the run
+length divided by the resolution; event times are plain floats so sub
+microsecond timing needs no million-tick loop.
+
+Usage:
+
+    import pidEvent
+    r = pidEvent.model(**pidEvent.PIDSIM3).run(seed=1)
+    plot.plot(r['ts'], r['p'])
+
+Copyright (c) 2016 - RocketRedNeck.com RocketRedNeck.net
+
+RocketRedNeck and MIT Licenses
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+****************************************************************************************************
+"""
+
+import heapq
+
+import numpy as np
+
+# Event kinds, in the order they are handled when they fall at the same time
+PID_START   = 0     # PID task wakes up and computes a new command
+PID_END     = 1     # PID computation done, command handed to comm0 (CAN)
+COMM0_END   = 2     # Command arrives at the motor controller (plant input)
+CAM_MIDDLE  = 3     # Midpoint of a camera frame (time the image represents)
+CAM_END     = 4     # Camera frame complete and available for fetching
+COMM1_START = 5     # Image processing fetches the latest frame (comm1)
+COMM1_END   = 6     # Frame received, image processing starts
+IMAGE_END   = 7     # Image processing done, result handed to comm2
+COMM2_END   = 8     # Result arrives back at the PID (network table)
+
+# Parameters that may be arrays (a batch of gain/plant sets run in lockstep)
+BATCHED = ('kp', 'ki', 'kd', 'kg', 'tau', 'm')
+
+# Parameters of pidSim3.py (second order plant: torque -> acceleration)
+PIDSIM3 = dict(order=2, tmax=5.0, kp=0.0, ki=0.0, kd=0.8, kg=1.0, tau=0.3, m=1.0,
+               pidPeriod=0.01, pidDuration=0.0001, pidMinJitter=0.0, pidMaxJitter=0.0,
+               comm0Delay=0.001, comm0MinJitter=0.0, comm0MaxJitter=0.0,
+               camOffset=0.0, camRate=12.0,
+               comm1Delay=0.020, comm1MinJitter=0.0, comm1MaxJitter=0.0,
+               imageMinRate=10.0, imageMaxRate=30.0, imageRateSigma=3.0,
+               comm2Delay=0.020)
+
+'''
+    squarewave - setpoint of pidSim2.py (module level so parameter sets
+    using it can be pickled to worker processes)
+'''
+def squarewave(t):
+    return np.sign(np.sin(t / 4.0))
+
+# Parameters of pidSim2.py (first order plant: command -> velocity)
+PIDSIM2 = dict(order=1, tmax=10.0, kp=1.2, ki=0.0, kd=0.5, kg=1.0, tau=0.5, m=1.0,
+               pidPeriod=0.02, pidDuration=0.001, pidMinJitter=0.0, pidMaxJitter=0.0015,
+               comm0Delay=0.001, comm0MinJitter=0.0, comm0MaxJitter=0.005,
+               camOffset=0.0, camRate=30.0,
+               comm1Delay=0.020, comm1MinJitter=0.0, comm1MaxJitter=0.002,
+               imageMinRate=3.0, imageMaxRate=5.0, imageRateSigma=3.0,
+               comm2Delay=0.020,
+               setpoint=squarewave)
+
+class scheduler(object):
+    '''
+    scheduler - heap ordered event queue
+
+    Events are (time, kind, data); events at the same time come out in
+    kind order and then in the order they were scheduled.
+    '''
+    def __init__(self):
+        self._heap = []
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, t, kind, data=None):
+        heapq.heappush(self._heap, (t, kind, self._count, data))
+        self._count += 1
+
+    def pop(self):
+        t, kind, count, data = heapq.heappop(self._heap)
+        return t, kind, data
+
+'''
+    solution - closed form plant state after h seconds of constant command u
+
+    The plant is a first order lag G (gain kg, time constant tau) on the
+    command followed by order integrations
+        order 1: v = G,      p = integral of v    (pidSim2)
+        order 2: a = G / m,  v = integral of a,   p = integral of v    (pidSim3)
+
+    Every argument may be an array (broadcast together); returns (G, v, p).
+'''
+def solution(h, G, v, p, u, order=2, kg=1.0, tau=0.3, m=1.0):
+    e = np.exp(-h / tau)
+    target = kg * u
+    d = G - target
+    I1 = target * h + d * tau * (1.0 - e)                       # integral of G
+    G1 = target + d * e
+    if (order == 1):
+        return G1, G1, p + I1
+    I2 = 0.5 * target * h * h + d * tau * (h - tau * (1.0 - e))  # double integral of G
+    return G1, v + I1 / m, p + v * h + I2 / m
+
+'''
+    hold - expand a held signal, recorded as the (sorted) times it changed
+    and the values it changed to, onto the time grid ts
+
+    Before the first change the signal has the initial value. Values may
+    be arrays of the shape of initial (a batch); the result has the time
+    axis first, (len(ts),) + initial.shape.
+'''
+def hold(times, values, ts, initial=0.0):
+    first = np.asarray(initial, dtype=np.float64)[np.newaxis]
+    values = np.asarray(values, dtype=np.float64).reshape((-1,) + first.shape[1:])
+    values = np.concatenate((first, values))
+    return values[np.searchsorted(times, ts, side='right')]
+
+class model(object):
+    '''
+    model - vision to PID latency model (see pidSim2.py, pidSim3.py)
+
+    Keyword arguments (seconds, Hz) override the defaults taken from
+    pidSim3.py (PIDSIM3); PIDSIM2 holds the pidSim2.py set. setpoint is a
+    constant or a function of time (accepting arrays) that the PID becomes
+    aware of once the first processed image has been delivered.
+
+    run(seed) returns a dict of signals on the output grid ts (step dt)
+        sp, err, intErr, derrdt, cvPid, cvComm0, G, a, v, p,
+        pvCam, pvComm1, pvImage, pvComm2, pvFinal
+    pvComm1StartTags (the frames fetched, NaN between fetches) and
+    'events', the number of events handled.
+
+    Timing follows the scripts: jitters are normal with 3-sigma limits at
+    the given min/max (late only for the PID task), image processing time
+    is normal between 1/imageMaxRate and 1/imageMinRate with
+    imageRateSigma sigmas across that span, and the derivative uses the
+    nominal PID period.
+
+    Batches: kp, ki, kd, kg, tau and m may be arrays (broadcast together to
+    the batch shape, e.g. (K,) for K gain/plant sets). No event time depends
+    on the state, so every set shares one schedule and the same random
+    draws (common random numbers) and advances in lockstep with (K,)
+    states; the cost in Python is that of a single run. The signals then
+    carry the batch axes first, (K, len(ts)); ts and sp stay 1-D.
+    '''
+    def __init__(self, **kwargs):
+        params = dict(PIDSIM3, dt=0.001, setpoint=1.0)
+        for key in kwargs:
+            if key not in params:
+                raise TypeError('Unknown model parameter ' + repr(key))
+        params.update(kwargs)
+        if (params['order'] not in (1, 2)):
+            raise ValueError('order must be 1 or 2')
+        for key in params:
+            setattr(self, key, params[key])
+        self.shape = np.broadcast(*[params[key] for key in BATCHED]).shape
+
+    '''
+        _jitter - draw a jitter with 3-sigma limits at lo and hi
+    '''
+    def _jitter(self, rng, lo, hi):
+        sigma = (hi - lo) / 3.0
+        if (sigma == 0.0):
+            return 0.0
+        return rng.normal(0.5 * (lo + hi), sigma)
+
+    def _setpoint(self, t):
+        if callable(self.setpoint):
+            return self.setpoint(t)
+        return self.setpoint * np.ones_like(t)
+
+    '''
+        run - one realization; seed seeds the jitter draws and signals
+        optionally names the signals to return (all by default), which
+        saves memory and time for large batches
+    '''
+    def run(self, seed=None, signals=None):
+        rng = np.random.default_rng(seed)
+        tmax = self.tmax
+        camPeriod = 1.0 / self.camRate
+        imageMin = 1.0 / self.imageMaxRate
+        imageMax = 1.0 / self.imageMinRate
+        imageSigma = (imageMax - imageMin) / self.imageRateSigma
+
+        # Held signals, recorded only when they change
+        rec = dict((name, ([], [])) for name in
+                   ('err', 'intErr', 'derrdt', 'cvPid', 'cvComm0',
+                    'pvCam', 'pvComm1', 'pvImage', 'pvComm2'))
+        def record(name, t, x):
+            rec[name][0].append(t)
+            rec[name][1].append(x)
+
+        # Zero state, one per batch member
+        zero = np.zeros(self.shape) if self.shape else 0.0
+
+        # Plant segments: start time, state at the start, command over it
+        segT, segG, segV, segP, segU = [0.0], [zero], [zero], [zero], [zero]
+        plant = dict(t=0.0, G=zero, v=zero, p=zero, u=zero)
+        def advance(t):
+            if (t > plant['t']):
+                plant['G'], plant['v'], plant['p'] = solution(
+                    t - plant['t'], plant['G'], plant['v'], plant['p'], plant['u'],
+                    self.order, self.kg, self.tau, self.m)
+                plant['t'] = t
+
+        err = intErr = zero
+        pvFinal = zero
+        frame = zero         # p at the middle of the frame being exposed
+        latestFrame = zero   # p of the latest complete frame
+        spStart = None       # Time the setpoint became known
+        tags = ([], [])      # Times comm1 fetched a frame and the frame fetched
+
+        events = scheduler()
+        events.schedule(max(0.0, self._jitter(rng, self.pidMinJitter, self.pidMaxJitter)),
+                        PID_START, 0.0)
+        events.schedule(self.camOffset, CAM_MIDDLE)
+        events.schedule(self.camOffset + 0.5 * camPeriod, CAM_MIDDLE)
+        events.schedule(0.0, COMM1_START)
+
+        # The first CAM_MIDDLE only marks the start of the first frame
+        first = True
+        count = 0
+        while len(events):
+            t, kind, data = events.pop()
+            if (t >= tmax):
+                break
+            count += 1
+
+            if (kind == PID_START):
+                # data is the nominal timer tick; the next wakeup is one
+                # period later plus (late only) task jitter
+                tick = data + self.pidPeriod
+                late = max(0.0, self._jitter(rng, self.pidMinJitter, self.pidMaxJitter))
+                events.schedule(tick + late, PID_START, tick)
+
+                last = err
+                sp = 0.0 if spStart is None else float(self._setpoint(np.array(t)))
+                err = (sp - pvFinal) if (t > 0.0) else zero
+                derrdt = (err - last) / self.pidPeriod
+                intErr = intErr + err
+                cv = (self.kp * err) + (self.ki * intErr) + (self.kd * derrdt)
+                record('err', t, err)
+                record('intErr', t, intErr)
+                record('derrdt', t, derrdt)
+                record('cvPid', t, cv)
+                events.schedule(t + self.pidDuration, PID_END, cv)
+
+            elif (kind == PID_END):
+                delay = self.comm0Delay + self._jitter(rng, self.comm0MinJitter, self.comm0MaxJitter)
+                events.schedule(t + max(0.0, delay), COMM0_END, data)
+
+            elif (kind == COMM0_END):
+                advance(t)
+                plant['u'] = data
+                segT.append(t)
+                segG.append(plant['G'])
+                segV.append(plant['v'])
+                segP.append(plant['p'])
+                segU.append(data)
+                record('cvComm0', t, data)
+
+            elif (kind == CAM_MIDDLE):
+                if first:
+                    first = False
+                else:
+                    advance(t)
+                    frame = plant['p']
+                    events.schedule(t + 0.5 * camPeriod, CAM_END)
+                    events.schedule(t + camPeriod, CAM_MIDDLE)
+
+            elif (kind == CAM_END):
+                latestFrame = frame
+                record('pvCam', t, frame)
+
+            elif (kind == COMM1_START):
+                tags[0].append(t)
+                tags[1].append(latestFrame)
+                delay = self.comm1Delay + self._jitter(rng, self.comm1MinJitter, self.comm1MaxJitter)
+                events.schedule(t + max(0.0, delay), COMM1_END, latestFrame)
+
+            elif (kind == COMM1_END):
+                record('pvComm1', t, data)
+                duration = 0.5 * (imageMin + imageMax)
+                if (imageSigma != 0.0):
+                    duration = rng.normal(duration, imageSigma)
+                events.schedule(t + max(0.0, duration), IMAGE_END, data)
+
+            elif (kind == IMAGE_END):
+                record('pvImage', t, data)
+                events.schedule(t + self.comm2Delay, COMM2_END, data)
+
+            elif (kind == COMM2_END):
+                record('pvComm2', t, data)
+                pvFinal = data
+                if spStart is None:
+                    spStart = t
+                # Restart image processing immediately
+                events.schedule(t, COMM1_START)
+
+        return self._expand(rec, (segT, segG, segV, segP, segU), tags, spStart, count, zero, signals)
+
+    '''
+        _expand - signals on the output grid from the recorded changes and
+        the plant segments
+    '''
+    def _expand(self, rec, segments, tags, spStart, count, zero, signals):
+        ts = np.arange(0.0, self.tmax, self.dt)
+        r = {'ts' : ts, 'events' : count}
+        if signals is None:
+            signals = list(rec) + ['G', 'a', 'v', 'p', 'sp', 'pvFinal', 'pvComm1StartTags']
+        if 'pvFinal' in signals:
+            signals = list(signals) + ['pvComm2']
+        for name in rec:
+            if name in signals:
+                r[name] = hold(np.array(rec[name][0]), rec[name][1], ts, zero)
+
+        if set(signals) & set(('G', 'a', 'v', 'p')):
+            segT, segG, segV, segP, segU = [np.array(s) for s in segments]
+            k = np.searchsorted(segT, ts, side='right') - 1
+            h = (ts - segT[k]).reshape(ts.shape + (1,) * len(self.shape))
+            r['G'], r['v'], r['p'] = solution(h, segG[k], segV[k], segP[k], segU[k],
+                                              self.order, self.kg, self.tau, self.m)
+            r['a'] = r['G'] / self.m if (self.order == 2) else np.zeros_like(r['G'])
+
+        # Batch axes first
+        if self.shape:
+            for name in r:
+                if isinstance(r[name], np.ndarray) and (r[name] is not ts):
+                    r[name] = np.moveaxis(r[name], 0, -1)
+
+        if spStart is None:
+            r['sp'] = np.zeros_like(ts)
+        else:
+            r['sp'] = np.where(ts >= spStart, self._setpoint(ts), 0.0)
+        if 'pvFinal' in signals:
+            r['pvFinal'] = r['pvComm2']
+
+        # Frame fetches as markers on the grid (NaN elsewhere)
+        if 'pvComm1StartTags' in signals:
+            r['pvComm1StartTags'] = np.full(self.shape + ts.shape, np.nan)
+            if tags[0]:
+                k = np.minimum(np.round(np.array(tags[0]) / self.dt).astype(int), len(ts) - 1)
+                r['pvComm1StartTags'][...,k] = np.moveaxis(np.array(tags[1]), 0, -1)
+        return r
+
+if __name__ == '__main__':
+    import time
+    import matplotlib.pyplot as plot
+
+    t0 = time.perf_counter()
+    r = model(**PIDSIM3).run(seed=1)
+    print('%d events in %.3f s' % (r['events'], time.perf_counter() - t0))
+
+    plot.figure(1)
+    plot.cla()
+    plot.grid()
+    for name in ('sp', 'err', 'p', 'pvCam', 'pvComm1', 'pvImage', 'pvComm2'):
+        plot.plot(r['ts'], r[name], label=name)
+    plot.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3,
+               ncol=2, mode="expand", borderaxespad=0.)
+    plot.show()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+pidMonteCarlo.py
+
+Monte Carlo jitter study for the vision to PID latency simulations.
+
+pidSim2.py and pidSim3.py each draw one random realization of the PID
+wakeup jitter, communication jitter and image processing duration and plot
+it. This runs thousands of seeded realizations of the same model
+(pidEvent) in a process pool, measures each response to the setpoint step
+
+    overshoot   peak beyond the setpoint, fraction of the step
+    settling    time from the step until p stays within the band (NaN if never)
+    iae, ise    integral of |sp - p| and (sp - p)^2 over the step
+    itae        integral of t |sp - p|, t measured from the step
+    sse         mean sp - p over the last 10% of the step (steady state error)
+
+and reports percentile bands of each metric, so jitter budgets can be sized
+statistically rather than from one plot.
+
+The results are a columnar table (dict of equal length arrays, one row per
+realization, including the seed so any run can be replayed with
+pidEvent.model(...).run(seed)). Seeds are derived from the master seed
+only, so the table does not depend on the number of workers.
+
+Usage:  python pidMonteCarlo.py [--preset pidSim3] [--runs 1000] [--seed 0]
+                                [--workers 8] [--set pidMaxJitter=0.002 ...]
+                                [--percentiles 5,50,95] [--output pidMonteCarlo.npz]
+
+Copyright (c) 2016 - RocketRedNeck.com RocketRedNeck.net
+
+RocketRedNeck and MIT Licenses
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+****************************************************************************************************
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+
+import numpy as np
+
+import pidEvent
+
+PRESETS = {'pidSim2' : pidEvent.PIDSIM2,
+           'pidSim3' : pidEvent.PIDSIM3}
+
+METRICS = ('overshoot', 'settling', 'iae', 'ise', 'itae', 'sse')
+
+'''
+    metrics - step response metrics of one run (a pidEvent.model.run result)
+
+    The step is the first stretch of constant, non-zero setpoint; band is
+    the settling band as a fraction of the step. All metrics are NaN when
+    the setpoint never became known. For a batched run every metric is an
+    array of the batch shape.
+'''
+def metrics(r, band=0.02):
+    ts, sp, p = r['ts'], r['sp'], r['p']
+    batch = p.shape[:-1]
+    on = np.flatnonzero(sp != 0.0)
+    if (len(on) == 0):
+        return dict((name, np.full(batch, np.nan)[()]) for name in METRICS)
+
+    start = on[0]
+    change = np.flatnonzero(sp[start:] != sp[start])
+    stop = start + change[0] if len(change) else len(ts)
+    step = sp[start]
+    e = step - p[...,start:stop]
+    dt = ts[1] - ts[0]
+
+    # Settled after the last sample outside the band (0 if it never left
+    # the band, NaN if it is still outside at the last sample of the step)
+    outside = np.abs(e) > band * abs(step)
+    left = outside.any(axis=-1)
+    last = e.shape[-1] - 1 - np.argmax(outside[...,::-1], axis=-1)
+    settling = np.where(left, ts[np.minimum(start + last + 1, len(ts) - 1)] - ts[start], 0.0)
+    settling = np.where(left & (last == e.shape[-1] - 1), np.nan, settling)
+
+    tail = e[...,-max(1, e.shape[-1] // 10):]
+    return {'overshoot' : np.maximum(0.0, np.max(-e * np.sign(step), axis=-1) / abs(step)),
+            'settling'  : settling,
+            'iae'       : np.sum(np.abs(e), axis=-1) * dt,
+            'ise'       : np.sum(e * e, axis=-1) * dt,
+            'itae'      : np.sum((ts[start:stop] - ts[start]) * np.abs(e), axis=-1) * dt,
+            'sse'       : np.mean(tail, axis=-1)}
+
+'''
+    _block - run the model for each seed (worker side), returns the metric
+    columns for the block
+'''
+def _block(params, seeds, band):
+    sim = pidEvent.model(**params)
+    table = dict((name, np.empty(len(seeds))) for name in METRICS)
+    for n, seed in enumerate(seeds):
+        m = metrics(sim.run(int(seed), signals=('p',)), band)
+        for name in METRICS:
+            table[name][n] = m[name]
+    return table
+
+'''
+    seeds - per realization seeds derived from the master seed
+'''
+def seeds(runs, seed=0):
+    return np.random.SeedSequence(seed).generate_state(runs, dtype=np.uint64)
+
+'''
+    montecarlo - run runs seeded realizations of pidEvent.model(**params)
+    across workers processes (None for os.cpu_count(), 0 to run here)
+
+    Returns the columnar result table: 'seed' and one column per metric.
+    params must be picklable (a module level setpoint function, not a
+    lambda) when workers are used.
+'''
+def montecarlo(params, runs=1000, seed=0, workers=None, band=0.02, chunk=None):
+    s = seeds(runs, seed)
+    if (workers == 0):
+        parts = [_block(params, s, band)]
+    else:
+        workers = workers if workers else os.cpu_count()
+        chunk = chunk if chunk else max(1, -(-runs // (4 * workers)))
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(_block, params, s[k:k + chunk], band)
+                       for k in range(0, runs, chunk)]
+            parts = [f.result() for f in futures]
+
+    table = {'seed' : s}
+    for name in METRICS:
+        table[name] = np.concatenate([part[name] for part in parts])
+    return table
+
+'''
+    bands - percentiles of every metric column, ignoring NaN (runs that
+    never settled are counted separately as 'unsettled')
+
+    Returns {metric : array of len(percentiles)}.
+'''
+def bands(table, percentiles=(5, 50, 95)):
+    result = {}
+    for name in METRICS:
+        x = table[name]
+        x = x[np.isfinite(x)]
+        result[name] = np.percentile(x, percentiles) if len(x) else np.full(len(percentiles), np.nan)
+    result['unsettled'] = np.count_nonzero(np.isnan(table['settling']))
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monte Carlo jitter study of the vision PID model')
+    parser.add_argument('--preset', default='pidSim3', choices=sorted(PRESETS),
+                        help='model parameters to start from')
+    parser.add_argument('--runs', type=int, default=1000, help='number of realizations')
+    parser.add_argument('--seed', type=int, default=0, help='master seed')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default all cores, 0 runs in this process)')
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='model parameter overrides, e.g. pidMaxJitter=0.002')
+    parser.add_argument('--band', type=float, default=0.02, help='settling band, fraction of the step')
+    parser.add_argument('--percentiles', default='5,50,95', help='comma separated percentiles')
+    parser.add_argument('--output', default=None, help='.npz file for the result table')
+    args = parser.parse_args(argv)
+
+    params = dict(PRESETS[args.preset])
+    for item in args.set:
+        name, value = item.split('=', 1)
+        params[name] = float(value)
+    pidEvent.model(**params)    # Reject unknown parameters before starting the pool
+
+    table = montecarlo(params, args.runs, args.seed, args.workers, args.band)
+    percentiles = [float(s) for s in args.percentiles.split(',')]
+    b = bands(table, percentiles)
+
+    print('%d runs of %s' % (args.runs, args.preset))
+    print('%-10s' % 'metric' + ''.join('%12s' % ('p%g' % x) for x in percentiles))
+    for name in METRICS:
+        print('%-10s' % name + ''.join('%12.4g' % x for x in b[name]))
+    print('%d runs did not settle' % b['unsettled'])
+
+    if args.output is not None:
+        np.savez(args.output, **table)
+        print('results written to', args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+pidTune.py
+
+Automated PID gain tuning on the vision to PID latency model (pidEvent).
+
+The gains at the top of pidSim2.py and pidSim3.py are tuned by hand. This
+searches kp, ki, kd (or any of the parameters pidEvent can batch: kp, ki,
+kd, kg, tau, m) for a given jitter and latency configuration by minimizing
+
+    cost = mean over seeds of (ITAE + penalty * overshoot)
+
+on the setpoint step (see pidMonteCarlo.metrics). Every candidate is run
+with the same seeds (common random numbers), so candidates are compared on
+the same jitter realizations and the cost is a deterministic function of
+the gains.
+
+Candidates are evaluated a population at a time: each population is split
+across a process pool and each worker runs its share as one lockstep batch
+(pidEvent.model with array gains) per seed. Two searches are provided,
+both of which produce populations:
+
+    nelder-mead   reflection, expansion and both contractions are
+                  evaluated together, as is the shrink when it happens
+    coordinate    every +/- step along every gain is evaluated together;
+                  the step halves when none improves
+
+With a cache file every evaluated gain tuple is memoized on disk (keyed by
+the configuration), so a restarted session skips work already done.
+
+Usage:  python pidTune.py [--preset pidSim3] [--method nelder-mead]
+                          [--x0 0,0,0.8] [--seeds 16] [--penalty 10]
+                          [--workers 8] [--cache pidTune.json]
+                          [--set pidMaxJitter=0.002 ...]
+
+Copyright (c) 2016 - RocketRedNeck.com RocketRedNeck.net
+
+RocketRedNeck and MIT Licenses
+
+RocketRedNeck hereby grants license for others to copy and modify this source code for
+whatever purpose other's deem worthy as long as RocketRedNeck is given credit where
+where credit is due and you leave RocketRedNeck out of it for all other nefarious purposes.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+****************************************************************************************************
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+import pidEvent
+import pidMonteCarlo
+
+'''
+    _evaluate - cost of each candidate (rows of x, columns named by gains)
+    over the seeds (worker side)
+'''
+def _evaluate(params, gains, x, seeds, band, penalty):
+    batch = dict(params)
+    for k, name in enumerate(gains):
+        batch[name] = x[:,k]
+    sim = pidEvent.model(**batch)
+
+    cost = np.zeros(len(x))
+    with np.errstate(over='ignore', invalid='ignore'):
+        for seed in seeds:
+            m = pidMonteCarlo.metrics(sim.run(int(seed), signals=('p',)), band)
+            cost += m['itae'] + penalty * m['overshoot']
+    cost /= len(seeds)
+
+    # Diverged or never saw the setpoint
+    cost[~np.isfinite(cost)] = np.inf
+    return cost
+
+class tuner(object):
+    '''
+    % TUNER     PID gain tuner constructor
+    %           Searches model gains that minimize ITAE plus an overshoot
+    %           penalty over common random numbers.
+    %
+    % Usage:    with tuner(pidEvent.PIDSIM3, seeds=16, cache='pidTune.json') as T:
+    %               x, f = T.minimize([0.0, 0.0, 0.8])
+    %
+    % Inputs:   params   pidEvent.model parameters of the configuration
+    %
+    %           gains    Names of the parameters searched (default kp, ki, kd),
+    %                    from pidEvent.BATCHED
+    %
+    %           seeds    Number of seeded realizations per candidate, or the
+    %                    seeds themselves (default 16)
+    %
+    %           seed     Master seed the realization seeds are derived from
+    %
+    %           penalty  Weight of the overshoot (fraction of the step)
+    %
+    %           band     Settling band, fraction of the step
+    %
+    %           workers  Worker processes (None for os.cpu_count(), 0 to
+    %                    evaluate in this process)
+    %
+    %           cache    JSON file the evaluated candidates are memoized in
+    %                    (None for memory only)
+    %
+    % Notes:    params must be picklable (a module level setpoint function,
+    %           not a lambda) when workers are used. Gains are kept >= 0.
+    %
+    % See also pidMonteCarlo.montecarlo
+    %
+    %==============================================================================
+    '''
+    def __init__(self, params, gains=('kp', 'ki', 'kd'), seeds=16, seed=0,
+                 penalty=10.0, band=0.02, workers=None, cache=None):
+        pidEvent.model(**params)    # Reject unknown parameters early
+        for name in gains:
+            if name not in pidEvent.BATCHED:
+                raise ValueError('Cannot tune ' + repr(name) + '; candidates are evaluated as a batch, '
+                                 'so only ' + ', '.join(pidEvent.BATCHED) + ' can be searched')
+        self.params = dict(params)
+        self.gains = tuple(gains)
+        if np.isscalar(seeds):
+            seeds = pidMonteCarlo.seeds(seeds, seed)
+        self.seeds = [int(s) for s in seeds]
+        self.penalty = penalty
+        self.band = band
+        self.workers = os.cpu_count() if workers is None else workers
+        self.evaluations = 0
+        self._pool = None
+
+        # Everything the cost depends on except the gains
+        fixed = dict((k, self.params[k]) for k in self.params if k not in self.gains)
+        if callable(fixed.get('setpoint')):
+            fixed['setpoint'] = fixed['setpoint'].__module__ + '.' + fixed['setpoint'].__qualname__
+        self.key = hashlib.sha1(repr((sorted(fixed.items()), self.gains, self.seeds,
+                                      penalty, band)).encode()).hexdigest()
+
+        self.cache = cache
+        self._memo = {}
+        if (cache is not None) and os.path.exists(cache):
+            with open(cache) as f:
+                self._memo = json.load(f).get(self.key, {})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _save(self):
+        if self.cache is None:
+            return
+        everything = {}
+        if os.path.exists(self.cache):
+            with open(self.cache) as f:
+                everything = json.load(f)
+        everything[self.key] = self._memo
+        with open(self.cache + '.tmp', 'w') as f:
+            json.dump(everything, f)
+        os.replace(self.cache + '.tmp', self.cache)
+
+    @staticmethod
+    def _name(x):
+        return ','.join('%.12g' % v for v in x)
+
+    '''
+        cost - cost of each candidate (rows of x), evaluating only those not
+        already memoized
+    '''
+    def cost(self, x):
+        x = np.maximum(np.atleast_2d(np.asarray(x, dtype=np.float64)), 0.0)
+        names = [self._name(row) for row in x]
+        todo = sorted(set(n for n in names if n not in self._memo))
+        if todo:
+            rows = np.array([[float(v) for v in n.split(',')] for n in todo])
+            if (self.workers == 0) or (len(rows) == 1):
+                parts = [_evaluate(self.params, self.gains, rows, self.seeds, self.band, self.penalty)]
+            else:
+                if self._pool is None:
+                    self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+                chunks = np.array_split(rows, min(self.workers, len(rows)))
+                futures = [self._pool.submit(_evaluate, self.params, self.gains, c,
+                                             self.seeds, self.band, self.penalty) for c in chunks]
+                parts = [f.result() for f in futures]
+            for n, c in zip(todo, np.concatenate(parts)):
+                self._memo[n] = float(c)
+            self.evaluations += len(todo)
+            self._save()
+        return np.array([self._memo[n] for n in names])
+
+    '''
+        minimize - search from x0 (one value per gain), returns the best
+        gains found and their cost
+
+        method is 'nelder-mead' or 'coordinate'; step is the initial simplex
+        edge or coordinate step (default 20% of each gain, at least 0.05);
+        the search stops after iterations populations or when the steps
+        fall below xtol.
+    '''
+    def minimize(self, x0, method='nelder-mead', step=None, iterations=200, xtol=1.0e-3,
+                 verbose=False):
+        x0 = np.maximum(np.asarray(x0, dtype=np.float64), 0.0)
+        if step is None:
+            step = np.maximum(0.2 * np.abs(x0), 0.05)
+        step = np.broadcast_to(np.asarray(step, dtype=np.float64), x0.shape).copy()
+        if (method == 'nelder-mead'):
+            return self._nelder_mead(x0, step, iterations, xtol, verbose)
+        if (method == 'coordinate'):
+            return self._coordinate(x0, step, iterations, xtol, verbose)
+        raise ValueError('method must be nelder-mead or coordinate')
+
+    def _nelder_mead(self, x0, step, iterations, xtol, verbose):
+        n = len(x0)
+        simplex = np.vstack((x0, x0 + np.diag(step)))
+        f = self.cost(simplex)
+        for iteration in range(iterations):
+            order = np.argsort(f)
+            simplex, f = simplex[order], f[order]
+            if verbose:
+                print('%4d %12.6g  %s' % (iteration, f[0], self._name(simplex[0])))
+            if (np.max(np.abs(simplex[1:] - simplex[0])) < xtol):
+                break
+
+            # All the trial points of this step as one population
+            c = np.mean(simplex[:-1], axis=0)
+            w = simplex[-1]
+            trial = np.maximum(np.array([c + (c - w),               # reflection
+                                         c + 2.0 * (c - w),         # expansion
+                                         c + 0.5 * (c - w),         # outside contraction
+                                         c - 0.5 * (c - w)]), 0.0)  # inside contraction
+            fr, fe, foc, fic = self.cost(trial)
+
+            if (fr < f[0]):
+                accept = (trial[1], fe) if (fe < fr) else (trial[0], fr)
+            elif (fr < f[n - 1]):
+                accept = (trial[0], fr)
+            elif (fr < f[n]):
+                accept = (trial[2], foc) if (foc <= fr) else None
+            else:
+                accept = (trial[3], fic) if (fic < f[n]) else None
+
+            if accept is None:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                f[1:] = self.cost(simplex[1:])
+            else:
+                simplex[-1], f[-1] = accept
+
+        k = np.argmin(f)
+        return simplex[k], f[k]
+
+    def _coordinate(self, x0, step, iterations, xtol, verbose):
+        x = x0
+        f = self.cost(x)[0]
+        for iteration in range(iterations):
+            if verbose:
+                print('%4d %12.6g  %s' % (iteration, f, self._name(x)))
+            if (np.max(step) < xtol):
+                break
+
+            trial = np.maximum(np.vstack((x + np.diag(step), x - np.diag(step))), 0.0)
+            ft = self.cost(trial)
+            k = np.argmin(ft)
+            if (ft[k] < f):
+                x, f = trial[k], ft[k]
+            else:
+                step *= 0.5
+        return x, f
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PID gain tuner for the vision PID model')
+    parser.add_argument('--preset', default='pidSim3', choices=sorted(pidMonteCarlo.PRESETS),
+                        help='model parameters to start from')
+    parser.add_argument('--method', default='nelder-mead', choices=('nelder-mead', 'coordinate'))
+    parser.add_argument('--gains', default='kp,ki,kd',
+                        help='comma separated parameters searched (from ' + ', '.join(pidEvent.BATCHED) + ')')
+    parser.add_argument('--x0', default=None,
+                        help='comma separated starting gains (default the preset values)')
+    parser.add_argument('--seeds', type=int, default=16, help='realizations per candidate')
+    parser.add_argument('--seed', type=int, default=0, help='master seed')
+    parser.add_argument('--penalty', type=float, default=10.0, help='overshoot weight')
+    parser.add_argument('--iterations', type=int, default=200, help='populations evaluated at most')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default all cores, 0 runs in this process)')
+    parser.add_argument('--cache', default=None, help='JSON file of memoized evaluations')
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE',
+                        help='model parameter overrides, e.g. pidMaxJitter=0.002')
+    args = parser.parse_args(argv)
+
+    params = dict(pidMonteCarlo.PRESETS[args.preset])
+    for item in args.set:
+        name, value = item.split('=', 1)
+        params[name] = float(value)
+
+    gains = [s.strip() for s in args.gains.split(',')]
+    if args.x0 is None:
+        x0 = [params[name] for name in gains]
+    else:
+        x0 = [float(s) for s in args.x0.split(',')]
+
+    with tuner(params, gains, args.seeds, args.seed, args.penalty,
+               workers=args.workers, cache=args.cache) as T:
+        start = T.cost(x0)[0]
+        x, f = T.minimize(x0, args.method, iterations=args.iterations, verbose=True)
+        print('%d candidates evaluated' % T.evaluations)
+
+    print('start  cost %.6g  %s' % (start, ', '.join('%s=%.4g' % p for p in zip(gains, x0))))
+    print('tuned  cost %.6g  %s' % (f, ', '.join('%s=%.4g' % p for p in zip(gains, x))))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())